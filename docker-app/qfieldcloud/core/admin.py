@@ -57,7 +57,7 @@ from qfieldcloud.core.models import (
 )
 from qfieldcloud.core.paginators import LargeTablePaginator
 from qfieldcloud.core.templatetags.filters import filesizeformat10
-from qfieldcloud.core.utils2 import delta_utils, jobs, pg_service_file
+from qfieldcloud.core.utils2 import delta_utils, jobs, pg_service_file, storage
 from rest_framework.authtoken.models import TokenProxy
 
 admin.site.unregister(LogEntry)
@@ -760,12 +760,14 @@ class ProjectAdmin(QFieldCloudModelAdmin):
         "project_filename",
         "has_restricted_projectfiles",
         "file_storage_bytes",
+        "package_storage_bytes",
         "storage_keep_versions",
         "packaging_offliner",
         "created_at",
         "updated_at",
         "data_last_updated_at",
         "data_last_packaged_at",
+        "online_data_unchanged_at",
         "project_details__pre",
         "project_files",
     )
@@ -774,10 +776,12 @@ class ProjectAdmin(QFieldCloudModelAdmin):
         "status",
         "status_code",
         "file_storage_bytes",
+        "package_storage_bytes",
         "created_at",
         "updated_at",
         "data_last_updated_at",
         "data_last_packaged_at",
+        "online_data_unchanged_at",
         "project_details__pre",
     )
     inlines = (ProjectCollaboratorInline, ProjectSecretInline)
@@ -912,7 +916,7 @@ class JobAdmin(QFieldCloudModelAdmin):
     )
     list_filter = ("type", "status", "updated_at", IsFinalizedJobFilter)
     list_select_related = ("project", "project__owner", "created_by")
-    exclude = ("feedback", "output")
+    exclude = ("feedback", "output", "output_uri")
     ordering = ("-updated_at",)
     search_fields = (
         "project__name__iexact",
@@ -978,6 +982,11 @@ class JobAdmin(QFieldCloudModelAdmin):
                 self.admin_site.admin_view(self.rerun_job),
                 name="rerun_job",
             ),
+            path(
+                "<path:object_id>/output/",
+                self.admin_site.admin_view(self.download_job_output),
+                name="download_job_output",
+            ),
             *urls,
         ]
 
@@ -1009,6 +1018,14 @@ class JobAdmin(QFieldCloudModelAdmin):
         return False
 
     def output__pre(self, instance):
+        if instance.is_output_truncated:
+            return format_html(
+                '<a href="{}">{}</a>{}',
+                reverse("admin:download_job_output", args=(instance.pk,)),
+                _("Download the full output"),
+                format_pre(instance.output),
+            )
+
         return format_pre(instance.output)
 
     def feedback__pre(self, instance):
@@ -1038,6 +1055,18 @@ class JobAdmin(QFieldCloudModelAdmin):
         Job.objects.filter(pk=object_id).update(status="pending")
         return HttpResponseRedirect("..")
 
+    def download_job_output(self, request, object_id):
+        job = Job.objects.only("id", "project_id", "output", "output_uri").get(
+            pk=object_id
+        )
+
+        if job.is_output_truncated:
+            content = storage.iter_job_output(job)
+        else:
+            content = [job.output or ""]
+
+        return StreamingHttpResponse(content, content_type="text/plain")
+
 
 class ApplyJobDeltaInline(admin.TabularInline):
     model = ApplyJobDelta
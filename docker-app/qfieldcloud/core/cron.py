@@ -2,13 +2,14 @@ import logging
 from datetime import timedelta
 
 from constance import config
+from django.conf import settings
 from django.utils import timezone
 from django_cron import CronJobBase, Schedule
 from invitations.utils import get_invitation_model
 from sentry_sdk import capture_message
 
-from ..core.models import ApplyJob, ApplyJobDelta, Delta, Job, Project
-from ..core.utils2 import storage
+from ..core.models import ApplyJob, ApplyJobDelta, Delta, FileUploadSession, Job
+from ..core.utils2 import storage, streams
 from .invitations_utils import send_invitation
 
 logger = logging.getLogger(__name__)
@@ -77,6 +78,8 @@ class SetTerminatedWorkersToFinalStatusJob(CronJobBase):
                     modified_pk=None,
                 )
 
+        failed_jobs = list(jobs)
+
         jobs.update(
             status=Job.Status.FAILED,
             finished_at=timezone.now(),
@@ -89,43 +92,40 @@ class SetTerminatedWorkersToFinalStatusJob(CronJobBase):
             output="Job unexpectedly terminated.",
         )
 
+        # `update()` does not send `post_save`, so publish the status change explicitly
+        for job in failed_jobs:
+            job.status = Job.Status.FAILED
+            streams.publish_job_status(job)
+
 
 class DeleteObsoleteProjectPackagesJob(CronJobBase):
     schedule = Schedule(run_every_mins=60)
     code = "qfieldcloud.delete_obsolete_project_packages"
 
     def do(self):
-        # get only the projects updated in the last a little more than an hour,
-        # as we assume the rest of the projects have been cleaned from obsolete
-        # packages in the previous CRON run. Also give 5 minute offset from now,
-        # so there is no overlap and errors with the deletion happening from the
-        # worker-wrapper.
-        projects = Project.objects.filter(
-            updated_at__gt=timezone.now() - timedelta(minutes=70),
-            updated_at__lt=timezone.now() - timedelta(minutes=5),
-        )
-        job_ids = [
-            str(job["id"])
-            for job in Job.objects.filter(
-                type=Job.Type.PACKAGE,
-            )
-            .exclude(
-                status__in=(Job.Status.FAILED, Job.Status.FINISHED),
-            )
-            .values("id")
-        ]
+        # the stored packages are tracked in the database, so there is no need to list
+        # the storage of each project to find the obsolete packages.
+        storage.delete_obsolete_stored_packages()
 
-        for project in projects:
-            project_id = str(project.id)
-            package_ids = storage.get_stored_package_ids(project_id)
 
-            for package_id in package_ids:
-                # keep the last package
-                if package_id == str(project.last_package_job_id):
-                    continue
+class AbortExpiredFileUploadSessionsJob(CronJobBase):
+    schedule = Schedule(run_every_mins=60)
+    code = "qfieldcloud.abort_expired_file_upload_sessions"
 
-                # the job is still active, so it might be one of the new packages
-                if package_id in job_ids:
-                    continue
+    def do(self):
+        sessions = FileUploadSession.objects.filter(
+            created_at__lt=timezone.now()
+            - timedelta(days=settings.QFIELDCLOUD_FILE_UPLOAD_SESSION_EXPIRATION_DAYS),
+        )
 
-                storage.delete_stored_package(project_id, package_id)
+        for session in sessions:
+            try:
+                # the file of a completed session is already on the storage, only the project update is missing
+                if session.completed_at:
+                    storage.complete_file_upload_session(session)
+                else:
+                    storage.abort_file_upload_session(session)
+            except Exception as err:
+                logger.error(
+                    f"Failed to abort the expired file upload session {session}: {err}"
+                )
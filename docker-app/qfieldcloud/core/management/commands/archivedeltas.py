@@ -0,0 +1,114 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from qfieldcloud.core.models import Delta, DeltaArchive, Project
+from qfieldcloud.core.serializers import DeltaSerializer
+from qfieldcloud.core.utils2 import storage
+
+
+class Command(BaseCommand):
+    """
+    Move old applied or ignored deltas out of the database into gzipped JSONL objects on the storage.
+    """
+
+    help = """
+        Move applied or ignored deltas older than the given number of days into gzipped JSONL objects on the storage.
+        Archived deltas are still returned when listing the deltas of a deltafile.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=90,
+            help="Archive deltas created more than that many days ago. Defaults to 90.",
+        )
+        parser.add_argument(
+            "--project-id",
+            type=str,
+            help="Archive the deltas of the given project only.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Maximum number of deltas per archive object. Defaults to 10000.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number of deltas to be archived.",
+        )
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options["days"])
+        batch_size = options["batch_size"]
+
+        deltas_qs = Delta.objects.filter(
+            last_status__in=DeltaArchive.ARCHIVABLE_STATUSES,
+            created_at__lt=older_than,
+        )
+
+        if options.get("project_id"):
+            deltas_qs = deltas_qs.filter(project_id=options["project_id"])
+
+        project_ids = list(
+            deltas_qs.order_by().values_list("project_id", flat=True).distinct()
+        )
+
+        if not project_ids:
+            self.stdout.write("No deltas to archive.")
+            return
+
+        if options["dry_run"]:
+            self.stdout.write(
+                f"Dry run, {deltas_qs.count()} delta(s) from {len(project_ids)} project(s) would be archived."
+            )
+            return
+
+        for project in Project.objects.filter(pk__in=project_ids):
+            self.stdout.write(f'Archiving deltas for "{project.id}"...')
+
+            archived_count = 0
+            while True:
+                deltas = list(
+                    deltas_qs.filter(project=project)
+                    .select_related("created_by")
+                    .order_by("created_at")[:batch_size]
+                )
+
+                if not deltas:
+                    break
+
+                archived_count += self.archive(project, deltas)
+
+            self.stdout.write(f'Archived {archived_count} delta(s) for "{project.id}".')
+
+    def archive(self, project: Project, deltas: list[Delta]) -> int:
+        serialized_deltas = []
+        for delta in deltas:
+            serialized_delta = DeltaSerializer(delta).data
+            serialized_delta["deltafile_id"] = str(delta.deltafile_id)
+            serialized_delta["id"] = str(delta.id)
+            serialized_deltas.append(serialized_delta)
+
+        first_created_at = deltas[0].created_at
+        last_created_at = deltas[-1].created_at
+        archive_name = f"{first_created_at:%Y%m%dT%H%M%S}_{deltas[0].id}"
+
+        key = storage.upload_delta_archive(project, archive_name, serialized_deltas)
+
+        with transaction.atomic():
+            DeltaArchive.objects.create(
+                project=project,
+                key=key,
+                deltafile_ids=sorted({d["deltafile_id"] for d in serialized_deltas}),
+                deltas_count=len(deltas),
+                first_delta_created_at=first_created_at,
+                last_delta_created_at=last_created_at,
+            )
+            Delta.objects.filter(pk__in=[d.pk for d in deltas]).delete()
+
+        return len(deltas)
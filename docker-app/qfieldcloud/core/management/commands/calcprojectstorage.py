@@ -1,7 +1,27 @@
+import argparse
 import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
 
 from django.core.management.base import BaseCommand
-from qfieldcloud.core.models import Project
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from qfieldcloud.core.models import Project, UserAccount
+from qfieldcloud.core.utils2 import storage
+
+
+def parse_changed_since(value: str) -> datetime:
+    changed_since = parse_datetime(value)
+
+    if changed_since is None:
+        raise argparse.ArgumentTypeError(
+            f'Invalid datetime "{value}", expected ISO 8601 format.'
+        )
+
+    if timezone.is_naive(changed_since):
+        changed_since = timezone.make_aware(changed_since)
+
+    return changed_since
 
 
 class Command(BaseCommand):
@@ -12,29 +32,114 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("project_id", type=uuid.UUID, nargs="?")
         parser.add_argument("--force-recalculate", action="store_true")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of projects calculated concurrently. Defaults to 4.",
+        )
+        parser.add_argument(
+            "--changed-since",
+            type=parse_changed_since,
+            help="Only recalculate projects updated since the given ISO 8601 datetime, as the storage of the rest cannot have changed.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the drift between the stored and the calculated sizes, without updating them.",
+        )
 
     def handle(self, *args, **options):
         project_id = options.get("project_id")
         force_recalculate = options.get("force_recalculate")
+        changed_since = options.get("changed_since")
+        dry_run = options.get("dry_run")
 
         extra_filters = {}
         if project_id:
             extra_filters["id"] = project_id
 
-        if not project_id and not force_recalculate:
+        if changed_since:
+            extra_filters["updated_at__gte"] = changed_since
+        elif not project_id and not force_recalculate:
             extra_filters["file_storage_bytes"] = 0
 
-        projects_qs = Project.objects.filter(
-            project_filename__isnull=False,
-            **extra_filters,
-        ).order_by("-updated_at")
+        projects_qs = (
+            Project.objects.filter(
+                project_filename__isnull=False,
+                **extra_filters,
+            )
+            .order_by("-updated_at")
+            .values_list("id", "owner_id", "file_storage_bytes")
+        )
         total_count = projects_qs.count()
+        drifted_count = 0
+        drifted_bytes = 0
 
-        for idx, project in enumerate(projects_qs):
-            print(
-                f'Calculating project files storage size for "{project.id}" {idx}/{total_count}...'
-            )
-            project.save(recompute_storage=True)
-            print(
-                f'Project files storage size for "{project.id}" is {project.file_storage_bytes} bytes.'
+        # NOTE submit only a few projects ahead of the workers, so the pending futures do not grow with the number of projects
+        max_pending_count = options["workers"] * 2
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures: dict[Future, tuple] = {}
+            for idx, (project_id, owner_id, stored_bytes) in enumerate(
+                projects_qs.iterator()
+            ):
+                if len(futures) >= max_pending_count:
+                    done, _not_done = wait(futures, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        drift = self.save_result(future, *futures.pop(future), dry_run)
+
+                        if drift:
+                            drifted_count += 1
+                            drifted_bytes += drift
+
+                self.stdout.write(
+                    f'Calculating project files storage size for "{project_id}" {idx}/{total_count}...'
+                )
+                future = executor.submit(
+                    storage.get_project_file_storage_in_bytes, project_id
+                )
+                futures[future] = (project_id, owner_id, stored_bytes)
+
+            for future in list(futures):
+                drift = self.save_result(future, *futures.pop(future), dry_run)
+
+                if drift:
+                    drifted_count += 1
+                    drifted_bytes += drift
+
+        self.stdout.write(
+            f"Calculated {total_count} project(s), {drifted_count} drifted by {drifted_bytes} bytes in total."
+        )
+
+    def save_result(
+        self,
+        future: Future,
+        project_id: uuid.UUID,
+        owner_id: int,
+        stored_bytes: int,
+        dry_run: bool,
+    ) -> int:
+        """Stores the calculated storage size of a project and returns its drift in bytes."""
+        file_storage_bytes = future.result()
+
+        self.stdout.write(
+            f'Project files storage size for "{project_id}" is {file_storage_bytes} bytes.'
+        )
+
+        if file_storage_bytes == stored_bytes:
+            return 0
+
+        self.stdout.write(
+            f'Project files storage size for "{project_id}" drifted by {file_storage_bytes - stored_bytes} bytes, was {stored_bytes} bytes.'
+        )
+
+        if not dry_run:
+            # NOTE update only the storage size, `Project.save()` revalidates the whole project and bumps `updated_at`
+            Project.objects.filter(pk=project_id).update(
+                file_storage_bytes=file_storage_bytes
             )
+            UserAccount.invalidate_summaries([owner_id])
+
+        return file_storage_bytes - stored_bytes
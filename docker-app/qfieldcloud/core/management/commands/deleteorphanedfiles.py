@@ -1,18 +1,42 @@
 import uuid
-from typing import Set
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Set
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from qfieldcloud.core import utils
 from qfieldcloud.core.models import Project
 from qfieldcloud.core.utils2 import storage
 
+PROJECTS_PREFIX = "projects/"
+
 
 class Command(BaseCommand):
-    help = "Delete orphaned project files when the project in the DB is deleted."
+    help = """
+        Delete orphaned project files when the project in the DB is deleted.
+        Only the project prefixes are listed from the storage, the project files themselves are never listed.
+    """
 
     def add_arguments(self, parser):
         parser.add_argument("--dry-run", action="store_true")
-        parser.add_argument("--limit", type=int, default=100)
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=100,
+            help="Number of project ids checked against the database at once. Defaults to 100.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Maximum number of projects which files are deleted in parallel. Defaults to 4.",
+        )
+        parser.add_argument(
+            "--checkpoint-file",
+            type=Path,
+            help="File to store the last checked project prefix. If it exists, the command resumes after the stored prefix. It is removed once the whole storage is checked.",
+        )
 
     def get_orphaned_project_ids(self, project_ids: Set[str]) -> Set[str]:
         orphaned_project_ids = set()
@@ -29,48 +53,124 @@ class Command(BaseCommand):
 
         return orphaned_project_ids
 
-    def handle(self, *args, **options):
-        dry_run = options.get("dry_run")
-        limit = options.get("limit")
-        bucket = utils.get_s3_bucket()
-        project_ids = set()
-        orphaned_project_ids = set()
+    def iter_project_prefixes(self, start_after: str = "") -> Iterator[str]:
+        """Yields the names directly under the `projects/` prefix, in the storage order.
 
-        if dry_run:
-            self.stdout.write("Dry run, no files will be deleted.")
+        Uses `Delimiter="/"`, so the storage returns a single common prefix per project instead of all its files.
+        """
+        paginator = utils.get_s3_client().get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=settings.STORAGE_BUCKET_NAME,
+            Prefix=PROJECTS_PREFIX,
+            Delimiter="/",
+            StartAfter=start_after,
+        )
 
-        for f in utils.list_files(bucket, "projects/", "projects/"):
-            project_id = f.name[:36]
+        for page in pages:
+            names = [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+            # objects directly under `projects/` are not within a project prefix
+            names += [o["Key"] for o in page.get("Contents", [])]
 
-            try:
-                uuid.UUID(project_id)
-            except Exception:
-                self.stdout.write(f"Invalid uuid: {str(project_id)}")
-                continue
+            for name in sorted(names):
+                yield name[len(PROJECTS_PREFIX) :]
 
-            project_ids.add(project_id)
+    def read_checkpoint(self, checkpoint_file: Path | None) -> str:
+        if not checkpoint_file or not checkpoint_file.exists():
+            return ""
 
-            # check for every `limit` projects if they exist, to keep the SQL query short and fast enough
-            if len(project_ids) == limit:
-                self.stdout.write(
-                    f"Checking a batch of {limit} project ids from the storage..."
-                )
-                orphaned_project_ids |= self.get_orphaned_project_ids(project_ids)
-                project_ids = set()
+        last_name = checkpoint_file.read_text().strip()
 
-        if len(project_ids) > 0:
-            self.stdout.write(
-                f"Checking the last {len(project_ids)} project id(s) from the storage..."
-            )
-            orphaned_project_ids |= self.get_orphaned_project_ids(project_ids)
+        if not last_name:
+            return ""
 
-        if len(orphaned_project_ids) == 0:
-            self.stdout.write("No project files to delete.")
+        self.stdout.write(f'Resuming after "{last_name}"...')
+
+        # all the keys within the last checked project prefix are before the character that follows "/"
+        return f"{PROJECTS_PREFIX}{last_name.rstrip('/')}0"
+
+    def write_checkpoint(self, checkpoint_file: Path | None, last_name: str) -> None:
+        if not checkpoint_file:
             return
 
+        checkpoint_file.write_text(last_name)
+
+    def delete_orphaned_project_files(
+        self, executor: ThreadPoolExecutor, project_ids: list[str], dry_run: bool
+    ) -> int:
         # we need to sort the project ids to make the sorting predictable for testing purposes
-        for project_id in sorted(orphaned_project_ids):
+        orphaned_project_ids = sorted(self.get_orphaned_project_ids(set(project_ids)))
+
+        for project_id in orphaned_project_ids:
             self.stdout.write(f'Deleting project files for "{project_id}"...')
 
-            if not dry_run:
-                storage.delete_all_project_files_permanently(project_id)
+        if not dry_run:
+            # consume the results, so a failed deletion is raised before the checkpoint is written
+            list(
+                executor.map(
+                    storage.delete_all_project_files_permanently,
+                    orphaned_project_ids,
+                )
+            )
+
+        return len(orphaned_project_ids)
+
+    def handle(self, *args, **options):
+        dry_run = options.get("dry_run")
+        limit = options.get("limit")
+        checkpoint_file = options.get("checkpoint_file")
+        project_ids: list[str] = []
+        last_name = ""
+        checked_count = 0
+        deleted_count = 0
+
+        if dry_run:
+            self.stdout.write("Dry run, no files will be deleted.")
+
+        start_after = self.read_checkpoint(checkpoint_file)
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for name in self.iter_project_prefixes(start_after):
+                project_id = name.rstrip("/")
+                last_name = name
+
+                try:
+                    uuid.UUID(project_id)
+                except Exception:
+                    self.stdout.write(f"Invalid uuid: {str(project_id)}")
+                    continue
+
+                project_ids.append(project_id)
+                checked_count += 1
+
+                # check for every `limit` projects if they exist, to keep the SQL query short and fast enough
+                if len(project_ids) == limit:
+                    self.stdout.write(
+                        f"Checking a batch of {limit} project ids from the storage..."
+                    )
+                    deleted_count += self.delete_orphaned_project_files(
+                        executor, project_ids, dry_run
+                    )
+                    project_ids = []
+
+                    if not dry_run:
+                        self.write_checkpoint(checkpoint_file, last_name)
+
+                    if options["verbosity"] > 1:
+                        self.stdout.write(
+                            f'Checked {checked_count} project id(s) so far, the last one is "{project_id}".'
+                        )
+
+            if len(project_ids) > 0:
+                self.stdout.write(
+                    f"Checking the last {len(project_ids)} project id(s) from the storage..."
+                )
+                deleted_count += self.delete_orphaned_project_files(
+                    executor, project_ids, dry_run
+                )
+
+        # the whole storage has been checked, the next run should start from the beginning
+        if checkpoint_file and not dry_run:
+            checkpoint_file.unlink(missing_ok=True)
+
+        if deleted_count == 0:
+            self.stdout.write("No project files to delete.")
@@ -7,6 +7,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 from qfieldcloud.core.models import Job
+from qfieldcloud.core.utils2.jobs import get_mergeable_apply_jobs
 from worker_wrapper.wrapper import (
     DeltaApplyJobRun,
     PackageJobRun,
@@ -58,6 +59,7 @@ class Command(BaseCommand):
                     )
 
             queued_job = None
+            merged_job_ids = []
 
             with transaction.atomic():
                 with connection.cursor() as cursor:
@@ -87,8 +89,20 @@ class Command(BaseCommand):
                     queued_job.status = Job.Status.QUEUED
                     queued_job.save(update_fields=["status"])
 
+                    # the following apply jobs of the project are applied in the same run,
+                    # they stay pending meanwhile, but will not be dequeued as the project is busy
+                    if queued_job.type == Job.Type.DELTA_APPLY:
+                        merged_job_ids = [
+                            job.id for job in get_mergeable_apply_jobs(queued_job)
+                        ]
+
+                        if merged_job_ids:
+                            logging.info(
+                                f"Merged {len(merged_job_ids)} apply jobs into job {queued_job.id}."
+                            )
+
             if queued_job:
-                self._run(queued_job)
+                self._run(queued_job, merged_job_ids)
                 queued_job = None
             else:
                 if options["single_shot"]:
@@ -102,7 +116,7 @@ class Command(BaseCommand):
             if options["single_shot"]:
                 break
 
-    def _run(self, job: Job):
+    def _run(self, job: Job, merged_job_ids: list[str]):
         job_run_classes = {
             Job.Type.PACKAGE: PackageJobRun,
             Job.Type.DELTA_APPLY: DeltaApplyJobRun,
@@ -114,5 +128,9 @@ class Command(BaseCommand):
         else:
             raise NotImplementedError(f"Unknown job type {job.type}")
 
-        job_run = job_run_class(job.id)
+        if job.type == Job.Type.DELTA_APPLY:
+            job_run = job_run_class(job.id, merged_job_ids)
+        else:
+            job_run = job_run_class(job.id)
+
         job_run.run()
@@ -1,5 +1,10 @@
 import csv
+import gzip
+import itertools
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from sys import stdout
 from typing import Generator, NamedTuple
 
@@ -9,6 +14,17 @@ from django.core.management.base import BaseCommand, CommandParser
 
 logger = logging.getLogger(__name__)
 
+FIELDS = (
+    "id",
+    "key",
+    "e_tag",
+    "size",
+    "last_modified",
+)
+
+# S3 compares the keys by their UTF-8 bytes, so no key starting with a given prefix is greater than the prefix followed by this character
+MAX_CHAR = "\U0010ffff"
+
 
 class S3ConfigObject(NamedTuple):
     storage_access_key_id: str
@@ -18,6 +34,43 @@ class S3ConfigObject(NamedTuple):
     storage_region_name: str
 
 
+class Shard(NamedTuple):
+    name: str
+    prefix: str
+    # `(key_marker, stop_before)` ranges of keys within the prefix, `stop_before` is `None` for no upper limit
+    ranges: list[tuple[str, str | None]]
+
+
+def get_shards(depth: int) -> list[Shard]:
+    """Splits the bucket keyspace into shards by the first hex characters of the project ids.
+
+    The keys which are not within any of the project shards (e.g. the non-project keys) are in the last "other" shard.
+    """
+    shards = []
+    other_ranges: list[tuple[str, str | None]] = []
+    key_marker = ""
+
+    for chars in itertools.product("0123456789abcdef", repeat=depth):
+        prefix = "projects/" + "".join(chars)
+
+        shards.append(
+            Shard(
+                name=prefix.replace("/", "_"),
+                prefix=prefix,
+                ranges=[("", None)],
+            )
+        )
+
+        # the keys between the previous project shard and the current one
+        other_ranges.append((key_marker, prefix))
+        key_marker = prefix + MAX_CHAR
+
+    other_ranges.append((key_marker, None))
+    shards.append(Shard(name="other", prefix="", ranges=other_ranges))
+
+    return shards
+
+
 class Command(BaseCommand):
     """
     Save metadata from S3 storage project files to disk.
@@ -31,12 +84,33 @@ class Command(BaseCommand):
         --storage_endpoint_url ... \
         --storage_region_name ...
     ```
+
+    For large buckets, use `--output-dir` instead of `--output`.
+    The bucket is then split into shards by the first hex characters of the project ids, which are listed concurrently.
+    Each shard is written into its own gzipped CSV file, so an interrupted export can be resumed by running the same command again.
     """
 
     def add_arguments(self, parser: CommandParser):
         parser.add_argument(
             "-o", "--output", type=str, help="Optional: Name of output file"
         )
+        parser.add_argument(
+            "--output-dir",
+            type=Path,
+            help="Optional: Directory to write a gzipped CSV file per shard into. Already exported shards are skipped.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Number of shards listed concurrently when using `--output-dir`. Defaults to 8.",
+        )
+        parser.add_argument(
+            "--shard-depth",
+            type=int,
+            default=1,
+            help="Number of project id hex characters used to shard the bucket when using `--output-dir`, e.g. 2 makes 256 project shards. Defaults to 1.",
+        )
         parser.add_argument(
             "--storage_access_key_id",
             type=str,
@@ -70,16 +144,19 @@ class Command(BaseCommand):
                 build_config[key] = value
 
         config = S3ConfigObject(**build_config)
+
+        if options.get("output_dir"):
+            self.export_shards(
+                config,
+                options["output_dir"],
+                get_shards(options["shard_depth"]),
+                options["workers"],
+            )
+            return
+
         bucket = self.get_s3_bucket(config)
         output_name = options.get("output")
-        fields = (
-            "id",
-            "key",
-            "e_tag",
-            "size",
-            "last_modified",
-        )
-        rows = self.read_bucket_files(bucket, fields)
+        rows = self.read_bucket_files(bucket, FIELDS)
 
         if output_name:
             handle = open(output_name, "w")
@@ -87,7 +164,7 @@ class Command(BaseCommand):
             handle = stdout
 
         writer = csv.writer(handle, delimiter=",")
-        writer.writerow(fields)
+        writer.writerow(FIELDS)
         writer.writerows(rows)
 
         if output_name:
@@ -95,6 +172,64 @@ class Command(BaseCommand):
 
         logger.info(f"Successfully exported data to {output_name}")
 
+    def export_shards(
+        self,
+        config: S3ConfigObject,
+        output_dir: Path,
+        shards: list[Shard],
+        workers: int,
+    ) -> None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        pending_shards = []
+        for shard in shards:
+            if output_dir.joinpath(f"{shard.name}.csv.gz").exists():
+                self.stdout.write(f'Skipping shard "{shard.name}", already exported.')
+                continue
+
+            pending_shards.append(shard)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.export_shard, config, output_dir, shard): shard
+                for shard in pending_shards
+            }
+
+            for future in as_completed(futures):
+                self.stdout.write(
+                    f'Exported {future.result()} object version(s) of shard "{futures[future].name}".'
+                )
+
+        logger.info(f"Successfully exported data to {output_dir}")
+
+    def export_shard(
+        self, config: S3ConfigObject, output_dir: Path, shard: Shard
+    ) -> int:
+        """Writes the shard into a gzipped CSV file and returns the number of written rows.
+
+        The file is written under a temporary name first, so only completely exported shards are skipped on resume.
+        """
+        # boto3 resources are not thread safe, each shard gets its own
+        bucket = self.get_s3_bucket(config)
+        filename = output_dir.joinpath(f"{shard.name}.csv.gz")
+        tmp_filename = output_dir.joinpath(f"{shard.name}.csv.gz.tmp")
+        rows_count = 0
+
+        with gzip.open(tmp_filename, "wt", newline="") as fh:
+            writer = csv.writer(fh, delimiter=",")
+            writer.writerow(FIELDS)
+
+            for key_marker, stop_before in shard.ranges:
+                for row in self.read_bucket_files(
+                    bucket, FIELDS, shard.prefix, key_marker, stop_before
+                ):
+                    writer.writerow(row)
+                    rows_count += 1
+
+        os.replace(tmp_filename, filename)
+
+        return rows_count
+
     @staticmethod
     def get_s3_bucket(config: S3ConfigObject) -> mypy_boto3_s3.service_resource.Bucket:
         """Get a new S3 Bucket instance using S3ConfigObject"""
@@ -109,11 +244,24 @@ class Command(BaseCommand):
 
     @staticmethod
     def read_bucket_files(
-        bucket, fields: tuple[str], prefix: str = ""
+        bucket,
+        fields: tuple[str, ...],
+        prefix: str = "",
+        key_marker: str = "",
+        stop_before: str | None = None,
     ) -> Generator[list[str], None, None]:
-        """Yield file metadata 1 by 1. Passing `prefix=""` will list all bucket objects."""
+        """Yield file metadata 1 by 1. Passing `prefix=""` will list all bucket objects.
+
+        The listing starts after `key_marker` and stops at the first key which is not less than `stop_before`.
+        """
+        filters = {"Prefix": prefix}
+        if key_marker:
+            filters["KeyMarker"] = key_marker
+
+        for file in bucket.object_versions.filter(**filters):
+            if stop_before is not None and file.key >= stop_before:
+                break
 
-        for file in bucket.object_versions.filter(Prefix=prefix):
             row = []
 
             for field in fields:
@@ -0,0 +1,56 @@
+from collections import defaultdict
+from pathlib import PurePath
+
+from django.core.management.base import BaseCommand
+from qfieldcloud.core import utils
+from qfieldcloud.core.models import Project, ProjectPackage
+
+
+class Command(BaseCommand):
+    """
+    Register the packages already stored on the storage in the stored packages table.
+    """
+
+    help = """
+        Register the packages already stored on the storage in the stored packages table.
+        Needs to be run once, packages created afterwards are registered while being uploaded.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project-id",
+            type=str,
+            help="Register the packages of the given project only.",
+        )
+
+    def handle(self, *args, **options):
+        bucket = utils.get_s3_bucket()
+        projects_qs = Project.objects.all().order_by("pk")
+
+        if options.get("project_id"):
+            projects_qs = projects_qs.filter(pk=options["project_id"])
+
+        registered_count = 0
+        for project in projects_qs.only("pk").iterator():
+            prefix = f"projects/{project.id}/packages/"
+            root_path = PurePath(prefix)
+            package_sizes: dict[str, int] = defaultdict(int)
+
+            for file in bucket.objects.filter(Prefix=prefix):
+                package_id = PurePath(file.key).relative_to(root_path).parts[0]
+                package_sizes[package_id] += file.size
+
+            for package_id, size_bytes in package_sizes.items():
+                _package, created = ProjectPackage.objects.get_or_create(
+                    id=package_id,
+                    defaults={
+                        "project": project,
+                        "state": ProjectPackage.State.STORED,
+                        "size_bytes": size_bytes,
+                    },
+                )
+
+                if created:
+                    registered_count += 1
+
+        self.stdout.write(f"Registered {registered_count} stored package(s).")
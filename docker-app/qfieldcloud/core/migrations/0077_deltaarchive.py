@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2024-06-03 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0076_project_restrict_project_modification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeltaArchive",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255, unique=True)),
+                ("deltafile_ids", models.JSONField(default=list)),
+                ("deltas_count", models.PositiveIntegerField()),
+                ("first_delta_created_at", models.DateTimeField()),
+                ("last_delta_created_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="delta_archives",
+                        to="core.project",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="delta",
+            index=models.Index(
+                condition=models.Q(("last_status__in", ["pending", "started"])),
+                fields=["project", "created_at"],
+                name="core_delta_pending_idx",
+            ),
+        ),
+    ]
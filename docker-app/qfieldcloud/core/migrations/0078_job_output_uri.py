@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2024-06-05 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0077_deltaarchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="output_uri",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 3.2.25 on 2024-06-10 11:02
+
+from django.db import migrations, models
+
+
+def fill_project_details_derived_fields(apps, schema_editor):
+    Project = apps.get_model("core", "Project")
+
+    projects_to_update = []
+    for project in (
+        Project.objects.filter(project_details__isnull=False)
+        .only("id", "project_details")
+        .iterator()
+    ):
+        project_details = project.project_details
+
+        if not project_details:
+            continue
+
+        project.configured_attachment_dirs = (
+            project_details.get("attachment_dirs") or []
+        )
+        project.layers_with_error_count = 0
+
+        layers_by_id = project_details.get("layers_by_id")
+
+        if layers_by_id is not None:
+            project.has_online_vector_data = False
+
+            for layer_data in layers_by_id.values():
+                if layer_data.get("type_name") in (
+                    "VectorLayer",
+                    "Vector",
+                ) and not layer_data.get("filename", ""):
+                    project.has_online_vector_data = True
+
+                if layer_data.get("error_code") != "no_error":
+                    project.layers_with_error_count += 1
+
+        projects_to_update.append(project)
+
+        if len(projects_to_update) >= 1000:
+            Project.objects.bulk_update(
+                projects_to_update,
+                [
+                    "has_online_vector_data",
+                    "configured_attachment_dirs",
+                    "layers_with_error_count",
+                ],
+            )
+            projects_to_update = []
+
+    Project.objects.bulk_update(
+        projects_to_update,
+        [
+            "has_online_vector_data",
+            "configured_attachment_dirs",
+            "layers_with_error_count",
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0078_job_output_uri"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="has_online_vector_data",
+            field=models.BooleanField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="configured_attachment_dirs",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="layers_with_error_count",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(
+            fill_project_details_derived_fields, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2024-06-10 08:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0079_project_details_derived_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectPackage",
+            fields=[
+                ("id", models.UUIDField(primary_key=True, serialize=False)),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("uploading", "Uploading"),
+                            ("stored", "Stored"),
+                            ("deleted", "Deleted"),
+                        ],
+                        default="uploading",
+                        max_length=32,
+                    ),
+                ),
+                ("size_bytes", models.PositiveBigIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stored_packages",
+                        to="core.project",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="projectpackage",
+            index=models.Index(
+                condition=models.Q(("state", "deleted"), _negated=True),
+                fields=["project"],
+                name="core_projectpackage_stored_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2024-06-17 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0081_fileuploadsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectPackageFile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("sha256", models.CharField(max_length=64)),
+                ("md5sum", models.CharField(max_length=32)),
+                ("size_bytes", models.PositiveBigIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                        to="core.projectpackage",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="projectpackagefile",
+            index=models.Index(
+                fields=["sha256"], name="core_projectpackagefile_sha_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="projectpackagefile",
+            constraint=models.UniqueConstraint(
+                fields=("package", "name"),
+                name="core_projectpackagefile_package_name_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2024-06-18 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0082_projectpackagefile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organizationmember",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="teammember",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
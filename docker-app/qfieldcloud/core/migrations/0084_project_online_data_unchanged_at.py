@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2024-06-20 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0083_membership_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="online_data_unchanged_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
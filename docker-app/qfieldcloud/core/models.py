@@ -1,10 +1,11 @@
 import logging
+import math
 import secrets
 import string
 import uuid
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import cast
+from typing import NamedTuple, cast
 
 import django_cryptography.fields
 from deprecated import deprecated
@@ -12,6 +13,7 @@ from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.contrib.gis.db import models
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db import transaction
@@ -21,6 +23,7 @@ from django.db.models import When
 from django.db.models.aggregates import Count, Sum
 from django.db.models.fields.json import JSONField
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.safestring import SafeString, mark_safe
 from django.utils.translation import gettext as _
@@ -368,6 +371,29 @@ class Person(User):
         return super().save(*args, **kwargs)
 
 
+# Version of all the cached account summaries, bumped to invalidate them at once
+SUMMARIES_VERSION_CACHE_KEY = "account_summary:version"
+
+
+class AccountSummary(NamedTuple):
+    """Storage and current subscription values of an account, needed on almost every request.
+
+    See `UserAccount.summary`.
+    """
+
+    is_subscription_active: bool
+    is_premium: bool
+    is_external_db_supported: bool
+    storage_keep_versions: int
+    max_premium_collaborators_per_private_project: int
+    active_storage_total_bytes: int
+    storage_used_bytes: int
+
+    @property
+    def storage_free_bytes(self) -> int:
+        return self.active_storage_total_bytes - self.storage_used_bytes
+
+
 class UserAccount(models.Model):
     NOTIFS_IMMEDIATELY = timedelta(minutes=0)
     NOTIFS_HOURLY = timedelta(hours=1)
@@ -445,6 +471,69 @@ class UserAccount(models.Model):
 
         return used_quota
 
+    @property
+    def summary(self) -> AccountSummary:
+        """Returns the cached summary of the storage and the current subscription of the account.
+
+        The summary is invalidated when the projects, the subscription or the packages of the account change.
+        The summaries of all accounts are invalidated at once when any plan changes, see `invalidate_all_summaries`.
+        NOTE the summary might be outdated up to `QFIELDCLOUD_ACCOUNT_SUMMARY_CACHE_TIMEOUT` seconds after changes which are not signaled,
+        e.g. `QuerySet.update()` calls on projects or the current subscription period expiring.
+        """
+        cache_key = self.get_summary_cache_key(self.pk)
+        cached_values = cache.get_many([cache_key, SUMMARIES_VERSION_CACHE_KEY])
+        summaries_version = cached_values.get(SUMMARIES_VERSION_CACHE_KEY, 0)
+        cached_version, summary = cached_values.get(cache_key, (None, None))
+
+        if summary is None or cached_version != summaries_version:
+            subscription = self.current_subscription
+            summary = AccountSummary(
+                is_subscription_active=subscription.is_active,
+                is_premium=subscription.plan.is_premium,
+                is_external_db_supported=subscription.plan.is_external_db_supported,
+                storage_keep_versions=subscription.plan.storage_keep_versions,
+                max_premium_collaborators_per_private_project=subscription.plan.max_premium_collaborators_per_private_project,
+                active_storage_total_bytes=subscription.active_storage_total_bytes,
+                storage_used_bytes=self.storage_used_bytes,
+            )
+            cache.set(
+                cache_key,
+                (summaries_version, summary),
+                settings.QFIELDCLOUD_ACCOUNT_SUMMARY_CACHE_TIMEOUT,
+            )
+
+        return summary
+
+    @staticmethod
+    def get_summary_cache_key(user_id: int) -> str:
+        return f"account_summary:{user_id}"
+
+    @classmethod
+    def invalidate_summaries(cls, user_ids: list[int]) -> None:
+        """Invalidates the cached summaries of the given accounts."""
+        cache_keys = [cls.get_summary_cache_key(user_id) for user_id in user_ids]
+
+        if not cache_keys:
+            return
+
+        cache.delete_many(cache_keys)
+
+        # a concurrent request might cache the values from before the transaction is committed
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+    @classmethod
+    def invalidate_all_summaries(cls) -> None:
+        """Invalidates the cached summaries of all accounts, by bumping the version the summaries are cached with."""
+
+        def bump_version():
+            cache.add(SUMMARIES_VERSION_CACHE_KEY, 0, None)
+            cache.incr(SUMMARIES_VERSION_CACHE_KEY)
+
+        bump_version()
+
+        # a concurrent request might cache the values from before the transaction is committed
+        transaction.on_commit(bump_version)
+
     @property
     def storage_free_bytes(self) -> float:
         """Returns the storage quota left in bytes (quota from account and packages minus storage of all owned projects)"""
@@ -725,6 +814,9 @@ class OrganizationMember(models.Model):
 
     is_public = models.BooleanField(default=False)
 
+    # NOTE null for the memberships created before the creation time was recorded
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+
     def __str__(self):
         return self.organization.username + ": " + self.member.username
 
@@ -822,6 +914,9 @@ class TeamMember(models.Model):
         limit_choices_to=models.Q(type=User.Type.PERSON),
     )
 
+    # NOTE null for the memberships created before the creation time was recorded
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+
     def clean(self) -> None:
         if (
             not self.team.team_organization.members.filter(member=self.member).exists()
@@ -916,6 +1011,13 @@ class ProjectQueryset(models.QuerySet):
         return qs
 
 
+class ProjectManager(models.Manager.from_queryset(ProjectQueryset)):  # type: ignore
+    def get_queryset(self):
+        # `project_details` holds the whole layer inventory and is rarely needed,
+        # the frequently read values are stored in separate columns, see `Project.set_project_details`
+        return super().get_queryset().defer("project_details")
+
+
 class Project(models.Model):
     """Represent a QFieldcloud project.
     It corresponds to a directory on the file system.
@@ -941,7 +1043,7 @@ class Project(models.Model):
         QGISCORE = "qgiscore", _("QGIS Core Offline Editing (deprecated)")
         PYTHONMINI = "pythonmini", _("Optimized Packager")
 
-    objects = ProjectQueryset.as_manager()
+    objects = ProjectManager()
 
     _status_code = StatusCode.OK
 
@@ -970,6 +1072,15 @@ class Project(models.Model):
     description = models.TextField(blank=True)
     project_filename = models.TextField(blank=True, null=True)
     project_details = models.JSONField(blank=True, null=True)
+
+    # Values derived from `project_details` when the projectfile is processed, so they can be read without loading the whole document.
+    # All of them are NULL when the project details are missing.
+    has_online_vector_data = models.BooleanField(blank=True, null=True, editable=False)
+    configured_attachment_dirs = models.JSONField(blank=True, null=True, editable=False)
+    layers_with_error_count = models.PositiveIntegerField(
+        blank=True, null=True, editable=False
+    )
+
     is_public = models.BooleanField(
         default=False,
         help_text=_(
@@ -995,6 +1106,8 @@ class Project(models.Model):
     # NOTE we can track only the file based layers, WFS, WMS, PostGIS etc are impossible to track
     data_last_updated_at = models.DateTimeField(blank=True, null=True)
     data_last_packaged_at = models.DateTimeField(blank=True, null=True)
+    # the last time the package job probed the PostGIS layers and found them unchanged since the previous package
+    online_data_unchanged_at = models.DateTimeField(blank=True, null=True)
 
     last_package_job = models.ForeignKey(
         "PackageJob",
@@ -1059,14 +1172,12 @@ class Project(models.Model):
         Returns:
             int: the number of file versions, should be always greater than 1
         """
-        subscription = self.owner.useraccount.current_subscription
+        summary = self.owner.useraccount.summary
 
-        if subscription.plan.is_premium:
-            keep_count = (
-                self.storage_keep_versions or subscription.plan.storage_keep_versions
-            )
+        if summary.is_premium:
+            keep_count = self.storage_keep_versions or summary.storage_keep_versions
         else:
-            keep_count = subscription.plan.storage_keep_versions
+            keep_count = summary.storage_keep_versions
 
         assert keep_count >= 1, "Ensure that we don't destroy all file versions!"
 
@@ -1108,10 +1219,7 @@ class Project(models.Model):
         Returns:
             list[str]: A list configured attachment dirs for the project.
         """
-        attachment_dirs = []
-
-        if self.project_details and self.project_details.get("attachment_dirs"):
-            attachment_dirs = self.project_details.get("attachment_dirs", [])
+        attachment_dirs = self.configured_attachment_dirs
 
         if not attachment_dirs:
             attachment_dirs = ["DCIM"]
@@ -1137,19 +1245,33 @@ class Project(models.Model):
     def users(self):
         return User.objects.for_project(self)
 
-    @property
-    def has_online_vector_data(self) -> bool | None:
-        """Returns None if project details or layers details are not available"""
+    def set_project_details(self, project_details: dict | None) -> None:
+        """Sets the project details and the values derived from them.
 
-        if not self.project_details:
-            return None
+        NOTE this function does NOT save the `Project` instance.
+
+        Args:
+            project_details (dict | None): the project details as extracted by the `process_projectfile` job
+        """
+        self.project_details = project_details
 
-        layers_by_id = self.project_details.get("layers_by_id")
+        if not project_details:
+            self.has_online_vector_data = None
+            self.configured_attachment_dirs = None
+            self.layers_with_error_count = None
+            return
+
+        self.configured_attachment_dirs = project_details.get("attachment_dirs") or []
+
+        layers_by_id = project_details.get("layers_by_id")
 
         if layers_by_id is None:
-            return None
+            self.has_online_vector_data = None
+            self.layers_with_error_count = 0
+            return
 
-        has_online_vector_layers = False
+        self.has_online_vector_data = False
+        self.layers_with_error_count = 0
 
         for layer_data in layers_by_id.values():
             # NOTE QGIS 3.30.x returns "Vector", while previous versions return "VectorLayer"
@@ -1157,26 +1279,38 @@ class Project(models.Model):
                 "VectorLayer",
                 "Vector",
             ) and not layer_data.get("filename", ""):
-                has_online_vector_layers = True
-                break
+                self.has_online_vector_data = True
 
-        return has_online_vector_layers
+            if layer_data.get("error_code") != "no_error":
+                self.layers_with_error_count += 1
 
     @property
     def can_repackage(self) -> bool:
         return True
 
+    @property
+    def is_online_data_unchanged(self) -> bool:
+        """Whether the package job recently probed the online layers and found them unchanged since the last package."""
+        if not self.online_data_unchanged_at or not self.data_last_packaged_at:
+            return False
+
+        return (
+            self.online_data_unchanged_at > self.data_last_packaged_at
+            and (timezone.now() - self.online_data_unchanged_at).total_seconds()
+            < settings.QFIELDCLOUD_ONLINE_DATA_PROBE_TIMEOUT
+        )
+
     @property
     def needs_repackaging(self) -> bool:
         if (
             # if has_online_vector_data is None (happens when the project details are missing)
             # we assume there might be
-            self.has_online_vector_data is False
+            (self.has_online_vector_data is False or self.is_online_data_unchanged)
             and self.data_last_updated_at
             and self.data_last_packaged_at
             and self.last_package_job is not None
         ):
-            # if all vector layers are file based and have been packaged after the last update, it is safe to say there are no modifications
+            # if all vector layers are file based or were probed unchanged and have been packaged after the last update, it is safe to say there are no modifications
             return self.data_last_packaged_at < self.data_last_updated_at
         else:
             # if the project has online vector layers (PostGIS/WFS/etc) we cannot be sure if there are modification or not, so better say there are
@@ -1275,10 +1409,11 @@ class Project(models.Model):
         else:
             status = Project.Status.OK
             status_code = Project.StatusCode.OK
-            max_premium_collaborators_per_private_project = self.owner.useraccount.current_subscription.plan.max_premium_collaborators_per_private_project
+            max_premium_collaborators_per_private_project = self.owner.useraccount.summary.max_premium_collaborators_per_private_project
 
             # TODO use self.problems to get if there are project problems
-            if not self.project_filename or not self.project_details:
+            # the derived `layers_with_error_count` is NULL when `project_details` are missing
+            if not self.project_filename or self.layers_with_error_count is None:
                 status = Project.Status.FAILED
                 status_code = Project.StatusCode.FAILED_PROCESS_PROJECTFILE
             elif (
@@ -1299,15 +1434,40 @@ class Project(models.Model):
 
     @property
     def storage_size_perc(self) -> float:
-        if self.owner.useraccount.current_subscription.active_storage_total_bytes > 0:
-            return (
-                self.file_storage_bytes
-                / self.owner.useraccount.current_subscription.active_storage_total_bytes
-                * 100
-            )
+        active_storage_total_bytes = (
+            self.owner.useraccount.summary.active_storage_total_bytes
+        )
+
+        if active_storage_total_bytes > 0:
+            return self.file_storage_bytes / active_storage_total_bytes * 100
         else:
             return 100
 
+    @property
+    def package_storage_bytes(self) -> int:
+        """The storage used by the packages of the project which are not deleted yet."""
+        stored_packages = self.stored_packages.exclude(
+            state=ProjectPackage.State.DELETED,
+        )
+
+        # packages without a manifest have their own copy of the files
+        legacy_bytes = (
+            stored_packages.filter(files__isnull=True).aggregate(
+                sum_bytes=Sum("size_bytes")
+            )["sum_bytes"]
+            or 0
+        )
+
+        # the blobs are shared between the packages, so each one is counted once
+        blobs = (
+            ProjectPackageFile.objects.filter(package__in=stored_packages)
+            .order_by()
+            .values_list("sha256", "size_bytes")
+            .distinct()
+        )
+
+        return legacy_bytes + sum(size_bytes for _sha256, size_bytes in blobs)
+
     @property
     def direct_collaborators(self):
         if self.owner.is_organization:
@@ -1586,6 +1746,16 @@ class Delta(models.Model):
         through="ApplyJobDelta",
     )
 
+    class Meta:
+        indexes = [
+            # the hot queries only touch the deltas that still wait to be applied
+            models.Index(
+                fields=["project", "created_at"],
+                name="core_delta_pending_idx",
+                condition=Q(last_status__in=["pending", "started"]),
+            ),
+        ]
+
     def __str__(self):
         return str(self.id) + ", project: " + str(self.project.id)
 
@@ -1617,6 +1787,39 @@ class Delta(models.Model):
         return self.content.get("method")
 
 
+class DeltaArchive(models.Model):
+    """Deltas moved out of the `core_delta` table into a gzipped JSONL object on the storage.
+
+    Each line of the archive object is a delta as serialized by `DeltaSerializer`.
+    See the `archivedeltas` management command.
+    """
+
+    # the statuses which are considered final and therefore safe to be archived
+    ARCHIVABLE_STATUSES = [
+        Delta.Status.APPLIED,
+        Delta.Status.IGNORED,
+    ]
+
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="delta_archives",
+    )
+
+    # the storage key of the archive object
+    key = models.CharField(max_length=255, unique=True)
+
+    # the deltafile ids of the archived deltas, to find the archives when listing deltas of a deltafile
+    deltafile_ids = JSONField(default=list)
+    deltas_count = models.PositiveIntegerField()
+    first_delta_created_at = models.DateTimeField()
+    last_delta_created_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.key} ({self.deltas_count} deltas)"
+
+
 class Job(models.Model):
     objects = InheritanceManager()
 
@@ -1644,6 +1847,8 @@ class Job(models.Model):
         max_length=32, choices=Status.choices, default=Status.PENDING, db_index=True
     )
     output = models.TextField(null=True)
+    # the storage key of the gzipped full output, set only when `output` is truncated
+    output_uri = models.CharField(max_length=255, blank=True, default="")
     feedback = JSONField(null=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -1661,6 +1866,37 @@ class Job(models.Model):
     def short_id(self) -> str:
         return str(self.id)[0:8]
 
+    @property
+    def is_output_truncated(self) -> bool:
+        return bool(self.output_uri)
+
+    def set_output(self, output: str) -> None:
+        """Sets the job output, storing the full output on the storage if it is too long for the database.
+
+        NOTE this function does NOT save the `Job` instance.
+
+        Args:
+            output (str): the full job output
+        """
+        head_chars = settings.QFIELDCLOUD_JOB_OUTPUT_HEAD_CHARS
+        tail_chars = settings.QFIELDCLOUD_JOB_OUTPUT_TAIL_CHARS
+
+        if len(output) <= head_chars + tail_chars:
+            self.output = output
+            self.output_uri = ""
+            return
+
+        self.output_uri = storage.upload_job_output(self, output)
+        self.output = "\n".join(
+            [
+                output[:head_chars],
+                "",
+                f"[QFC] ... {len(output) - head_chars - tail_chars} characters truncated, see the full output ...",
+                "",
+                output[-tail_chars:],
+            ]
+        )
+
     @property
     def fallback_output(self) -> str:
         # show whatever is the output if it is present
@@ -1720,6 +1956,156 @@ class PackageJob(Job):
         verbose_name_plural = "Jobs: package"
 
 
+class ProjectPackageQueryset(models.QuerySet):
+    def obsolete(self):
+        """Returns the stored packages that can be deleted from the storage.
+
+        A package is obsolete when it is not the last package of its project and its package job is not active anymore.
+        """
+        active_jobs = Job.objects.filter(
+            pk=OuterRef("pk"),
+        ).exclude(
+            status__in=(Job.Status.FAILED, Job.Status.FINISHED),
+        )
+
+        return (
+            self.exclude(state=ProjectPackage.State.DELETED)
+            .exclude(project__last_package_job_id=F("pk"))
+            .exclude(Exists(active_jobs))
+        )
+
+
+class ProjectPackage(models.Model):
+    """A package stored on the storage.
+
+    Keeps track of the stored packages, so the obsolete ones can be found without listing the storage.
+    The package id is the same as the id of the package job that created it.
+
+    The files of a package are stored once by their sha256 under `projects/<project_id>/package_blobs/<sha256>`,
+    and the package is a manifest of `ProjectPackageFile` referencing them. Packages created before that have
+    their own copy of the files under `projects/<project_id>/packages/<package_id>/` and no manifest.
+    """
+
+    objects = ProjectPackageQueryset.as_manager()
+
+    class State(models.TextChoices):
+        UPLOADING = "uploading", _("Uploading")
+        STORED = "stored", _("Stored")
+        DELETED = "deleted", _("Deleted")
+
+    id = models.UUIDField(primary_key=True)
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="stored_packages",
+    )
+    state = models.CharField(
+        choices=State.choices, default=State.UPLOADING, max_length=32
+    )
+
+    # the total size of the uploaded package files
+    size_bytes = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the packages that are still on the storage, see `ProjectPackageQueryset.obsolete`
+            models.Index(
+                fields=["project"],
+                name="core_projectpackage_stored_idx",
+                condition=~Q(state="deleted"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}/{self.id} ({self.state})"
+
+
+class ProjectPackageFile(models.Model):
+    """A file of a package, referencing the content-addressed blob with its contents."""
+
+    package = models.ForeignKey(
+        ProjectPackage,
+        on_delete=models.CASCADE,
+        related_name="files",
+    )
+    name = models.TextField()
+    sha256 = models.CharField(max_length=64)
+    md5sum = models.CharField(max_length=32)
+    size_bytes = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["package", "name"],
+                name="core_projectpackagefile_package_name_uniq",
+            ),
+        ]
+        indexes = [
+            # find whether a blob is still referenced, see `storage.delete_orphaned_package_blobs`
+            models.Index(
+                fields=["sha256"],
+                name="core_projectpackagefile_sha_idx",
+            ),
+        ]
+
+    @property
+    def key(self) -> str:
+        return storage.get_package_blob_key(self.package.project_id, self.sha256)
+
+    def __str__(self):
+        return f"{self.package_id}/{self.name} ({self.sha256})"
+
+
+class FileUploadSession(models.Model):
+    """A resumable upload of a project file, backed by a S3 multipart upload.
+
+    The file is uploaded in chunks of `chunk_size` bytes, each stored as a part of the multipart upload.
+    The storage is the source of truth about the uploaded chunks, so a chunk can be uploaded again if interrupted.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        related_name="file_upload_sessions",
+    )
+    filename = models.TextField()
+
+    # the S3 key and the id of the multipart upload
+    key = models.TextField()
+    upload_id = models.TextField()
+
+    # the sha256 of the file as declared by the client, checked against the assembled file when finalized
+    sha256sum = models.CharField(max_length=64)
+
+    # the total size of the file, checked against the storage quota when the session is created
+    size_bytes = models.PositiveBigIntegerField()
+    chunk_size_bytes = models.PositiveIntegerField()
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # set once the multipart upload is completed, the session is deleted once the project is updated
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def chunks_count(self) -> int:
+        return max(math.ceil(self.size_bytes / self.chunk_size_bytes), 1)
+
+    def get_chunk_size(self, offset: int) -> int:
+        """Returns the expected size of the chunk starting at the given offset."""
+        return min(self.chunk_size_bytes, self.size_bytes - offset)
+
+    def __str__(self):
+        return f"{self.project_id}/{self.filename} ({self.id})"
+
+
 class ProcessProjectfileJob(Job):
     def check_can_be_created(self):
         # Alsways create jobs because they are cheap
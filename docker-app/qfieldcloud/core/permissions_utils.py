@@ -805,19 +805,15 @@ def can_abort_subscription_cancellation(
 def check_supported_regarding_owner_account(
     project: Project, ignore_online_layers: bool = False
 ) -> Literal[True]:
-    account = project.owner.useraccount
-    subscription = account.current_subscription
+    summary = project.owner.useraccount.summary
 
-    if not subscription.is_active:
+    if not summary.is_subscription_active:
         raise InactiveSubscriptionError
-    if not account.storage_free_bytes > 0:
+    if not summary.storage_free_bytes > 0:
         raise QuotaError
 
     if not ignore_online_layers:
-        if (
-            project.has_online_vector_data
-            and not subscription.plan.is_external_db_supported
-        ):
+        if project.has_online_vector_data and not summary.is_external_db_supported:
             raise PlanInsufficientError(
                 _(
                     "Owner's subscription plan does not support online vector layer datasource."
@@ -844,7 +840,7 @@ def check_can_upload_file(project, client_type, file_size_bytes: int) -> bool:
     if can_always_upload_files(client_type):
         return True
 
-    quota_left_bytes = project.owner.useraccount.storage_free_bytes
+    quota_left_bytes = project.owner.useraccount.summary.storage_free_bytes
     if file_size_bytes > quota_left_bytes:
         raise QuotaError(
             f"Requiring {file_size_bytes} bytes of storage but only {quota_left_bytes} bytes available."
@@ -0,0 +1,15 @@
+from rest_framework import renderers
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Allows views to respond with `text/event-stream` (Server-Sent Events).
+
+    The views are expected to return a `StreamingHttpResponse` themselves, this renderer only makes the content negotiation pass.
+    """
+
+    media_type = "text/event-stream"
+    format = "event-stream"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
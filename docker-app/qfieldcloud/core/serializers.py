@@ -5,6 +5,7 @@ from qfieldcloud.core import exceptions
 from qfieldcloud.core.models import (
     ApplyJob,
     Delta,
+    FileUploadSession,
     Job,
     Organization,
     OrganizationMember,
@@ -509,3 +510,44 @@ class LatestPackageSerializer(serializers.Serializer):
     package_id = serializers.UUIDField()
     packaged_at = serializers.DateTimeField()
     data_last_updated_at = serializers.DateTimeField()
+
+
+class FileUploadSessionSerializer(serializers.ModelSerializer):
+    sha256 = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$",
+        write_only=True,
+        help_text="The sha256 of the file, stored as file metadata. The upload cannot be finalized if the uploaded file does not match it.",
+    )
+    uploaded_offsets = serializers.SerializerMethodField(
+        help_text="Offsets of the chunks already uploaded."
+    )
+    uploaded_bytes = serializers.SerializerMethodField(
+        help_text="Total size of the chunks already uploaded."
+    )
+
+    def get_uploaded_offsets(self, obj: FileUploadSession) -> list[int]:
+        return [
+            (part["PartNumber"] - 1) * obj.chunk_size_bytes
+            for part in self.context.get("parts", [])
+        ]
+
+    def get_uploaded_bytes(self, obj: FileUploadSession) -> int:
+        return sum(part["Size"] for part in self.context.get("parts", []))
+
+    class Meta:
+        model = FileUploadSession
+        fields = (
+            "id",
+            "filename",
+            "size_bytes",
+            "chunk_size_bytes",
+            "sha256",
+            "uploaded_offsets",
+            "uploaded_bytes",
+            "created_at",
+        )
+        read_only_fields = (
+            "id",
+            "chunk_size_bytes",
+            "created_at",
+        )
@@ -1,8 +1,47 @@
 from axes.signals import user_locked_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from qfieldcloud.core.exceptions import TooManyLoginAttemptsError
+from qfieldcloud.core.models import Job, Project, UserAccount
+from qfieldcloud.core.utils2 import streams
 
 
 @receiver(user_locked_out)
 def raise_permission_denied(*args, **kwargs):
     raise TooManyLoginAttemptsError()
+
+
+@receiver(post_save)
+def publish_job_status(sender, instance, created, update_fields, **kwargs):
+    # `post_save` is sent with the concrete job class as sender, e.g. `PackageJob`
+    if not isinstance(instance, Job):
+        return
+
+    if not created and update_fields is not None and "status" not in update_fields:
+        return
+
+    transaction.on_commit(lambda: streams.publish_job_status(instance))
+
+
+@receiver(pre_save, sender=Project)
+def invalidate_previous_owner_account_summary(sender, instance, **kwargs):
+    if instance._state.adding:
+        return
+
+    previous_owner_id = (
+        Project.objects.filter(pk=instance.pk)
+        .values_list("owner_id", flat=True)
+        .first()
+    )
+
+    # the project and its storage moved to another owner
+    if previous_owner_id is not None and previous_owner_id != instance.owner_id:
+        UserAccount.invalidate_summaries([previous_owner_id])
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def invalidate_owner_account_summary(sender, instance, **kwargs):
+    # the storage used by the owner might have changed
+    UserAccount.invalidate_summaries([instance.owner_id])
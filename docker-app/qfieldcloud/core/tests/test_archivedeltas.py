@@ -0,0 +1,137 @@
+import io
+import json
+import uuid
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from qfieldcloud.core.models import Delta, DeltaArchive, Person, Project
+from qfieldcloud.core.utils import get_s3_bucket
+from qfieldcloud.core.utils2 import storage
+
+from .utils import set_subscription, setup_subscription_plans
+
+
+class QfcTestCase(TestCase):
+    def setUp(self):
+        setup_subscription_plans()
+
+        self.u1 = Person.objects.create(username="u1")
+        set_subscription(self.u1, "default_user")
+        self.project = Project.objects.create(name="p1", owner=self.u1)
+        self.deltafile_id = uuid.uuid4()
+
+        get_s3_bucket().objects.filter(Prefix="projects/").delete()
+
+    def create_delta(self, status: Delta.Status, days_ago: int) -> Delta:
+        delta = Delta.objects.create(
+            deltafile_id=self.deltafile_id,
+            project=self.project,
+            client_id=uuid.uuid4(),
+            created_by=self.u1,
+            content={"method": "patch"},
+            last_status=status,
+        )
+        Delta.objects.filter(pk=delta.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+
+        return delta
+
+    def call_command(self, *args, **kwargs):
+        out = io.StringIO()
+        call_command("archivedeltas", *args, stdout=out, stderr=out, **kwargs)
+        return out.getvalue()
+
+    def test_nothing_to_archive(self):
+        self.create_delta(Delta.Status.APPLIED, 1)
+        self.create_delta(Delta.Status.PENDING, 100)
+
+        out = self.call_command()
+
+        self.assertEqual(out.strip(), "No deltas to archive.")
+        self.assertEqual(Delta.objects.count(), 2)
+        self.assertEqual(DeltaArchive.objects.count(), 0)
+
+    def test_dry_run(self):
+        self.create_delta(Delta.Status.APPLIED, 100)
+
+        out = self.call_command("--dry-run")
+
+        self.assertEqual(
+            out.strip(),
+            "Dry run, 1 delta(s) from 1 project(s) would be archived.",
+        )
+        self.assertEqual(Delta.objects.count(), 1)
+
+    def test_archive_deltas(self):
+        applied_delta = self.create_delta(Delta.Status.APPLIED, 100)
+        ignored_delta = self.create_delta(Delta.Status.IGNORED, 95)
+        conflict_delta = self.create_delta(Delta.Status.CONFLICT, 100)
+        recent_delta = self.create_delta(Delta.Status.APPLIED, 1)
+
+        self.call_command("--batch-size", "1")
+
+        self.assertEqual(
+            set(Delta.objects.values_list("pk", flat=True)),
+            {conflict_delta.pk, recent_delta.pk},
+        )
+        self.assertEqual(DeltaArchive.objects.count(), 2)
+
+        archived_deltas = storage.get_archived_deltas(
+            self.project, str(self.deltafile_id)
+        )
+
+        self.assertEqual(
+            [d["id"] for d in archived_deltas],
+            [str(applied_delta.pk), str(ignored_delta.pk)],
+        )
+        self.assertEqual(archived_deltas[0]["status"], "STATUS_APPLIED")
+        self.assertEqual(archived_deltas[1]["status"], "STATUS_IGNORED")
+        self.assertEqual(archived_deltas[0]["created_by"], "u1")
+
+    def test_list_archived_deltas(self):
+        archived_delta1 = self.create_delta(Delta.Status.APPLIED, 100)
+        archived_delta2 = self.create_delta(Delta.Status.APPLIED, 99)
+        archived_delta3 = self.create_delta(Delta.Status.IGNORED, 98)
+        live_delta = self.create_delta(Delta.Status.PENDING, 1)
+
+        self.call_command("--batch-size", "2")
+
+        self.assertEqual(DeltaArchive.objects.count(), 2)
+
+        self.client.force_login(self.u1)
+        url = f"/api/v1/deltas/{self.project.id}/"
+
+        # the archived deltas are listed only on request
+        response = self.client.get(url)
+        self.assertEqual([d["id"] for d in response.json()], [str(live_delta.pk)])
+
+        response = self.client.get(url, {"include_archived": "true"})
+        deltas = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(
+            [d["id"] for d in deltas],
+            [
+                str(archived_delta1.pk),
+                str(archived_delta2.pk),
+                str(archived_delta3.pk),
+                str(live_delta.pk),
+            ],
+        )
+        # archived deltas are serialized the same as the live ones
+        self.assertEqual(set(deltas[0].keys()), set(deltas[3].keys()))
+
+        # a page spanning over the second archive and the live deltas
+        response = self.client.get(
+            url, {"include_archived": "true", "limit": 2, "offset": 2}
+        )
+        self.assertEqual(
+            [d["id"] for d in response.json()],
+            [str(archived_delta3.pk), str(live_delta.pk)],
+        )
+        self.assertEqual(int(response.headers["X-Total-Count"]), 4)
+
+        # the deltas of a deltafile always include the archived ones
+        response = self.client.get(f"{url}{self.deltafile_id}/")
+        self.assertEqual(len(response.json()), 4)
@@ -0,0 +1,141 @@
+import logging
+
+from auditlog.context import set_actor
+from auditlog.models import LogEntry
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from qfieldcloud.core.models import Person, Project
+from qfieldcloud.core.utils2.audit import audit
+from rest_framework.test import APITransactionTestCase
+
+from .utils import setup_subscription_plans
+
+logging.disable(logging.CRITICAL)
+
+
+class QfcTestCase(APITransactionTestCase):
+    def setUp(self):
+        setup_subscription_plans()
+
+        self.user1 = Person.objects.create_user(username="user1", password="abc123")
+        self.project1 = Project.objects.create(name="project1", owner=self.user1)
+
+    def get_file_entries(self):
+        return LogEntry.objects.filter(
+            object_pk=str(self.project1.pk),
+            changes__contains=".txt",
+        ).order_by("pk")
+
+    def test_audit_outside_transaction(self):
+        log_entry = audit(
+            self.project1,
+            LogEntry.Action.CREATE,
+            changes={"file.txt": [None, "etag"]},
+            actor=self.user1,
+        )
+
+        self.assertIsNotNone(log_entry.pk)
+        self.assertEqual(self.get_file_entries().count(), 1)
+
+    def test_audit_within_transaction_is_written_on_commit(self):
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                for idx in range(5):
+                    audit(
+                        self.project1,
+                        LogEntry.Action.DELETE,
+                        changes={f"file{idx}.txt": ["etag", None]},
+                        actor=self.user1,
+                    )
+
+                self.assertEqual(self.get_file_entries().count(), 0)
+
+        # all the entries are written with a single query
+        inserts = [
+            q
+            for q in ctx.captured_queries
+            if q["sql"].startswith('INSERT INTO "auditlog_logentry"')
+        ]
+        self.assertEqual(len(inserts), 1)
+
+        entries = list(self.get_file_entries())
+
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[0].changes_dict, {"file0.txt": ["etag", None]})
+        self.assertEqual(entries[0].actor, self.user1)
+        self.assertEqual(entries[0].object_repr, str(self.project1))
+        self.assertEqual(entries[0].content_type.model_class(), Project)
+
+    def test_audit_within_rolled_back_transaction_is_dropped(self):
+        with transaction.atomic():
+            audit(
+                self.project1,
+                LogEntry.Action.DELETE,
+                changes={"file1.txt": ["etag", None]},
+            )
+
+            try:
+                with transaction.atomic():
+                    audit(
+                        self.project1,
+                        LogEntry.Action.DELETE,
+                        changes={"file2.txt": ["etag", None]},
+                    )
+                    raise Exception("Rollback")
+            except Exception:
+                pass
+
+        entries = list(self.get_file_entries())
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].changes_dict, {"file1.txt": ["etag", None]})
+
+    def test_audit_without_changes_is_not_written(self):
+        self.assertIsNone(audit(self.project1, LogEntry.Action.UPDATE))
+
+        with transaction.atomic():
+            self.assertIsNone(audit(self.project1, LogEntry.Action.UPDATE))
+
+        self.assertEqual(
+            LogEntry.objects.filter(object_pk=str(self.project1.pk)).count(), 0
+        )
+
+    def test_audit_within_transaction_keeps_request_context(self):
+        with set_actor(self.user1, remote_addr="192.0.2.1"):
+            with transaction.atomic():
+                audit(
+                    self.project1,
+                    LogEntry.Action.UPDATE,
+                    changes={"file1.txt": ["etag1", "etag2"]},
+                )
+
+        entries = list(self.get_file_entries())
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].remote_addr, "192.0.2.1")
+        self.assertEqual(entries[0].actor, self.user1)
+
+    def test_audit_create_replaces_previous_entries(self):
+        audit(
+            self.project1,
+            LogEntry.Action.UPDATE,
+            changes={"file1.txt": ["etag1", "etag2"]},
+        )
+
+        with transaction.atomic():
+            audit(
+                self.project1,
+                LogEntry.Action.UPDATE,
+                changes={"file2.txt": ["etag1", "etag2"]},
+            )
+            audit(
+                self.project1,
+                LogEntry.Action.CREATE,
+                changes={"file3.txt": [None, "etag1"]},
+            )
+
+        # as with `LogEntry.objects.log_create`
+        entries = list(self.get_file_entries())
+
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].changes_dict, {"file3.txt": [None, "etag1"]})
@@ -1,6 +1,9 @@
 import csv
+import gzip
 import io
 import os
+import tempfile
+from pathlib import Path
 
 from django.core.management import call_command
 from django.test import TestCase
@@ -32,6 +35,7 @@ class QfcTestCase(TestCase):
 
         # Project
         p = Project.objects.create(name="test_project", owner=user)
+        cls.project = p
         file = io.BytesIO(b"Hello world!")
         get_s3_bucket().objects.filter(Prefix="projects/").delete()
         storage.upload_project_file(p, file, "project.qgs")
@@ -74,3 +78,76 @@ class QfcTestCase(TestCase):
             "--storage_secret_access_key",
             self.credentials["storage_secret_access_key"],
         )
+
+    def test_output_to_dir(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            out = io.StringIO()
+            args = [
+                "extracts3data",
+                "--output-dir",
+                tmpdir,
+                "--storage_access_key_id",
+                self.credentials["storage_access_key_id"],
+                "--storage_bucket_name",
+                self.credentials["storage_bucket_name"],
+                "--storage_endpoint_url",
+                self.credentials["storage_endpoint_url"],
+                "--storage_region_name",
+                self.credentials["storage_region_name"],
+                "--storage_secret_access_key",
+                self.credentials["storage_secret_access_key"],
+            ]
+            call_command(*args, stdout=out)
+
+            output_files = sorted(p.name for p in Path(tmpdir).iterdir())
+            self.assertEqual(len(output_files), 17)
+            self.assertIn("other.csv.gz", output_files)
+
+            shard_name = f"projects_{str(self.project.id)[0]}"
+            with gzip.open(Path(tmpdir).joinpath(f"{shard_name}.csv.gz"), "rt") as fh:
+                entries = list(csv.reader(fh, delimiter=","))
+
+            self.assertEqual(
+                entries[0], ["id", "key", "e_tag", "size", "last_modified"]
+            )
+            self.assertIn(
+                f"projects/{self.project.id}/files/project.qgs",
+                [entry[1] for entry in entries[1:]],
+            )
+
+            # the already exported shards are skipped
+            out = io.StringIO()
+            call_command(*args, stdout=out)
+
+            self.assertIn(
+                f'Skipping shard "{shard_name}", already exported.', out.getvalue()
+            )
+            self.assertNotIn("Exported", out.getvalue())
+
+    def test_calcprojectstorage_reports_drift(self):
+        Project.objects.filter(pk=self.project.pk).update(
+            project_filename="project.qgs",
+            file_storage_bytes=1,
+        )
+
+        out = io.StringIO()
+        call_command(
+            "calcprojectstorage", str(self.project.id), "--dry-run", stdout=out
+        )
+
+        self.assertIn(
+            f'Project files storage size for "{self.project.id}" drifted by 11 bytes, was 1 bytes.',
+            out.getvalue(),
+        )
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.file_storage_bytes, 1)
+
+        out = io.StringIO()
+        call_command("calcprojectstorage", str(self.project.id), stdout=out)
+
+        self.assertIn(
+            "Calculated 1 project(s), 1 drifted by 11 bytes in total.",
+            out.getvalue(),
+        )
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.file_storage_bytes, 12)
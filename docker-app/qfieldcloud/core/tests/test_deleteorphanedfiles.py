@@ -1,4 +1,6 @@
 import io
+import tempfile
+from pathlib import Path
 
 from django.core.management import call_command
 from django.test import TestCase
@@ -139,7 +141,7 @@ class QfcTestCase(TestCase):
             out.strip(),
             "\n".join(
                 [
-                    "Invalid uuid: strangename/project.qgs",
+                    "Invalid uuid: strangename",
                     "Checking the last 2 project id(s) from the storage...",
                     "No project files to delete.",
                 ]
@@ -165,10 +167,10 @@ class QfcTestCase(TestCase):
             out.strip(),
             "\n".join(
                 [
-                    "Checking a batch of 2 project ids from the storage...",
                     "Checking a batch of 2 project ids from the storage...",
                     f'Deleting project files for "{project_ids[0]}"...',
                     f'Deleting project files for "{project_ids[1]}"...',
+                    "Checking a batch of 2 project ids from the storage...",
                 ]
             ),
         )
@@ -203,3 +205,34 @@ class QfcTestCase(TestCase):
 
         self.assertEqual(get_project_files_count(self.projects[0].id), 0)
         self.assertEqual(get_project_files_count(self.projects[1].id), 0)
+
+    def test_resume_from_checkpoint(self):
+        self.generate_projects(2)
+        project_ids = sorted([str(p.id) for p in self.projects])
+        Project.objects.filter(id__in=project_ids).delete()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint_file = Path(tmpdir).joinpath("checkpoint")
+            checkpoint_file.write_text(f"{project_ids[1]}/")
+
+            out = self.call_command(checkpoint_file=checkpoint_file, workers=2)
+
+            self.assertEqual(
+                out.strip(),
+                "\n".join(
+                    [
+                        f'Resuming after "{project_ids[1]}/"...',
+                        "Checking the last 2 project id(s) from the storage...",
+                        f'Deleting project files for "{project_ids[2]}"...',
+                        f'Deleting project files for "{project_ids[3]}"...',
+                    ]
+                ),
+            )
+
+            # the whole storage has been checked, so the checkpoint is removed
+            self.assertFalse(checkpoint_file.exists())
+
+        self.assertEqual(get_project_files_count(project_ids[0]), 1)
+        self.assertEqual(get_project_files_count(project_ids[1]), 1)
+        self.assertEqual(get_project_files_count(project_ids[2]), 0)
+        self.assertEqual(get_project_files_count(project_ids[3]), 0)
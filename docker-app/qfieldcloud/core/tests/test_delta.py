@@ -6,6 +6,7 @@ from unittest import mock, skip
 
 import fiona
 import rest_framework
+from constance.test import override_config
 from django.http.response import FileResponse
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import utils
@@ -23,11 +24,18 @@ from rest_framework import response, status
 from rest_framework.test import APITransactionTestCase
 from shapely.geometry import shape
 
-from .utils import get_filename, setup_subscription_plans, testdata_path
+from .utils import (
+    get_filename,
+    setup_subscription_plans,
+    testdata_path,
+    wait_for_project_ok_status,
+)
 
 logging.disable(logging.CRITICAL)
 
 
+# NOTE the deltas are applied by the worker wrapper process, where only the constance config can be overridden
+@override_config(WORKER_APPLY_DELTAS_WITHOUT_QGIS=False)
 class QfcTestCase(APITransactionTestCase):
     layer_id_map = {
         "polygons_f18b6046_8e46_4206_a698_641c58e5ac73": "polygons",
@@ -194,6 +202,68 @@ class QfcTestCase(APITransactionTestCase):
             features = list(layer)
             self.assertEqual(666, features[0]["properties"]["int"])
 
+    @override_config(WORKER_APPLY_DELTAS_WITHOUT_QGIS=True)
+    def test_push_apply_delta_file_without_qgis(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        project = self.upload_project_files(self.project1)
+        # the layers are known once the project file is processed
+        wait_for_project_ok_status(project)
+
+        self.upload_and_check_deltas(
+            project=project,
+            delta_filename="singlelayer_singledelta2.json",
+            token=self.token1.key,
+            final_values=[
+                [
+                    "c8c421cd-e39c-40a0-97d8-a319c245ba14",
+                    "STATUS_APPLIED",
+                    self.user1.username,
+                ]
+            ],
+        )
+
+        # the attribute patch on a GeoPackage layer is applied without starting a QGIS worker
+        job = Job.objects.filter(project=project, type=Job.Type.DELTA_APPLY).latest(
+            "updated_at"
+        )
+        self.assertEqual(job.feedback["workflow_id"], "apply_changes_without_qgis")
+
+        gpkg = io.BytesIO(self.get_file_contents(project, "testdata.gpkg"))
+        with fiona.open(gpkg, layer="points_xy") as layer:
+            features = list(layer)
+            self.assertEqual(666, features[0]["properties"]["int"])
+
+    @override_config(WORKER_APPLY_DELTAS_WITHOUT_QGIS=True)
+    def test_push_apply_delta_file_without_qgis_near_quota(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+        project = self.upload_project_files(self.project1)
+        wait_for_project_ok_status(project)
+
+        # less storage left than the size of the modified GeoPackage
+        plan = project.owner.useraccount.current_subscription.plan
+        project.file_storage_bytes = (plan.storage_mb * 1000 * 1000) - 1
+        project.save()
+
+        # the same as the QGIS worker, the modified files are uploaded regardless of the quota
+        self.upload_and_check_deltas(
+            project=project,
+            delta_filename="singlelayer_singledelta2.json",
+            token=self.token1.key,
+            final_values=[
+                [
+                    "c8c421cd-e39c-40a0-97d8-a319c245ba14",
+                    "STATUS_APPLIED",
+                    self.user1.username,
+                ]
+            ],
+        )
+
+        job = Job.objects.filter(project=project, type=Job.Type.DELTA_APPLY).latest(
+            "updated_at"
+        )
+        self.assertEqual(job.status, Job.Status.FINISHED)
+        self.assertEqual(job.feedback["workflow_id"], "apply_changes_without_qgis")
+
     def test_push_apply_delta_file_empty_source_layer_id(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
         project = self.upload_project_files(self.project1)
@@ -0,0 +1,373 @@
+import sqlite3
+import tempfile
+import uuid
+from pathlib import Path
+
+from django.test import TestCase
+from qfieldcloud.core.utils2.gpkg_deltas import (
+    STATUS_APPLIED,
+    STATUS_APPLY_FAILED,
+    STATUS_CONFLICT,
+    GpkgLayer,
+    UnsupportedDeltaError,
+    apply_deltas_on_gpkg_files,
+)
+
+LAYER_ID = "points_4b5ed4a0_4d4c_4a3d_9a2b_53c9b0dc3a1e"
+
+# the R-tree triggers created by GDAL, calling the spatial functions only when the geometry or the primary key changes
+RTREE_TRIGGERS_SQL = """
+CREATE TABLE "rtree_points_geom" (id INTEGER PRIMARY KEY, minx REAL, maxx REAL, miny REAL, maxy REAL);
+CREATE TRIGGER "rtree_points_geom_insert" AFTER INSERT ON "points"
+WHEN (new."geom" NOT NULL AND NOT ST_IsEmpty(NEW."geom"))
+BEGIN
+    INSERT OR REPLACE INTO "rtree_points_geom" VALUES (
+        NEW."fid", ST_MinX(NEW."geom"), ST_MaxX(NEW."geom"), ST_MinY(NEW."geom"), ST_MaxY(NEW."geom")
+    );
+END;
+CREATE TRIGGER "rtree_points_geom_update1" AFTER UPDATE OF "geom" ON "points"
+WHEN OLD."fid" = NEW."fid" AND (NEW."geom" NOTNULL AND NOT ST_IsEmpty(NEW."geom"))
+BEGIN
+    INSERT OR REPLACE INTO "rtree_points_geom" VALUES (
+        NEW."fid", ST_MinX(NEW."geom"), ST_MaxX(NEW."geom"), ST_MinY(NEW."geom"), ST_MaxY(NEW."geom")
+    );
+END;
+CREATE TRIGGER "rtree_points_geom_update5" AFTER UPDATE ON "points"
+WHEN OLD."fid" != NEW."fid" AND (NEW."geom" NOTNULL AND NOT ST_IsEmpty(NEW."geom"))
+BEGIN
+    DELETE FROM "rtree_points_geom" WHERE id = OLD."fid";
+    INSERT OR REPLACE INTO "rtree_points_geom" VALUES (
+        NEW."fid", ST_MinX(NEW."geom"), ST_MaxX(NEW."geom"), ST_MinY(NEW."geom"), ST_MaxY(NEW."geom")
+    );
+END;
+CREATE TRIGGER "rtree_points_geom_delete" AFTER DELETE ON "points"
+WHEN old."geom" NOT NULL
+BEGIN
+    DELETE FROM "rtree_points_geom" WHERE id = OLD."fid";
+END;
+"""
+
+
+class QfcTestCase(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+        self.gpkg_filename = Path(self.tempdir.name).joinpath("data.gpkg")
+        self.gpkg_filenames = {"data.gpkg": self.gpkg_filename}
+        self.gpkg_layers = {LAYER_ID: GpkgLayer("data.gpkg", "points", "fid")}
+
+        with self.connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, last_change DATETIME);
+                CREATE TABLE "points" (
+                    "fid" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+                    "geom" POINT,
+                    "name" TEXT NOT NULL,
+                    "int" MEDIUMINT
+                );
+                INSERT INTO gpkg_contents VALUES ('points', NULL);
+                INSERT INTO "points" VALUES (1, X'00', 'one', 1);
+                INSERT INTO "points" VALUES (2, X'00', 'two', 2);
+                """
+            )
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.gpkg_filename)
+        self.addCleanup(conn.close)
+
+        return conn
+
+    def get_rows(self) -> list[tuple]:
+        with self.connect() as conn:
+            return conn.execute(
+                'SELECT "fid", "name", "int" FROM "points" ORDER BY "fid"'
+            ).fetchall()
+
+    def get_delta(self, method, source_pk, old=None, new=None, **kwargs):
+        return {
+            "uuid": str(uuid.uuid4()),
+            "clientId": "cd517e24-a520-4021-8850-e5af70e3a612",
+            "localLayerId": LAYER_ID,
+            "sourceLayerId": LAYER_ID,
+            "localPk": source_pk,
+            "sourcePk": source_pk,
+            "method": method,
+            "old": old,
+            "new": new,
+            **kwargs,
+        }
+
+    def apply_deltas(self, deltas, overwrite_conflicts=False):
+        return apply_deltas_on_gpkg_files(
+            self.gpkg_filenames,
+            self.gpkg_layers,
+            {"id": str(uuid.uuid4()), "deltas": deltas},
+            overwrite_conflicts,
+        )
+
+    def test_patch(self):
+        delta_log = self.apply_deltas(
+            [
+                self.get_delta(
+                    "patch",
+                    "1",
+                    old={"attributes": {"name": "one", "int": 1}},
+                    new={"attributes": {"name": "uno", "int": 1}},
+                )
+            ]
+        )
+
+        self.assertEqual(len(delta_log), 1)
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLIED)
+        self.assertEqual(delta_log[0]["modified_pk"], 1)
+        self.assertEqual(self.get_rows(), [(1, "uno", 1), (2, "two", 2)])
+
+        with self.connect() as conn:
+            last_change = conn.execute(
+                "SELECT last_change FROM gpkg_contents"
+            ).fetchone()
+
+        self.assertIsNotNone(last_change[0])
+
+    def test_patch_with_conflict(self):
+        delta_log = self.apply_deltas(
+            [
+                self.get_delta(
+                    "patch",
+                    "1",
+                    old={"attributes": {"name": "eins"}},
+                    new={"attributes": {"name": "uno"}},
+                ),
+                self.get_delta(
+                    "patch",
+                    "2",
+                    old={"attributes": {"name": "two"}},
+                    new={"attributes": {"name": "dos"}},
+                ),
+            ]
+        )
+
+        self.assertEqual(
+            [entry["status"] for entry in delta_log],
+            [STATUS_CONFLICT, STATUS_APPLIED],
+        )
+        self.assertEqual(delta_log[0]["e_type"], "CONFLICT")
+        self.assertEqual(len(delta_log[0]["conflicts"]), 1)
+        self.assertIsNone(delta_log[0]["modified_pk"])
+        # only the conflicting delta is rolled back
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "dos", 2)])
+
+    def test_patch_with_overwritten_conflict(self):
+        delta_log = self.apply_deltas(
+            [
+                self.get_delta(
+                    "patch",
+                    "1",
+                    old={"attributes": {"name": "eins"}},
+                    new={"attributes": {"name": "uno"}},
+                )
+            ],
+            overwrite_conflicts=True,
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLIED)
+        self.assertEqual(self.get_rows(), [(1, "uno", 1), (2, "two", 2)])
+
+    def test_patch_with_client_pk(self):
+        delta = self.get_delta(
+            "patch",
+            "-1",
+            old={"attributes": {"name": "two"}},
+            new={"attributes": {"name": "dos"}},
+        )
+
+        delta_log = apply_deltas_on_gpkg_files(
+            self.gpkg_filenames,
+            self.gpkg_layers,
+            {
+                "id": str(uuid.uuid4()),
+                "deltas": [delta],
+                "clientPks": {f"{delta['clientId']}__-1": "2"},
+            },
+            False,
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLIED)
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "dos", 2)])
+
+    def test_patch_of_missing_feature(self):
+        delta_log = self.apply_deltas(
+            [
+                self.get_delta(
+                    "patch",
+                    "3",
+                    old={"attributes": {"name": "three"}},
+                    new={"attributes": {"name": "tres"}},
+                )
+            ]
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLY_FAILED)
+        self.assertEqual(delta_log[0]["msg"], "Unable to find feature")
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "two", 2)])
+
+    def test_delete(self):
+        delta_log = self.apply_deltas(
+            [self.get_delta("delete", "2", old={"attributes": {"name": "two"}})]
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLIED)
+        self.assertEqual(delta_log[0]["modified_pk"], 2)
+        self.assertEqual(self.get_rows(), [(1, "one", 1)])
+
+    def test_delete_with_conflict(self):
+        delta_log = self.apply_deltas(
+            [self.get_delta("delete", "2", old={"attributes": {"name": "dos"}})]
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_CONFLICT)
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "two", 2)])
+
+        delta_log = self.apply_deltas(
+            [self.get_delta("delete", "2", old={"attributes": {"name": "dos"}})],
+            overwrite_conflicts=True,
+        )
+
+        self.assertEqual(delta_log[0]["status"], STATUS_APPLIED)
+        self.assertEqual(self.get_rows(), [(1, "one", 1)])
+
+    def test_unsupported_deltas(self):
+        supported_delta = self.get_delta(
+            "patch",
+            "1",
+            old={"attributes": {"name": "one"}},
+            new={"attributes": {"name": "uno"}},
+        )
+        unsupported_deltas = {
+            "create": self.get_delta(
+                "create", "3", new={"attributes": {"name": "three"}}
+            ),
+            "geometry change": self.get_delta(
+                "patch",
+                "2",
+                old={"geometry": "POINT(0 0)"},
+                new={"geometry": "POINT(1 1)"},
+            ),
+            "unknown layer": self.get_delta(
+                "patch",
+                "2",
+                old={"attributes": {"name": "two"}},
+                new={"attributes": {"name": "dos"}},
+                sourceLayerId="lines_0d6e5b9a",
+            ),
+            "unknown attribute": self.get_delta(
+                "patch",
+                "2",
+                old={"attributes": {"missing": "two"}},
+                new={"attributes": {"missing": "dos"}},
+            ),
+            "missing old value": self.get_delta(
+                "patch", "2", old={}, new={"attributes": {"name": "dos"}}
+            ),
+            "primary key change": self.get_delta(
+                "patch",
+                "2",
+                old={"attributes": {"fid": 2}},
+                new={"attributes": {"fid": 3}},
+            ),
+            "unsupported attribute type": self.get_delta(
+                "patch",
+                "2",
+                old={"attributes": {"geom": None}},
+                new={"attributes": {"geom": None}},
+            ),
+        }
+
+        for name, unsupported_delta in unsupported_deltas.items():
+            with self.subTest(name):
+                with self.assertRaises(UnsupportedDeltaError):
+                    self.apply_deltas([supported_delta, unsupported_delta])
+
+                # nothing is written if any of the deltas is not supported
+                self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "two", 2)])
+
+    def test_sqlite_error_is_unsupported(self):
+        with self.assertRaises(UnsupportedDeltaError):
+            self.apply_deltas(
+                [
+                    self.get_delta(
+                        "patch",
+                        "1",
+                        old={"attributes": {"name": "one"}},
+                        new={"attributes": {"name": "uno"}},
+                    ),
+                    # violates the NOT NULL constraint
+                    self.get_delta(
+                        "patch",
+                        "2",
+                        old={"attributes": {"name": "two"}},
+                        new={"attributes": {"name": None}},
+                    ),
+                ]
+            )
+
+        # the already applied deltas are rolled back as well
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "two", 2)])
+
+    def test_rtree_triggers(self):
+        with self.connect() as conn:
+            conn.executescript(RTREE_TRIGGERS_SQL)
+            conn.execute(
+                'INSERT INTO "rtree_points_geom" VALUES (1, 0, 0, 0, 0), (2, 1, 1, 1, 1)'
+            )
+
+        delta_log = self.apply_deltas(
+            [
+                self.get_delta(
+                    "patch",
+                    "1",
+                    old={"attributes": {"name": "one", "int": 1}},
+                    new={"attributes": {"name": "uno", "int": 10}},
+                ),
+                self.get_delta("delete", "2", old={"attributes": {"name": "two"}}),
+            ]
+        )
+
+        self.assertEqual(
+            [entry["status"] for entry in delta_log],
+            [STATUS_APPLIED, STATUS_APPLIED],
+        )
+        self.assertEqual(self.get_rows(), [(1, "uno", 10)])
+
+        with self.connect() as conn:
+            rtree_ids = conn.execute('SELECT id FROM "rtree_points_geom"').fetchall()
+
+        self.assertEqual(rtree_ids, [(1,)])
+
+    def test_trigger_calling_spatial_function_is_unsupported(self):
+        with self.connect() as conn:
+            conn.executescript(
+                """
+                CREATE TABLE "points_extent" (minx REAL);
+                CREATE TRIGGER "points_name_update" AFTER UPDATE OF "name" ON "points"
+                BEGIN
+                    INSERT INTO "points_extent" VALUES (ST_MinX(NEW."geom"));
+                END;
+                """
+            )
+
+        with self.assertRaises(UnsupportedDeltaError):
+            self.apply_deltas(
+                [
+                    self.get_delta(
+                        "patch",
+                        "1",
+                        old={"attributes": {"name": "one"}},
+                        new={"attributes": {"name": "uno"}},
+                    )
+                ]
+            )
+
+        self.assertEqual(self.get_rows(), [(1, "one", 1), (2, "two", 2)])
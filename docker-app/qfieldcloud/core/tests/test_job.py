@@ -1,15 +1,23 @@
+import json
 import logging
-from unittest import mock
+import shutil
+import uuid
+from unittest import mock, skipIf
 
+from django.db import transaction
+from django.test import override_settings
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core.models import (
     ApplyJob,
+    ApplyJobDelta,
+    Delta,
     Job,
     PackageJob,
     Person,
     ProcessProjectfileJob,
     Project,
 )
+from qfieldcloud.core.utils2.jobs import get_mergeable_apply_jobs
 from qfieldcloud.subscription.exceptions import (
     InactiveSubscriptionError,
     PlanInsufficientError,
@@ -20,6 +28,12 @@ from rest_framework.test import APITestCase
 
 from .utils import set_subscription, setup_subscription_plans
 
+try:
+    from worker_wrapper.wrapper import DeltaApplyJobRun
+except ImportError:
+    # the `worker_wrapper` requirements are installed in the `worker_wrapper` image only
+    DeltaApplyJobRun = None
+
 logging.disable(logging.CRITICAL)
 
 
@@ -141,6 +155,213 @@ class QfcTestCase(APITestCase):
 
             self.check_can_update_existing_jobs()
 
+    @override_settings(
+        QFIELDCLOUD_JOB_OUTPUT_HEAD_CHARS=10,
+        QFIELDCLOUD_JOB_OUTPUT_TAIL_CHARS=10,
+    )
+    def test_long_output_is_stored_on_the_storage(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        # short outputs are kept in the database
+        self.job.set_output("short output")
+        self.job.save()
+
+        self.assertFalse(self.job.is_output_truncated)
+        self.assertEqual(self.job.output, "short output")
+
+        # long outputs are truncated in the database and stored in full on the storage
+        full_output = "head_start" + "x" * 1000 + "tail_end__"
+        self.job.set_output(full_output)
+        self.job.save()
+
+        self.assertTrue(self.job.is_output_truncated)
+        self.assertTrue(self.job.output.startswith("head_start"))
+        self.assertTrue(self.job.output.endswith("tail_end__"))
+        self.assertLess(len(self.job.output), len(full_output))
+
+        response = self.client.get(f"/api/v1/jobs/{self.job.id}/output/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(),
+            full_output,
+        )
+
+    def test_retrieve_job_with_etag(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.get(f"/api/v1/jobs/{self.package_job.id}/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(
+            f"/api/v1/jobs/{self.package_job.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.package_job.status = Job.Status.STARTED
+        self.package_job.save(update_fields=["status"])
+
+        response = self.client.get(
+            f"/api/v1/jobs/{self.package_job.id}/", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(QFIELDCLOUD_LIVE_STREAM_TIMEOUT=0)
+    def test_job_status_events(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.get(
+            "/api/v1/jobs/events/", {"project_id": self.project1.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        cursor = response.json()["cursor"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.status = Job.Status.QUEUED
+            self.job.save(update_fields=["status"])
+
+        response = self.client.get(
+            "/api/v1/jobs/events/",
+            {"project_id": self.project1.id, "after": cursor},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["entries"],
+            [
+                {
+                    "type": "job_status",
+                    "job_id": str(self.job.id),
+                    "job_type": Job.Type.PACKAGE,
+                    "status": Job.Status.QUEUED,
+                }
+            ],
+        )
+
+    def test_get_mergeable_apply_jobs(self):
+        apply_job2 = ApplyJob.objects.create(
+            type=Job.Type.DELTA_APPLY,
+            project=self.project1,
+            created_by=self.user1,
+            overwrite_conflicts=True,
+        )
+        # not merged, the conflicts are handled differently
+        apply_job3 = ApplyJob.objects.create(
+            type=Job.Type.DELTA_APPLY,
+            project=self.project1,
+            created_by=self.user1,
+            overwrite_conflicts=False,
+        )
+        ApplyJob.objects.create(
+            type=Job.Type.DELTA_APPLY,
+            project=self.project1,
+            created_by=self.user1,
+            overwrite_conflicts=True,
+        )
+
+        with transaction.atomic():
+            self.assertEqual(
+                get_mergeable_apply_jobs(self.delta_apply_job), [apply_job2]
+            )
+            self.assertEqual(get_mergeable_apply_jobs(apply_job2), [])
+
+        apply_job3.status = Job.Status.FINISHED
+        apply_job3.save()
+
+        with transaction.atomic():
+            self.assertEqual(len(get_mergeable_apply_jobs(self.delta_apply_job)), 2)
+
+        with override_settings(QFIELDCLOUD_APPLY_JOBS_MERGE_LIMIT=1):
+            with transaction.atomic():
+                self.assertEqual(
+                    get_mergeable_apply_jobs(self.delta_apply_job), [apply_job2]
+                )
+
+    @skipIf(
+        DeltaApplyJobRun is None,
+        "Run this test where the `worker_wrapper` requirements are installed.",
+    )
+    def test_merged_apply_jobs_with_the_same_delta(self):
+        apply_job2 = ApplyJob.objects.create(
+            type=Job.Type.DELTA_APPLY,
+            project=self.project1,
+            created_by=self.user1,
+            overwrite_conflicts=True,
+        )
+        deltas = []
+        for _i in range(3):
+            delta_id = uuid.uuid4()
+            deltas.append(
+                Delta.objects.create(
+                    id=delta_id,
+                    deltafile_id=uuid.uuid4(),
+                    project=self.project1,
+                    client_id=uuid.uuid4(),
+                    created_by=self.user1,
+                    content={"uuid": str(delta_id), "method": "patch"},
+                )
+            )
+
+        # the second delta is in both jobs, e.g. pushed again while the first job was pending
+        for job, job_deltas in (
+            (self.delta_apply_job, deltas[:2]),
+            (apply_job2, deltas[1:]),
+        ):
+            for delta in job_deltas:
+                ApplyJobDelta.objects.create(apply_job=job, delta=delta)
+
+        job_run = DeltaApplyJobRun(self.delta_apply_job.id, [apply_job2.id])
+        self.addCleanup(shutil.rmtree, job_run.shared_tempdir)
+
+        job_run.before_docker_run()
+
+        with open(job_run.shared_tempdir.joinpath("deltafile.json")) as f:
+            deltafile_contents = json.load(f)
+
+        # each delta is applied only once
+        self.assertCountEqual(
+            [d["uuid"] for d in deltafile_contents["deltas"]],
+            [str(d.id) for d in deltas],
+        )
+
+        job_run.job.feedback = {
+            "outputs": {
+                "apply_deltas": {
+                    "delta_feedback": [
+                        {
+                            "delta_id": str(d.id),
+                            "status": "status_applied",
+                            "modified_pk": "1",
+                        }
+                        for d in deltas
+                    ]
+                }
+            }
+        }
+        job_run.after_docker_run()
+
+        self.assertEqual(ApplyJobDelta.objects.count(), 4)
+        self.assertFalse(
+            ApplyJobDelta.objects.exclude(status=Delta.Status.APPLIED).exists()
+        )
+
+        for job, job_deltas in (
+            (self.delta_apply_job, deltas[:2]),
+            (apply_job2, deltas[1:]),
+        ):
+            job.refresh_from_db()
+            self.assertCountEqual(
+                [
+                    f["delta_id"]
+                    for f in job.feedback["outputs"]["apply_deltas"]["delta_feedback"]
+                ],
+                [str(d.id) for d in job_deltas],
+            )
+
+        apply_job2.refresh_from_db()
+        self.assertEqual(apply_job2.status, Job.Status.FINISHED)
+
     def check_cannot_create_jobs(self, error):
         # Can still create processprojectfile job
         ProcessProjectfileJob.objects.create(
@@ -1,3 +1,4 @@
+import io
 import json
 import logging
 import os
@@ -20,11 +21,13 @@ from qfieldcloud.core.models import (
     Person,
     Project,
     ProjectCollaborator,
+    ProjectPackage,
+    ProjectPackageFile,
     Secret,
     Team,
     TeamMember,
 )
-from qfieldcloud.core.utils2.storage import get_stored_package_ids
+from qfieldcloud.core.utils import check_s3_key
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
@@ -446,6 +449,63 @@ class QfcTestCase(APITransactionTestCase):
         # projects with online vector layer should always show as it needs repackaging
         self.assertTrue(self.project1.needs_repackaging)
 
+        # but the package job finds the online vector layers unchanged and reuses the previous package
+        self.check_package(
+            self.token1.key,
+            self.project1,
+            [
+                "data.gpkg",
+                "project_qfield.qgs",
+                "project_qfield_attachments.zip",
+            ],
+        )
+
+        package_job = PackageJob.objects.filter(project=self.project1).latest(
+            "created_at"
+        )
+        self.assertTrue(
+            package_job.feedback["outputs"]["package_project"][
+                "is_previous_package_reused"
+            ]
+        )
+        # the PostGIS layers were probed by the worker, without starting QGIS
+        self.assertEqual(
+            package_job.feedback["workflow_id"], "package_project_without_qgis"
+        )
+
+        self.project1.refresh_from_db()
+        # the online vector layers were found unchanged, so no repackaging is needed for a while
+        self.assertIsNotNone(self.project1.online_data_unchanged_at)
+        self.assertFalse(self.project1.needs_repackaging)
+
+        cur.execute(
+            "INSERT INTO point(id, geometry) VALUES(2, ST_GeomFromText('POINT(2725505 1121435)', 2056))"
+        )
+        self.conn.commit()
+
+        self.check_package(
+            self.token1.key,
+            self.project1,
+            [
+                "data.gpkg",
+                "project_qfield.qgs",
+                "project_qfield_attachments.zip",
+            ],
+        )
+
+        package_job = PackageJob.objects.filter(project=self.project1).latest(
+            "created_at"
+        )
+        self.assertFalse(
+            package_job.feedback["outputs"]["package_project"][
+                "is_previous_package_reused"
+            ]
+        )
+
+        self.project1.refresh_from_db()
+        # the new package is newer than the last probe
+        self.assertTrue(self.project1.needs_repackaging)
+
     @tag("flaky")
     def test_connects_via_pgservice(self):
         cur = self.conn.cursor()
@@ -633,6 +693,83 @@ class QfcTestCase(APITransactionTestCase):
                 ],
             )
 
+    def test_repackaging_unchanged_project_reuses_package(self):
+        expected_files = [
+            "data.gpkg",
+            "project_qfield.qgs",
+            "project_qfield_attachments.zip",
+        ]
+
+        self.upload_files_and_check_package(
+            token=self.token1.key,
+            project=self.project1,
+            files=[
+                ("delta/nonspatial.csv", "nonspatial.csv"),
+                ("delta/testdata.gpkg", "testdata.gpkg"),
+                ("delta/points.geojson", "points.geojson"),
+                ("delta/polygons.geojson", "polygons.geojson"),
+                ("delta/project.qgs", "project.qgs"),
+            ],
+            expected_files=expected_files,
+        )
+
+        old_package = PackageJob.objects.filter(project=self.project1).latest(
+            "created_at"
+        )
+
+        self.check_package(self.token1.key, self.project1, expected_files)
+
+        new_package = PackageJob.objects.filter(project=self.project1).latest(
+            "created_at"
+        )
+
+        self.assertNotEqual(old_package.id, new_package.id)
+        self.assertTrue(
+            new_package.feedback["outputs"]["package_project"][
+                "is_previous_package_reused"
+            ]
+        )
+        self.assertListEqual(
+            sorted(
+                new_package.feedback["outputs"]["upload_packaged_project"][
+                    "reused_filenames"
+                ]
+            ),
+            sorted(expected_files),
+        )
+        self.assertEqual(
+            ProjectPackage.objects.get(pk=new_package.id).size_bytes,
+            ProjectPackage.objects.get(pk=old_package.id).size_bytes,
+        )
+
+        for package_file in ProjectPackageFile.objects.filter(
+            package_id=new_package.id
+        ):
+            self.assertIsNotNone(check_s3_key(package_file.key))
+
+        # a changed layer is packaged again
+        with open(testdata_path("delta/points.geojson"), "rb") as f:
+            points = f.read().replace(b'"str1"', b'"str1 changed"')
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/points.geojson/",
+            {"file": io.BytesIO(points)},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        self.check_package(self.token1.key, self.project1, expected_files)
+
+        changed_package = PackageJob.objects.filter(project=self.project1).latest(
+            "created_at"
+        )
+
+        self.assertFalse(
+            changed_package.feedback["outputs"]["package_project"][
+                "is_previous_package_reused"
+            ]
+        )
+
     def test_outdated_packaged_files_are_deleted(self):
         subscription = self.user1.useraccount.current_subscription
         subscription.plan.is_external_db_supported = True
@@ -665,9 +802,13 @@ class QfcTestCase(APITransactionTestCase):
         old_package = PackageJob.objects.filter(project=self.project1).latest(
             "created_at"
         )
-        stored_package_ids = get_stored_package_ids(self.project1.id)
-        self.assertIn(str(old_package.id), stored_package_ids)
-        self.assertEqual(len(stored_package_ids), 1)
+        old_package_files = list(
+            ProjectPackageFile.objects.filter(package_id=old_package.id)
+        )
+        self.assertEqual(len(old_package_files), 3)
+
+        for package_file in old_package_files:
+            self.assertIsNotNone(check_s3_key(package_file.key))
 
         self.check_package(
             self.token1.key,
@@ -683,9 +824,38 @@ class QfcTestCase(APITransactionTestCase):
             "created_at"
         )
 
-        stored_package_ids = get_stored_package_ids(self.project1.id)
+        new_package_files = list(
+            ProjectPackageFile.objects.filter(package_id=new_package.id)
+        )
+        new_sha256s = {package_file.sha256 for package_file in new_package_files}
 
         self.assertNotEqual(old_package.id, new_package.id)
-        self.assertNotIn(str(old_package.id), stored_package_ids)
-        self.assertIn(str(new_package.id), stored_package_ids)
-        self.assertEqual(len(stored_package_ids), 1)
+        self.assertEqual(len(new_package_files), 3)
+        # the manifest of the deleted package is gone
+        self.assertFalse(
+            ProjectPackageFile.objects.filter(package_id=old_package.id).exists()
+        )
+
+        for package_file in new_package_files:
+            self.assertIsNotNone(check_s3_key(package_file.key))
+
+        # the blobs are deleted only if no other package references them
+        for package_file in old_package_files:
+            if package_file.sha256 in new_sha256s:
+                self.assertIsNotNone(check_s3_key(package_file.key))
+            else:
+                self.assertIsNone(check_s3_key(package_file.key))
+
+        self.assertEqual(
+            ProjectPackage.objects.get(pk=old_package.id).state,
+            ProjectPackage.State.DELETED,
+        )
+        self.assertEqual(
+            ProjectPackage.objects.get(pk=new_package.id).state,
+            ProjectPackage.State.STORED,
+        )
+        self.assertGreater(self.project1.package_storage_bytes, 0)
+        self.assertEqual(
+            self.project1.package_storage_bytes,
+            ProjectPackage.objects.get(pk=new_package.id).size_bytes,
+        )
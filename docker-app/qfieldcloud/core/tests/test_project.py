@@ -518,3 +518,45 @@ class QfcTestCase(APITransactionTestCase):
         # Can still modify existing project
         p1.name = "p1-modified"
         p1.save()
+
+    def test_project_details_derived_fields(self):
+        p1 = Project.objects.create(name="p1", owner=self.user1)
+
+        self.assertIsNone(p1.has_online_vector_data)
+        self.assertIsNone(p1.layers_with_error_count)
+        self.assertEqual(p1.attachment_dirs, ["DCIM"])
+
+        p1.set_project_details(
+            {
+                "attachment_dirs": ["photos"],
+                "layers_by_id": {
+                    "file_layer": {
+                        "type_name": "VectorLayer",
+                        "filename": "data.gpkg",
+                        "error_code": "no_error",
+                    },
+                    "online_layer": {
+                        "type_name": "Vector",
+                        "filename": "",
+                        "error_code": "invalid_dataprovider",
+                    },
+                },
+            }
+        )
+        p1.save()
+
+        # `project_details` is deferred by default, the derived fields are not
+        p1 = Project.objects.get(pk=p1.pk)
+
+        self.assertIn("project_details", p1.get_deferred_fields())
+        self.assertTrue(p1.has_online_vector_data)
+        self.assertEqual(p1.layers_with_error_count, 1)
+        self.assertEqual(p1.attachment_dirs, ["photos"])
+
+        p1.set_project_details(None)
+        p1.save()
+        p1.refresh_from_db()
+
+        self.assertIsNone(p1.has_online_vector_data)
+        self.assertIsNone(p1.layers_with_error_count)
+        self.assertEqual(p1.attachment_dirs, ["DCIM"])
@@ -1,14 +1,28 @@
+import hashlib
 import io
 import logging
+import os
 import tempfile
 import time
+from datetime import timedelta
 from pathlib import PurePath
+from unittest import mock
 
 from django.core.management import call_command
 from django.http import FileResponse
+from django.test import override_settings
+from django.utils import timezone
 from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import utils
-from qfieldcloud.core.models import Job, Person, ProcessProjectfileJob, Project
+from qfieldcloud.core.cron import AbortExpiredFileUploadSessionsJob
+from qfieldcloud.core.models import (
+    FileUploadSession,
+    Job,
+    Person,
+    ProcessProjectfileJob,
+    Project,
+    Secret,
+)
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
@@ -17,6 +31,7 @@ from .utils import (
     set_subscription,
     setup_subscription_plans,
     testdata_path,
+    wait_for_project_ok_status,
 )
 
 logging.disable(logging.CRITICAL)
@@ -143,6 +158,57 @@ class QfcTestCase(APITransactionTestCase):
             open(testdata_path("file.txt"), "rb").read(),
         )
 
+    def test_push_download_file_range(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        file_path = testdata_path("file.txt")
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/file.txt/",
+            {"file": open(file_path, "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        url = f"/api/v1/files/{self.project1.id}/file.txt/"
+
+        # Download the whole file, the ETag is strong
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response["ETag"].startswith('"'))
+        etag = response["ETag"]
+        self.assertEqual(b"".join(response.streaming_content), b"Hello, World\n")
+
+        # Resume the download
+        response = self.client.get(url, HTTP_RANGE="bytes=7-")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 7-12/13")
+        self.assertEqual(b"".join(response.streaming_content), b"World\n")
+
+        # Resume the download if the file has not changed
+        response = self.client.get(url, HTTP_RANGE="bytes=0-4", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), b"Hello")
+
+        # The whole file is sent if it has changed
+        response = self.client.get(
+            url, HTTP_RANGE="bytes=0-4", HTTP_IF_RANGE='"somethingelse"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), b"Hello, World\n")
+
+        # Weak ETags never match
+        response = self.client.get(
+            url, HTTP_RANGE="bytes=0-4", HTTP_IF_RANGE=f"W/{etag}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # The range is out of the file
+        response = self.client.get(url, HTTP_RANGE="bytes=100-")
+        self.assertEqual(
+            response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+
     def test_push_download_file_with_path(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
 
@@ -593,6 +659,226 @@ class QfcTestCase(APITransactionTestCase):
             Project.objects.get(pk=self.project1.pk).project_filename, None
         )
 
+    @override_settings(QFIELDCLOUD_FILE_UPLOAD_CHUNK_SIZE=5 * 1024 * 1024)
+    def test_resumable_upload(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        content = os.urandom(6 * 1024 * 1024)
+        chunk_size = 5 * 1024 * 1024
+
+        # Start the upload
+        response = self.client.post(
+            f"/api/v1/file-uploads/{self.project1.id}/",
+            {
+                "filename": "dir/ortho.tif",
+                "size_bytes": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["chunk_size_bytes"], chunk_size)
+        self.assertEqual(response.json()["uploaded_offsets"], [])
+
+        url = f"/api/v1/file-uploads/{self.project1.id}/{response.json()['id']}/"
+
+        # Upload the last chunk first
+        response = self.client.put(
+            f"{url}?offset={chunk_size}",
+            content[chunk_size:],
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # Chunks must start at a multiple of the chunk size and have the expected size
+        response = self.client.put(
+            f"{url}?offset=1",
+            content[1:chunk_size],
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.put(
+            f"{url}?offset=0",
+            content[:10],
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Cannot finalize with missing chunks
+        response = self.client.post(f"{url}finalize/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["uploaded_offsets"], [chunk_size])
+        self.assertEqual(response.json()["uploaded_bytes"], len(content) - chunk_size)
+
+        # Upload the missing chunk and finalize
+        response = self.client.put(
+            f"{url}?offset=0",
+            content[:chunk_size],
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.post(f"{url}finalize/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 1)
+        self.assertEqual(project.file_storage_bytes, len(content))
+        self.assertEqual(self.get_file_contents(project, "dir/ortho.tif"), content)
+
+        # The session is gone
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_resumable_upload_finalize_again(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        content = os.urandom(1024)
+
+        response = self.client.post(
+            f"/api/v1/file-uploads/{self.project1.id}/",
+            {
+                "filename": "ortho.tif",
+                "size_bytes": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f"/api/v1/file-uploads/{self.project1.id}/{response.json()['id']}/"
+
+        response = self.client.put(
+            f"{url}?offset=0",
+            content,
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # The project update fails after the chunks are assembled
+        with mock.patch.object(
+            Project, "save", side_effect=Exception("Failed to update the project")
+        ):
+            with self.assertRaises(Exception):
+                self.client.post(f"{url}finalize/")
+
+        self.assertEqual(FileUploadSession.objects.count(), 1)
+        self.assertEqual(Project.objects.get(pk=self.project1.pk).file_storage_bytes, 0)
+
+        # Finalizing again only updates the project
+        response = self.client.post(f"{url}finalize/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 1)
+        self.assertEqual(project.file_storage_bytes, len(content))
+        self.assertEqual(FileUploadSession.objects.count(), 0)
+
+    def test_expired_completed_resumable_upload_is_finalized(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        content = os.urandom(1024)
+
+        response = self.client.post(
+            f"/api/v1/file-uploads/{self.project1.id}/",
+            {
+                "filename": "ortho.tif",
+                "size_bytes": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f"/api/v1/file-uploads/{self.project1.id}/{response.json()['id']}/"
+
+        response = self.client.put(
+            f"{url}?offset=0",
+            content,
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        # The project update fails after the chunks are assembled, and the client never finalizes again
+        with mock.patch.object(
+            Project, "save", side_effect=Exception("Failed to update the project")
+        ):
+            with self.assertRaises(Exception):
+                self.client.post(f"{url}finalize/")
+
+        FileUploadSession.objects.update(created_at=timezone.now() - timedelta(days=30))
+
+        AbortExpiredFileUploadSessionsJob().do()
+
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 1)
+        self.assertEqual(project.file_storage_bytes, len(content))
+        self.assertEqual(self.get_file_contents(project, "ortho.tif"), content)
+        self.assertEqual(FileUploadSession.objects.count(), 0)
+
+    def test_resumable_upload_without_sha256(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        for sha256 in (None, "", "not-a-sha256"):
+            data = {"filename": "ortho.tif", "size_bytes": 1024}
+            if sha256 is not None:
+                data["sha256"] = sha256
+
+            response = self.client.post(
+                f"/api/v1/file-uploads/{self.project1.id}/", data
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(FileUploadSession.objects.count(), 0)
+
+    def test_resumable_upload_with_wrong_sha256(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        content = os.urandom(1024)
+
+        response = self.client.post(
+            f"/api/v1/file-uploads/{self.project1.id}/",
+            {
+                "filename": "ortho.tif",
+                "size_bytes": len(content),
+                "sha256": hashlib.sha256(b"other content").hexdigest(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        url = f"/api/v1/file-uploads/{self.project1.id}/{response.json()['id']}/"
+
+        response = self.client.put(
+            f"{url}?offset=0",
+            content,
+            content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.post(f"{url}finalize/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Neither the file nor the session are kept
+        project = Project.objects.get(pk=self.project1.pk)
+        self.assertEqual(project.files_count, 0)
+        self.assertEqual(project.file_storage_bytes, 0)
+        self.assertEqual(FileUploadSession.objects.count(), 0)
+
+    def test_resumable_upload_exceeding_quota(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            f"/api/v1/file-uploads/{self.project1.id}/",
+            {
+                "filename": "ortho.tif",
+                "size_bytes": 1024 * 1024 * 1024 * 1024,
+                "sha256": "0" * 64,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+        self.assertEqual(FileUploadSession.objects.count(), 0)
+
     def test_upload_1mb_file(self):
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
 
@@ -776,3 +1062,159 @@ class QfcTestCase(APITransactionTestCase):
         )
 
         self.assertEqual(jobs.count(), 1)
+
+    def test_reupload_unchanged_project_file_skips_processing(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        for filename in (
+            "nonspatial.csv",
+            "testdata.gpkg",
+            "points.geojson",
+            "polygons.geojson",
+            "project.qgs",
+        ):
+            response = self.client.post(
+                f"/api/v1/files/{self.project1.id}/{filename}/",
+                {"file": open(testdata_path(f"delta/{filename}"), "rb")},
+                format="multipart",
+            )
+            self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        self.project1.refresh_from_db()
+        referenced_files = self.project1.project_details["referenced_files"]
+
+        self.assertIn("project.qgs", referenced_files)
+        self.assertIn("points.geojson", referenced_files)
+
+        processed_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        # the very same project file is uploaded again
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/project.qgs/",
+            {"file": open(testdata_path("delta/project.qgs"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        cached_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        self.assertNotEqual(cached_job.pk, processed_job.pk)
+        self.assertEqual(
+            cached_job.feedback["cached_from_job_id"], str(processed_job.pk)
+        )
+        self.assertIsNone(cached_job.docker_started_at)
+
+        # a referenced layer file changed, so the project is processed again
+        with open(testdata_path("delta/points.geojson"), "rb") as f:
+            points = f.read().replace(b'"str1"', b'"str1 changed"')
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/points.geojson/",
+            {"file": io.BytesIO(points)},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        processed_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        self.assertNotEqual(processed_job.pk, cached_job.pk)
+        self.assertNotIn("cached_from_job_id", processed_job.feedback)
+
+    def test_missing_referenced_file_is_processed_once_uploaded(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/project.qgs/",
+            {"file": open(testdata_path("delta/project.qgs"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        self.project1.refresh_from_db()
+        referenced_files = self.project1.project_details["referenced_files"]
+
+        # the missing files are recorded too
+        self.assertIn("points.geojson", referenced_files)
+        self.assertIsNone(referenced_files["points.geojson"])
+
+        processed_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/points.geojson/",
+            {"file": open(testdata_path("delta/points.geojson"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        reprocessed_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        self.assertNotEqual(reprocessed_job.pk, processed_job.pk)
+        self.assertNotIn("cached_from_job_id", reprocessed_job.feedback)
+
+        self.project1.refresh_from_db()
+        self.assertIsNotNone(
+            self.project1.project_details["referenced_files"]["points.geojson"]
+        )
+
+    def test_changed_secrets_are_processed_again(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.token1.key)
+
+        for _ in range(2):
+            response = self.client.post(
+                f"/api/v1/files/{self.project1.id}/project.qgs/",
+                {"file": open(testdata_path("delta/project.qgs"), "rb")},
+                format="multipart",
+            )
+            self.assertTrue(status.is_success(response.status_code))
+
+            wait_for_project_ok_status(self.project1)
+
+        cached_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        self.assertIn("cached_from_job_id", cached_job.feedback)
+
+        Secret.objects.create(
+            name="PG_SERVICE_GEODB1",
+            type=Secret.Type.PGSERVICE,
+            project=self.project1,
+            created_by=self.project1.owner,
+            value="[geodb1]\ndbname=test\n",
+        )
+
+        response = self.client.post(
+            f"/api/v1/files/{self.project1.id}/project.qgs/",
+            {"file": open(testdata_path("delta/project.qgs"), "rb")},
+            format="multipart",
+        )
+        self.assertTrue(status.is_success(response.status_code))
+
+        wait_for_project_ok_status(self.project1)
+
+        processed_job = ProcessProjectfileJob.objects.filter(
+            project=self.project1, status=Job.Status.FINISHED
+        ).latest("created_at")
+
+        self.assertNotEqual(processed_job.pk, cached_job.pk)
+        self.assertNotIn("cached_from_job_id", processed_job.feedback)
@@ -0,0 +1,53 @@
+import uuid
+
+from django.test import TestCase, override_settings
+from qfieldcloud.core.utils2.streams import (
+    CacheRingBuffer,
+    iter_server_sent_events,
+    reserve_waiter_slot,
+)
+
+
+class QfcTestCase(TestCase):
+    def setUp(self):
+        self.buffer = CacheRingBuffer(f"test:{uuid.uuid4()}", size=3, timeout=60)
+
+    def test_read_empty(self):
+        self.assertEqual(self.buffer.read(), (0, []))
+
+    def test_append_and_read(self):
+        self.assertEqual(self.buffer.append("a"), 1)
+        self.assertEqual(self.buffer.append("b"), 2)
+
+        self.assertEqual(self.buffer.read(), (2, ["a", "b"]))
+        self.assertEqual(self.buffer.read(1), (2, ["b"]))
+        self.assertEqual(self.buffer.read(2), (2, []))
+
+    def test_old_entries_are_overwritten(self):
+        for entry in "abcde":
+            self.buffer.append(entry)
+
+        self.assertEqual(self.buffer.read(), (5, ["c", "d", "e"]))
+        self.assertEqual(self.buffer.read(3), (5, ["d", "e"]))
+
+    @override_settings(QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS=1)
+    def test_waiter_slots_are_limited(self):
+        with reserve_waiter_slot() as is_reserved1:
+            self.assertTrue(is_reserved1)
+
+            with reserve_waiter_slot() as is_reserved2:
+                self.assertFalse(is_reserved2)
+
+        with reserve_waiter_slot() as is_reserved3:
+            self.assertTrue(is_reserved3)
+
+    @override_settings(
+        QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS=1, QFIELDCLOUD_LIVE_STREAM_RETRY_AFTER=5
+    )
+    def test_server_sent_events_without_waiter_slot(self):
+        self.buffer.append("a")
+
+        with reserve_waiter_slot():
+            events = list(iter_server_sent_events(self.buffer, 0, timeout=60))
+
+        self.assertEqual(events, ['id: 1\ndata: "a"\n\n', "retry: 5000\n\n"])
@@ -1,8 +1,10 @@
 import logging
 
-from qfieldcloud.core.models import Organization, OrganizationMember, Person
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from qfieldcloud.core.models import Organization, OrganizationMember, Person, Project
 from qfieldcloud.core.tests.utils import set_subscription, setup_subscription_plans
-from qfieldcloud.subscription.models import PackageType, get_subscription_model
+from qfieldcloud.subscription.models import PackageType, Plan, get_subscription_model
 from rest_framework.test import APITransactionTestCase
 
 logging.disable(logging.CRITICAL)
@@ -67,3 +69,61 @@ class QfcTestCase(APITransactionTestCase):
         membership.save()
 
         self.assertTrue(u1.useraccount.has_premium_support)
+
+    def test_summary_is_cached_and_invalidated(self):
+        u1 = Person.objects.create(username="u1")
+        set_subscription(u1, storage_mb=10, storage_keep_versions=3)
+
+        summary = u1.useraccount.summary
+
+        self.assertEqual(summary.storage_used_bytes, 0)
+        self.assertEqual(summary.storage_free_bytes, 10 * 1000 * 1000)
+        self.assertEqual(summary.storage_keep_versions, 3)
+
+        # the second access hits the cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(u1.useraccount.summary, summary)
+
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        # invalidated when the storage of the projects changes
+        p1 = Project.objects.create(name="p1", owner=u1, file_storage_bytes=1000)
+
+        self.assertEqual(u1.useraccount.summary.storage_used_bytes, 1000)
+
+        p1.delete()
+
+        self.assertEqual(u1.useraccount.summary.storage_used_bytes, 0)
+
+        # invalidated when the plan changes
+        plan = u1.useraccount.current_subscription.plan
+        plan.storage_keep_versions = 5
+        plan.save()
+
+        self.assertEqual(u1.useraccount.summary.storage_keep_versions, 5)
+
+        # invalidated when the plans are updated in bulk, even if no signals are sent
+        Plan.objects.filter(pk=plan.pk).update(storage_keep_versions=7)
+
+        self.assertEqual(u1.useraccount.summary.storage_keep_versions, 7)
+
+        # invalidated when the subscription changes
+        set_subscription(u1, "plan_20mb", storage_mb=20)
+
+        self.assertEqual(
+            u1.useraccount.summary.active_storage_total_bytes, 20 * 1000 * 1000
+        )
+
+    def test_summary_is_invalidated_for_both_owners_on_project_transfer(self):
+        u1 = Person.objects.create(username="u1")
+        u2 = Person.objects.create(username="u2")
+        p1 = Project.objects.create(name="p1", owner=u1, file_storage_bytes=1000)
+
+        self.assertEqual(u1.useraccount.summary.storage_used_bytes, 1000)
+        self.assertEqual(u2.useraccount.summary.storage_used_bytes, 0)
+
+        p1.owner = u2
+        p1.save()
+
+        self.assertEqual(u1.useraccount.summary.storage_used_bytes, 0)
+        self.assertEqual(u2.useraccount.summary.storage_used_bytes, 1000)
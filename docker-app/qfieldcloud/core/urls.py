@@ -62,6 +62,18 @@ urlpatterns = [
         files_views.DownloadPushDeleteFileView.as_view(),
         name="project_file_download",
     ),
+    path(
+        "file-uploads/<uuid:projectid>/",
+        files_views.CreateFileUploadSessionView.as_view(),
+    ),
+    path(
+        "file-uploads/<uuid:projectid>/<uuid:session_id>/",
+        files_views.FileUploadSessionView.as_view(),
+    ),
+    path(
+        "file-uploads/<uuid:projectid>/<uuid:session_id>/finalize/",
+        files_views.FinalizeFileUploadSessionView.as_view(),
+    ),
     path(
         "files/meta/<uuid:projectid>/<path:filename>",
         files_views.ProjectMetafilesView.as_view(),
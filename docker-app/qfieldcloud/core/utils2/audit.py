@@ -1,10 +1,107 @@
 import json
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
+from auditlog.context import threadlocal as auditlog_threadlocal
 from auditlog.models import LogEntry
+from auditlog.registry import auditlog
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.encoding import smart_str
 from django_currentuser.middleware import get_current_authenticated_user
 
+logger = logging.getLogger(__name__)
+
+_async_executor: ThreadPoolExecutor | None = None
+
+# The pending flush of each savepoint, per thread as the database connections are.
+# NOTE the flushes are only weakly referenced here. Django drops the `on_commit` callbacks of rolled back savepoints
+# and transactions, which drops their flush together with the entries audited within them.
+_pending_flushes = threading.local()
+
+
+class _AuditFlush:
+    """An `on_commit` callback that writes all the entries audited within the same savepoint at once."""
+
+    def __init__(self, using: str | None) -> None:
+        self.using = using
+        self.entries: list[LogEntry] = []
+        self.is_called = False
+
+    def __call__(self) -> None:
+        self.is_called = True
+
+        if settings.QFIELDCLOUD_AUDIT_ASYNC:
+            _get_async_executor().submit(_write_entries, self.entries, self.using)
+        else:
+            _write_entries(self.entries, self.using)
+
+
+def _get_async_executor() -> ThreadPoolExecutor:
+    global _async_executor
+
+    if _async_executor is None:
+        # NOTE a single worker, so the entries are written in the order they were committed
+        _async_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit")
+
+    return _async_executor
+
+
+def _get_previous_entries_filter(entry: LogEntry) -> Q:
+    if entry.object_id is not None:
+        return Q(content_type=entry.content_type, object_id=entry.object_id)
+
+    return Q(content_type=entry.content_type, object_pk=entry.object_pk)
+
+
+def _write_entries(entries: list[LogEntry], using: str | None) -> None:
+    try:
+        if settings.QFIELDCLOUD_AUDIT_ASYNC:
+            # the worker thread has its own connection, which might have been closed by the database meanwhile
+            close_old_connections()
+
+        entries_to_create: list[LogEntry] = []
+        for entry in entries:
+            # NOTE as `LogEntry.objects.log_create` does, a CREATE entry replaces the previous entries of the same object
+            if entry.action == LogEntry.Action.CREATE:
+                previous_entries_filter = _get_previous_entries_filter(entry)
+                LogEntry.objects.using(using).filter(previous_entries_filter).delete()
+                entries_to_create = [
+                    e
+                    for e in entries_to_create
+                    if _get_previous_entries_filter(e) != previous_entries_filter
+                ]
+
+            entries_to_create.append(entry)
+
+        LogEntry.objects.using(using).bulk_create(entries_to_create)
+    except Exception as err:
+        # NOTE the audited transaction has already been committed, failing the request would not undo it
+        logger.exception(f"Failed to write {len(entries)} audit log entries: {err}")
+
+
+def _get_pending_flush(using: str | None) -> _AuditFlush:
+    connection = transaction.get_connection(using)
+    key = (connection.alias, tuple(connection.savepoint_ids))
+
+    if not hasattr(_pending_flushes, "by_savepoint"):
+        _pending_flushes.by_savepoint = weakref.WeakValueDictionary()
+
+    flush = _pending_flushes.by_savepoint.get(key)
+
+    if flush is None or flush.is_called:
+        flush = _AuditFlush(using)
+        transaction.on_commit(flush, using=using)
+        _pending_flushes.by_savepoint[key] = flush
+
+    return flush
+
 
 def audit(
     instance,
@@ -13,7 +110,15 @@ def audit(
     actor: User = None,
     remote_addr: str = None,
     additional_data: Any = None,
-):
+) -> LogEntry | None:
+    """Writes an audit log entry about the instance, with the same fields as `LogEntry.objects.log_create`.
+
+    Within a transaction the entry is only written once the transaction is committed, together with all the other
+    entries audited within it. If `QFIELDCLOUD_AUDIT_ASYNC` is set, they are written in a background thread instead.
+
+    Returns:
+        LogEntry | None: the log entry, not saved yet if audited within a transaction. `None` if there are no changes.
+    """
     changes_json = None
 
     try:
@@ -22,18 +127,66 @@ def audit(
     except Exception:
         changes_json = json.dumps(str(changes))
 
+    # NOTE as `LogEntry.objects.log_create`, nothing is logged without changes
+    if changes_json is None:
+        return None
+
     if actor is None:
         actor = get_current_authenticated_user()
     elif isinstance(actor, AnonymousUser):
         actor = None
 
     actor_id = actor.pk if actor else None
+    using = instance._state.db or None
 
-    return LogEntry.objects.log_create(
-        instance,
+    # the serialized data of registered models can only be filled by `log_create`, there are none so far
+    is_serialized = (
+        auditlog.contains(instance.__class__)
+        and auditlog.get_serialize_options(instance.__class__)["serialize_data"]
+    )
+
+    if is_serialized or not transaction.get_connection(using).in_atomic_block:
+        kwargs = {}
+        if additional_data is not None:
+            kwargs["additional_data"] = additional_data
+
+        # NOTE without `additional_data`, `log_create` fills it from `instance.get_additional_data()`
+        return LogEntry.objects.db_manager(using).log_create(
+            instance,
+            action=action,
+            changes=changes_json,
+            actor_id=actor_id,
+            remote_addr=remote_addr,
+            **kwargs,
+        )
+
+    # NOTE the entries are bulk created without the `pre_save` signal, through which `AuditlogMiddleware` sets the
+    # remote address and the missing actor of the request, so they are set right away
+    auditlog_context = getattr(auditlog_threadlocal, "auditlog", None)
+    if auditlog_context is not None:
+        remote_addr = auditlog_context["remote_addr"]
+
+        if actor_id is None:
+            current_user = get_current_authenticated_user()
+            actor_id = current_user.pk if current_user else None
+
+    get_additional_data = getattr(instance, "get_additional_data", None)
+    if additional_data is None and callable(get_additional_data):
+        additional_data = get_additional_data()
+
+    pk = instance.pk
+    log_entry = LogEntry(
+        content_type=ContentType.objects.get_for_model(instance),
+        object_pk=smart_str(pk),
+        object_id=pk if isinstance(pk, int) else None,
+        object_repr=smart_str(instance),
         action=action,
         changes=changes_json,
         actor_id=actor_id,
         remote_addr=remote_addr,
         additional_data=additional_data,
     )
+
+    _get_pending_flush(using).entries.append(log_entry)
+
+    return log_entry
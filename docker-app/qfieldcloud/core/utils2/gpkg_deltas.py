@@ -0,0 +1,561 @@
+"""Applies the deltas on GeoPackage layers directly with SQLite, without starting a QGIS worker.
+
+Only attribute changes and deletions of features in plain GeoPackage tables are supported. Whenever a delta
+cannot be applied the same way `qfc_worker.apply_deltas` would, the deltas are left to the QGIS worker.
+
+NOTE the conflict semantics and the delta feedback must match `qfc_worker.apply_deltas`, keep them in sync.
+"""
+
+import logging
+import re
+import sqlite3
+from pathlib import Path, PurePosixPath
+from typing import Any, NamedTuple
+
+import qfieldcloud.core.utils
+from qfieldcloud.authentication.models import AuthToken
+from qfieldcloud.core import permissions_utils
+from qfieldcloud.core.utils2 import storage
+
+logger = logging.getLogger(__name__)
+
+# the `qfc_worker.apply_deltas.DeltaStatus` values
+STATUS_APPLIED = "status_applied"
+STATUS_CONFLICT = "status_conflict"
+STATUS_APPLY_FAILED = "status_apply_failed"
+
+# the `qfc_worker.apply_deltas.DeltaExceptionType` values
+E_TYPE_ERROR = "ERROR"
+E_TYPE_CONFLICT = "CONFLICT"
+
+# column types which values are compared the same way by SQLite and QGIS, see `compare_feature`
+SUPPORTED_COLUMN_TYPE_RE = re.compile(
+    r"^(BOOLEAN|TINYINT|SMALLINT|MEDIUMINT|INT|INTEGER|FLOAT|DOUBLE|REAL|TEXT(\(\d+\))?)$",
+    re.IGNORECASE,
+)
+
+# the spatial functions used by the GeoPackage R-tree triggers
+RTREE_TRIGGER_FUNCTIONS = ("ST_IsEmpty", "ST_MinX", "ST_MaxX", "ST_MinY", "ST_MaxY")
+
+
+class UnsupportedDeltaError(Exception):
+    """The deltas cannot be applied without QGIS."""
+
+
+class DeltaError(Exception):
+    def __init__(
+        self, msg: str, e_type: str = E_TYPE_ERROR, conflicts: list[str] | None = None
+    ) -> None:
+        super().__init__(msg)
+        self.e_type = e_type
+        self.conflicts = conflicts
+
+
+class GpkgLayer(NamedTuple):
+    filename: str
+    """The GeoPackage filename, relative to the project directory."""
+
+    table_name: str
+
+    pk_attr_name: str
+
+
+def get_gpkg_layers(project_details: dict[str, Any]) -> dict[str, GpkgLayer]:
+    """Returns the valid layers which are plain GeoPackage tables within the project directory.
+
+    Args:
+        project_details (dict[str, Any]): the project details, as extracted by the process projectfile job
+
+    Returns:
+        dict[str, GpkgLayer]: the GeoPackage layers by layer id
+    """
+    # NOTE the layer filenames are absolute paths on the worker, the referenced files are relative to the project directory
+    referenced_filenames = sorted(
+        project_details.get("referenced_files") or {}, key=len, reverse=True
+    )
+    gpkg_layers = {}
+
+    for layer_id, layer_data in (project_details.get("layers_by_id") or {}).items():
+        filename = layer_data.get("filename") or ""
+
+        if (
+            not layer_data.get("is_valid")
+            or layer_data.get("provider_type") != "ogr"
+            or not filename.lower().endswith(".gpkg")
+            or not layer_data.get("datasource_layer_name")
+            or layer_data.get("datasource_subset")
+            or not layer_data.get("qfc_source_data_pk_name")
+        ):
+            continue
+
+        for referenced_filename in referenced_filenames:
+            if filename.endswith(f"/{referenced_filename}"):
+                gpkg_layers[layer_id] = GpkgLayer(
+                    referenced_filename,
+                    layer_data["datasource_layer_name"],
+                    layer_data["qfc_source_data_pk_name"],
+                )
+                break
+
+    return gpkg_layers
+
+
+def inverse_delta(delta: dict[str, Any]) -> dict[str, Any]:
+    """Returns shallow copy of the delta with reversed `old` and `new` keys, same as `qfc_worker.apply_deltas`."""
+    copy = {**delta}
+    copy["old"], copy["new"] = delta.get("new"), delta.get("old")
+
+    if copy["method"] == "create":
+        copy["method"] = "delete"
+    elif copy["method"] == "delete":
+        copy["method"] = "create"
+
+    return copy
+
+
+def check_delta_supported(delta: dict[str, Any], gpkg_layers: dict[str, GpkgLayer]):
+    """Raises `UnsupportedDeltaError` if the delta cannot be applied without QGIS."""
+    if delta["sourceLayerId"] not in gpkg_layers:
+        raise UnsupportedDeltaError(
+            f'Layer "{delta["sourceLayerId"]}" is not a GeoPackage layer.'
+        )
+
+    if delta["method"] == "delete":
+        return
+
+    if delta["method"] != "patch":
+        raise UnsupportedDeltaError(f'Unsupported delta method "{delta["method"]}".')
+
+    new_feature_delta = delta.get("new") or {}
+    old_feature_delta = delta.get("old") or {}
+
+    if "geometry" in new_feature_delta and new_feature_delta[
+        "geometry"
+    ] != old_feature_delta.get("geometry"):
+        raise UnsupportedDeltaError("Geometry changes are not supported.")
+
+    old_attrs = old_feature_delta.get("attributes") or {}
+
+    for attr_name in new_feature_delta.get("attributes") or {}:
+        if attr_name not in old_attrs:
+            raise UnsupportedDeltaError(f'Missing old value of "{attr_name}".')
+
+
+def _raise_geometry_unsupported(*args) -> None:
+    raise UnsupportedDeltaError("Geometry changes are not supported.")
+
+
+def connect(filename: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(filename, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+
+    # NOTE the R-tree triggers are prepared on any update of a feature, but they call the spatial functions
+    # only when the geometry or the primary key is changed, which are never changed here
+    for function_name in RTREE_TRIGGER_FUNCTIONS:
+        conn.create_function(
+            function_name, 1, _raise_geometry_unsupported, deterministic=True
+        )
+
+    return conn
+
+
+def quote_identifier(name: str) -> str:
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def get_columns(conn: sqlite3.Connection, layer: GpkgLayer) -> dict[str, str]:
+    """Returns the type of each column in the layer table.
+
+    Raises:
+        UnsupportedDeltaError: if the primary key of the table is not the one QGIS uses
+    """
+    columns = {}
+    pk_names = []
+
+    for _cid, name, column_type, _notnull, _default, pk in conn.execute(
+        f"PRAGMA table_info({quote_identifier(layer.table_name)})"
+    ):
+        columns[name] = column_type
+
+        if pk:
+            pk_names.append(name)
+
+    if pk_names != [layer.pk_attr_name]:
+        raise UnsupportedDeltaError(
+            f'Table "{layer.table_name}" is not keyed by "{layer.pk_attr_name}".'
+        )
+
+    return columns
+
+
+def check_attributes_supported(
+    delta: dict[str, Any], layer: GpkgLayer, columns: dict[str, str]
+) -> None:
+    """Raises `UnsupportedDeltaError` if any attribute of the delta cannot be compared or changed without QGIS."""
+    if layer.pk_attr_name in ((delta.get("new") or {}).get("attributes") or {}):
+        raise UnsupportedDeltaError("Primary key changes are not supported.")
+
+    for key in ("old", "new"):
+        for attr_name in (delta.get(key) or {}).get("attributes") or {}:
+            column_type = columns.get(attr_name)
+
+            # NOTE QGIS skips the old attributes that are not in the layer, but fails to change missing attributes
+            if column_type is None:
+                if key == "old":
+                    continue
+
+                raise UnsupportedDeltaError(f'Unknown attribute "{attr_name}".')
+
+            if not SUPPORTED_COLUMN_TYPE_RE.match(column_type):
+                raise UnsupportedDeltaError(
+                    f'Attribute "{attr_name}" of unsupported type "{column_type}".'
+                )
+
+
+def get_source_pk(delta: dict[str, Any], client_pks: dict[str, str]) -> Any:
+    source_pk = delta["sourcePk"]
+
+    if client_pks:
+        client_pk_key = f"{delta['clientId']}__{delta['localPk']}"
+        if client_pk_key in client_pks:
+            source_pk = client_pks[client_pk_key]
+
+    return source_pk
+
+
+def compare_feature(
+    row: sqlite3.Row, columns: dict[str, str], delta_feature: dict[str, Any]
+) -> list[str]:
+    """Compares a feature with delta description of a feature, same as `qfc_worker.apply_deltas.compare_feature`."""
+    conflicts = []
+
+    for attr, incoming_value in (delta_feature.get("attributes") or {}).items():
+        if attr not in columns:
+            continue
+
+        current_value = row[attr]
+
+        # NOTE QGIS reads the GeoPackage booleans as `bool`
+        if current_value is not None and columns[attr].upper() == "BOOLEAN":
+            current_value = bool(current_value)
+
+        if current_value != incoming_value:
+            conflicts.append(
+                f'The attribute "{attr}" that has a conflict:\n-{current_value}\n+{incoming_value}'
+            )
+
+    return conflicts
+
+
+def apply_delta(
+    conn: sqlite3.Connection,
+    layer: GpkgLayer,
+    columns: dict[str, str],
+    delta: dict[str, Any],
+    overwrite_conflicts: bool,
+    client_pks: dict[str, str],
+) -> Any:
+    """Applies a single delta on the GeoPackage table.
+
+    Returns:
+        Any: the primary key of the modified feature
+    """
+    table_name = quote_identifier(layer.table_name)
+    pk_name = quote_identifier(layer.pk_attr_name)
+    rows = conn.execute(
+        f"SELECT * FROM {table_name} WHERE {pk_name} = ?",
+        (get_source_pk(delta, client_pks),),
+    ).fetchall()
+
+    if len(rows) > 1:
+        raise Exception("More than one feature match the feature select query")
+
+    if not rows:
+        raise DeltaError("Unable to find feature")
+
+    row = rows[0]
+    pk = row[layer.pk_attr_name]
+    conflicts = compare_feature(row, columns, delta["old"])
+
+    if conflicts:
+        if overwrite_conflicts:
+            logger.warning(
+                f'Conflicts while applying delta "{delta["uuid"]}". Ignoring since `overwrite_conflicts` flag set to `True`.\nConflicts:\n{conflicts}'
+            )
+        else:
+            raise DeltaError(
+                "There are conflicts with the already existing feature!",
+                e_type=E_TYPE_CONFLICT,
+                conflicts=conflicts,
+            )
+
+    if delta["method"] == "delete":
+        conn.execute(f"DELETE FROM {table_name} WHERE {pk_name} = ?", (pk,))
+        return pk
+
+    old_attrs = delta["old"].get("attributes") or {}
+    new_attrs = {
+        attr_name: value
+        for attr_name, value in (delta["new"].get("attributes") or {}).items()
+        if value != old_attrs[attr_name]
+    }
+
+    if new_attrs:
+        assignments = ", ".join(f"{quote_identifier(name)} = ?" for name in new_attrs)
+        conn.execute(
+            f"UPDATE {table_name} SET {assignments} WHERE {pk_name} = ?",
+            (*new_attrs.values(), pk),
+        )
+
+    return pk
+
+
+def apply_deltas_on_gpkg_files(
+    gpkg_filenames: dict[str, Path],
+    gpkg_layers: dict[str, GpkgLayer],
+    deltafile_contents: dict[str, Any],
+    overwrite_conflicts: bool,
+    inverse: bool = False,
+) -> list[dict[str, Any]]:
+    """Applies the deltas on local GeoPackage files.
+
+    The changes are written only if all deltas are supported, otherwise the files are left unchanged.
+
+    Args:
+        gpkg_filenames (dict[str, Path]): the local path of each GeoPackage, by its filename in the project
+        gpkg_layers (dict[str, GpkgLayer]): the GeoPackage layers by layer id, see `get_gpkg_layers`
+        deltafile_contents (dict[str, Any]): the deltafile
+        overwrite_conflicts (bool): whether to apply the deltas even if they conflict with the current features
+        inverse (bool, optional): whether to apply the inverse of the deltas. Defaults to False.
+
+    Raises:
+        UnsupportedDeltaError: if any delta cannot be applied without QGIS
+
+    Returns:
+        list[dict[str, Any]]: the delta log, same as `qfc_worker.apply_deltas.delta_log`
+    """
+    client_pks = deltafile_contents.get("clientPks") or {}
+    connections: dict[str, sqlite3.Connection] = {}
+    columns_by_layer_id: dict[str, dict[str, str]] = {}
+    delta_log = []
+
+    try:
+        deltas = []
+        for delta in deltafile_contents["deltas"]:
+            # NOTE Sometimes QField does not fill the `sourceLayerId` field, same as `delta_file_file_loader`
+            if not delta.get("sourceLayerId") and delta.get("localLayerId"):
+                delta = {**delta, "sourceLayerId": delta["localLayerId"]}
+
+            delta = inverse_delta(delta) if inverse else delta
+            check_delta_supported(delta, gpkg_layers)
+            deltas.append(delta)
+
+        for delta in deltas:
+            layer_id = delta["sourceLayerId"]
+            layer = gpkg_layers[layer_id]
+
+            if layer.filename not in connections:
+                conn = connect(gpkg_filenames[layer.filename])
+                conn.execute("BEGIN")
+                connections[layer.filename] = conn
+
+            if layer_id not in columns_by_layer_id:
+                columns_by_layer_id[layer_id] = get_columns(
+                    connections[layer.filename], layer
+                )
+
+            check_attributes_supported(delta, layer, columns_by_layer_id[layer_id])
+
+        for idx, delta in enumerate(deltas):
+            layer_id = delta["sourceLayerId"]
+            layer = gpkg_layers[layer_id]
+            conn = connections[layer.filename]
+
+            # each delta is applied or rolled back on its own, like the QGIS worker commits each delta
+            conn.execute("SAVEPOINT delta")
+
+            try:
+                modified_pk = apply_delta(
+                    conn,
+                    layer,
+                    columns_by_layer_id[layer_id],
+                    delta,
+                    overwrite_conflicts,
+                    client_pks,
+                )
+                conn.execute("RELEASE delta")
+            except DeltaError as err:
+                conn.execute("ROLLBACK TO delta")
+                conn.execute("RELEASE delta")
+
+                delta_log.append(
+                    {
+                        "msg": str(err),
+                        "status": STATUS_CONFLICT
+                        if err.e_type == E_TYPE_CONFLICT
+                        else STATUS_APPLY_FAILED,
+                        "e_type": err.e_type,
+                        "delta_file_id": deltafile_contents["id"],
+                        "layer_id": layer_id,
+                        "delta_index": idx,
+                        "delta_id": delta["uuid"],
+                        "feature_pk": delta.get("sourcePk"),
+                        "modified_pk": None,
+                        "conflicts": err.conflicts,
+                        "provider_errors": None,
+                        "method": delta["method"],
+                    }
+                )
+                continue
+
+            delta_log.append(
+                {
+                    "msg": "Successfully applied delta!",
+                    "status": STATUS_APPLIED,
+                    "e_type": None,
+                    "delta_file_id": deltafile_contents["id"],
+                    "layer_id": layer_id,
+                    "delta_index": idx,
+                    "delta_id": delta["uuid"],
+                    "feature_pk": delta.get("sourcePk"),
+                    "modified_pk": modified_pk,
+                    "conflicts": None,
+                    "provider_errors": None,
+                    "method": delta["method"],
+                }
+            )
+
+        for idx, delta in enumerate(deltas):
+            if delta_log[idx]["status"] == STATUS_APPLIED:
+                # NOTE GDAL updates the last change of the modified tables as well
+                connections[gpkg_layers[delta["sourceLayerId"]].filename].execute(
+                    "UPDATE gpkg_contents SET last_change = strftime('%Y-%m-%dT%H:%M:%fZ', 'now') WHERE lower(table_name) = lower(?)",
+                    (gpkg_layers[delta["sourceLayerId"]].table_name,),
+                )
+
+        for conn in connections.values():
+            conn.execute("COMMIT")
+    except sqlite3.Error as err:
+        # e.g. a trigger calling a SpatiaLite function, leave it to QGIS
+        raise UnsupportedDeltaError(f"Failed to apply the deltas with SQLite: {err}")
+    finally:
+        for conn in connections.values():
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+
+            conn.close()
+
+    return delta_log
+
+
+def apply_deltas(
+    project: "qfieldcloud.core.models.Project",  # noqa: F821
+    user: "qfieldcloud.core.models.User",  # noqa: F821
+    deltafile_contents: dict[str, Any],
+    overwrite_conflicts: bool,
+    workdir: Path,
+) -> list[dict[str, Any]] | None:
+    """Applies the deltas on the project GeoPackages without QGIS, if they are all supported.
+
+    The modified GeoPackages are uploaded as new versions of the project files.
+
+    Args:
+        project (Project): the project
+        user (User): the user the new file versions are uploaded by
+        deltafile_contents (dict[str, Any]): the deltafile
+        overwrite_conflicts (bool): whether to apply the deltas even if they conflict with the current features
+        workdir (Path): the directory to download the GeoPackages to
+
+    Returns:
+        list[dict[str, Any]] | None: the delta log, `None` if the deltas should be applied by the QGIS worker
+    """
+    project_details = project.project_details or {}
+    referenced_files = project_details.get("referenced_files") or {}
+
+    # the project details must describe the current project file, otherwise the layers might have changed
+    if not project.project_filename or referenced_files.get(
+        project.project_filename
+    ) != storage.get_project_file_sha256(str(project.id), project.project_filename):
+        logger.info("Project details are outdated, applying the deltas with QGIS.")
+        return None
+
+    gpkg_layers = get_gpkg_layers(project_details)
+
+    try:
+        for delta in deltafile_contents["deltas"]:
+            layer_id = delta.get("sourceLayerId") or delta.get("localLayerId")
+            check_delta_supported({**delta, "sourceLayerId": layer_id}, gpkg_layers)
+
+        filenames = {
+            gpkg_layers[
+                delta.get("sourceLayerId") or delta.get("localLayerId")
+            ].filename
+            for delta in deltafile_contents["deltas"]
+        }
+        bucket = qfieldcloud.core.utils.get_s3_bucket()
+        gpkg_filenames = {}
+        old_objects = {}
+
+        for filename in filenames:
+            old_object = qfieldcloud.core.utils.get_project_file_with_versions(
+                str(project.id), filename
+            )
+
+            if not old_object:
+                raise UnsupportedDeltaError(f'Missing project file "{filename}".')
+
+            old_objects[filename] = old_object
+            gpkg_filenames[filename] = workdir.joinpath(
+                "gpkg", *PurePosixPath(filename).parts
+            )
+            gpkg_filenames[filename].parent.mkdir(parents=True, exist_ok=True)
+            bucket.download_file(
+                old_object.latest.key,
+                str(gpkg_filenames[filename]),
+                ExtraArgs={"VersionId": old_object.latest.id},
+            )
+
+        delta_log = apply_deltas_on_gpkg_files(
+            gpkg_filenames, gpkg_layers, deltafile_contents, overwrite_conflicts
+        )
+    except UnsupportedDeltaError as err:
+        logger.info(f"Applying the deltas with QGIS: {err}")
+        return None
+
+    modified_filenames = {
+        gpkg_layers[entry["layer_id"]].filename
+        for entry in delta_log
+        if entry["status"] == STATUS_APPLIED
+    }
+
+    # NOTE the same upload policy as the QGIS worker, which uploads the modified files with a worker token
+    permissions_utils.check_can_upload_file(
+        project,
+        AuthToken.ClientType.WORKER,
+        sum(gpkg_filenames[filename].stat().st_size for filename in modified_filenames),
+    )
+
+    for filename in sorted(modified_filenames):
+        gpkg_filename = gpkg_filenames[filename]
+
+        with open(gpkg_filename, "rb") as f:
+            sha256sum = qfieldcloud.core.utils.get_sha256(f)
+            bucket.upload_fileobj(
+                f,
+                f"projects/{project.id}/files/{filename}",
+                ExtraArgs={"Metadata": {"Sha256sum": sha256sum}},
+            )
+
+        storage.update_project_after_file_upload(
+            str(project.id),
+            filename,
+            gpkg_filename.stat().st_size,
+            old_objects[filename],
+            user,
+        )
+
+    logger.info(
+        f"Applied {len(delta_log)} deltas without QGIS, modified files: {sorted(modified_filenames)}"
+    )
+
+    return delta_log
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 
 import qfieldcloud.core.models as models
@@ -95,6 +96,76 @@ def apply_deltas(
     return apply_jobs
 
 
+def _get_created_feature_keys(apply_job: "models.Job") -> set[tuple[str, str]]:
+    """Returns the client id and the local primary key of the features created by the apply job."""
+    return {
+        (str(client_id), local_pk)
+        for client_id, local_pk in models.Delta.objects.filter(
+            jobs_to_apply=apply_job.pk,
+            content__method=models.Delta.Method.Create.value,
+        ).values_list("client_id", "content__localPk")
+    }
+
+
+def get_mergeable_apply_jobs(apply_job: "models.Job") -> list["models.ApplyJob"]:
+    """Returns the pending apply jobs which can be applied in the same worker run as the given apply job.
+
+    Only the apply jobs directly following the given one and with the same `overwrite_conflicts` are merged,
+    so the deltas are still applied in the order they were pushed. A job modifying a feature created
+    by the jobs before it is not merged, as the primary key of the created feature is known only once applied.
+
+    NOTE must be called within a transaction, the returned jobs are locked until it ends.
+
+    Args:
+        apply_job (Job): the dequeued apply job
+
+    Returns:
+        list[ApplyJob]: the apply jobs to merge, ordered by creation time
+    """
+    overwrite_conflicts = models.ApplyJob.objects.get(
+        pk=apply_job.pk
+    ).overwrite_conflicts
+    following_jobs = list(
+        models.Job.objects.filter(
+            project_id=apply_job.project_id,
+            status=models.Job.Status.PENDING,
+            created_at__gt=apply_job.created_at,
+        ).order_by("created_at")[: settings.QFIELDCLOUD_APPLY_JOBS_MERGE_LIMIT]
+    )
+    # NOTE another dequeuer might have locked a job in the meantime, then only the jobs before it are merged
+    locked_job_ids = set(
+        models.Job.objects.select_for_update(skip_locked=True)
+        .filter(pk__in=[job.pk for job in following_jobs])
+        .values_list("pk", flat=True)
+    )
+    created_feature_keys = _get_created_feature_keys(apply_job)
+    mergeable_jobs = []
+
+    for job in following_jobs:
+        if job.type != models.Job.Type.DELTA_APPLY or job.pk not in locked_job_ids:
+            break
+
+        job = models.ApplyJob.objects.get(pk=job.pk)
+
+        if job.overwrite_conflicts != overwrite_conflicts:
+            break
+
+        feature_keys = {
+            (str(client_id), local_pk)
+            for client_id, local_pk in models.Delta.objects.filter(
+                jobs_to_apply=job.pk
+            ).values_list("client_id", "content__localPk")
+        }
+
+        if feature_keys & created_feature_keys:
+            break
+
+        created_feature_keys |= _get_created_feature_keys(job)
+        mergeable_jobs.append(job)
+
+    return mergeable_jobs
+
+
 def repackage(project: "models.Project", user: "models.User") -> "models.PackageJob":
     """Returns an unfinished or freshly created package job.
 
@@ -135,3 +206,35 @@ def repackage_if_needed(
         )
 
     return package_job
+
+
+def get_job_etag(job_id: str) -> str | None:
+    """Returns a strong ETag of the job, without loading its potentially large `feedback` and `output`.
+
+    NOTE the status changes are saved with `update_fields` and do not bump `updated_at`,
+    therefore the status and the execution timestamps are part of the ETag too.
+
+    Args:
+        job_id (str): the job id
+
+    Returns:
+        str | None: the quoted ETag or `None` if the job does not exist
+    """
+    values = (
+        models.Job.objects.filter(pk=job_id)
+        .values_list(
+            "status",
+            "updated_at",
+            "started_at",
+            "docker_finished_at",
+            "finished_at",
+        )
+        .first()
+    )
+
+    if values is None:
+        return None
+
+    digest = hashlib.md5(str((str(job_id), *values)).encode()).hexdigest()
+
+    return f'"{digest}"'
@@ -0,0 +1,175 @@
+import configparser
+import io
+import logging
+import re
+from typing import Any
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the connection to the database of a layer, the probe should not block the worker for long.
+CONNECT_TIMEOUT = 5
+
+# `key=value` pairs of a QGIS datasource URI, the value is either quoted or not
+DATASOURCE_PARAM_RE = re.compile(
+    r"""(?P<key>\w+)=(?P<value>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"(?:\."(?:[^"\\]|\\.)*")?|\S*)"""
+)
+
+CONNECTION_PARAMS = ("service", "dbname", "host", "port", "user", "password", "sslmode")
+
+
+def parse_datasource(datasource: str) -> dict[str, str]:
+    """Parses a QGIS PostgreSQL datasource URI, e.g. `dbname='test' host=geodb table="public"."point" (geometry)`.
+
+    The table name is kept quoted, the other values are unquoted.
+    """
+    # NOTE the `sql` filter is always the last parameter and might contain anything
+    datasource = re.split(r"(?:^|\s)sql=", datasource, maxsplit=1)[0]
+    params = {}
+
+    for match in DATASOURCE_PARAM_RE.finditer(datasource):
+        key = match.group("key")
+        value = match.group("value")
+
+        if key != "table" and value.startswith("'"):
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+
+        params[key] = value
+
+    return params
+
+
+def get_pg_services(pgservice_file_contents: str) -> dict[str, dict[str, str]]:
+    """Returns the connection parameters of each service in the `pg_service.conf` contents."""
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_file(io.StringIO(pgservice_file_contents))
+
+    return {section: dict(config.items(section)) for section in config.sections()}
+
+
+def get_connection_params(
+    datasource_params: dict[str, str], pg_services: dict[str, dict[str, str]]
+) -> dict[str, Any] | None:
+    """Returns the `psycopg2.connect` parameters of a datasource, `None` if they cannot be resolved."""
+    params: dict[str, Any] = {}
+    service = datasource_params.get("service")
+
+    if service:
+        # NOTE the services are only known to the workers via the project secrets
+        if service not in pg_services:
+            return None
+
+        params.update(
+            {
+                key: value
+                for key, value in pg_services[service].items()
+                if key in CONNECTION_PARAMS
+            }
+        )
+
+    params.update(
+        {
+            key: value
+            for key, value in datasource_params.items()
+            if key in CONNECTION_PARAMS and key != "service" and value
+        }
+    )
+
+    if "authcfg" in datasource_params or not params.get("dbname"):
+        return None
+
+    return params
+
+
+def get_change_token(cursor, quoted_table_name: str) -> str | None:
+    """Returns a token that changes whenever the data of the PostgreSQL table changes, `None` if it is not a table.
+
+    NOTE the same token is computed by the QGIS worker in `qfc_worker.utils.get_postgres_change_token`, keep them in sync.
+    """
+    # NOTE only (partitioned) tables have `xmin`
+    cursor.execute(
+        """
+            SELECT oid::regclass::text
+            FROM pg_class
+            WHERE oid = to_regclass(%s)
+                AND relkind IN ('r', 'p')
+        """,
+        (quoted_table_name,),
+    )
+    rows = cursor.fetchall()
+
+    if len(rows) != 1:
+        return None
+
+    # NOTE the table name is quoted by PostgreSQL itself
+    cursor.execute(
+        f"""
+            SELECT
+                count(*)::text,
+                coalesce(sum(xmin::text::bigint), 0)::text,
+                coalesce(max(xmin::text::bigint), 0)::text
+            FROM {rows[0][0]}
+        """
+    )
+    count, xmin_sum, xmin_max = cursor.fetchone()
+
+    return f"xmin:{count}:{xmin_sum}:{xmin_max}"
+
+
+def get_layers_change_tokens(
+    datasource_by_layer_id: dict[str, str], pgservice_file_contents: str = ""
+) -> dict[str, str | None]:
+    """Probes the PostgreSQL layers for their current change tokens.
+
+    The layers sharing the same database are probed over a single connection.
+
+    Args:
+        datasource_by_layer_id (dict[str, str]): the QGIS datasource URI of each layer
+        pgservice_file_contents (str, optional): the `pg_service.conf` contents of the project secrets. Defaults to "".
+
+    Returns:
+        dict[str, str | None]: the change token of each layer, `None` if it cannot be probed
+    """
+    pg_services = get_pg_services(pgservice_file_contents)
+    tokens: dict[str, str | None] = {}
+    layers_by_connection: dict[tuple, list[tuple[str, str]]] = {}
+
+    for layer_id, datasource in datasource_by_layer_id.items():
+        tokens[layer_id] = None
+
+        datasource_params = parse_datasource(datasource)
+        quoted_table_name = datasource_params.get("table", "")
+        connection_params = get_connection_params(datasource_params, pg_services)
+
+        if (
+            not quoted_table_name
+            or quoted_table_name.startswith('"(')
+            or connection_params is None
+        ):
+            continue
+
+        connection_key = tuple(sorted(connection_params.items()))
+        layers_by_connection.setdefault(connection_key, []).append(
+            (layer_id, quoted_table_name)
+        )
+
+    for connection_key, layers in layers_by_connection.items():
+        try:
+            conn = psycopg2.connect(
+                **dict(connection_key), connect_timeout=CONNECT_TIMEOUT
+            )
+        except psycopg2.Error as err:
+            logger.info(f"Failed to connect to probe {len(layers)} layer(s): {err}")
+            continue
+
+        try:
+            with conn.cursor() as cursor:
+                for layer_id, quoted_table_name in layers:
+                    tokens[layer_id] = get_change_token(cursor, quoted_table_name)
+        except psycopg2.Error as err:
+            logger.info(f"Failed to probe the change tokens: {err}")
+        finally:
+            conn.close()
+
+    return tokens
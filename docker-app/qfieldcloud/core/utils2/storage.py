@@ -1,19 +1,29 @@
 from __future__ import annotations
 
+import gzip
+import hashlib
+import io
+import json
 import logging
 import re
+from datetime import datetime
 from enum import Enum
 from pathlib import PurePath
-from typing import IO
+from typing import IO, Iterator, NamedTuple
 
+import qfieldcloud.core.exceptions
 import qfieldcloud.core.models
 import qfieldcloud.core.utils
+from botocore.errorfactory import ClientError
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.http import FileResponse, HttpRequest
+from django.db.models import F
+from django.http import FileResponse, Http404, HttpRequest
 from django.http.response import HttpResponse, HttpResponseBase
-from mypy_boto3_s3.type_defs import ObjectIdentifierTypeDef
+from django.utils import timezone
+from django.utils.http import parse_http_date_safe
+from mypy_boto3_s3.type_defs import ObjectIdentifierTypeDef, PartTypeDef
 from qfieldcloud.core.utils2.audit import LogEntry, audit
 
 logger = logging.getLogger(__name__)
@@ -193,20 +203,79 @@ def get_attachment_dir_prefix(
     return ""
 
 
+def _is_if_range_satisfied(if_range: str, head: dict) -> bool:
+    """Checks whether the `If-Range` header matches the object, so only the requested range can be sent.
+
+    The object storage does not evaluate `If-Range`, so it is done before redirecting to it.
+    As required by RFC 9110, only a strong ETag or the exact last modified date matches.
+
+    Args:
+        if_range (str): value of the `If-Range` request header
+        head (dict): the `HeadObject` response of the object to be sent
+
+    Returns:
+        bool: whether the range request can be served
+    """
+    if_range = if_range.strip()
+
+    # weak ETags never match
+    if if_range.startswith("W/"):
+        return False
+
+    if if_range.startswith('"'):
+        return if_range == head["ETag"]
+
+    last_modified = parse_http_date_safe(if_range)
+
+    return last_modified is not None and last_modified == int(
+        head["LastModified"].timestamp()
+    )
+
+
 def file_response(
     request: HttpRequest,
     key: str,
     expires: int = 60,
     version: str | None = None,
     as_attachment: bool = False,
+    filename: str | None = None,
 ) -> HttpResponseBase:
+    """Serves a file from the object storage, either by redirecting to it through NGINX or directly in debug mode.
+
+    Supports `Range` and `If-Range` requests, so interrupted downloads can be resumed. The object storage's ETag is
+    sent as a strong ETag, as it is the md5 of the contents of the served version.
+
+    The downloaded filename defaults to the last part of the key, pass `filename` if the key is not named after the file.
+    """
     url = ""
-    filename = PurePath(key).name
+    if filename is None:
+        filename = PurePath(key).name
     extra_params = {}
 
     if version is not None:
         extra_params["VersionId"] = version
 
+    s3_client = qfieldcloud.core.utils.get_s3_client()
+    bucket_name = qfieldcloud.core.utils.get_s3_bucket().name
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+
+    if range_header and if_range:
+        try:
+            head = s3_client.head_object(Bucket=bucket_name, Key=key, **extra_params)
+        except ClientError as err:
+            if err.response["Error"]["Code"] in ("404", "NoSuchKey", "NoSuchVersion"):
+                raise Http404(f'File "{filename}" not found.')
+
+            raise err
+
+        # NOTE pin the checked version, otherwise the file might be overwritten before the redirect is followed
+        if head.get("VersionId"):
+            extra_params["VersionId"] = head["VersionId"]
+
+        if not _is_if_range_satisfied(if_range, head):
+            range_header = None
+
     # check if we are in NGINX proxy
     http_host = request.META.get("HTTP_HOST", "")
     https_port = http_host.split(":")[-1] if ":" in http_host else "443"
@@ -218,12 +287,12 @@ def file_response(
                 "ResponseContentDisposition"
             ] = f'attachment;filename="{filename}"'
 
-        url = qfieldcloud.core.utils.get_s3_client().generate_presigned_url(
+        url = s3_client.generate_presigned_url(
             "get_object",
             Params={
                 **extra_params,
                 "Key": key,
-                "Bucket": qfieldcloud.core.utils.get_s3_bucket().name,
+                "Bucket": bucket_name,
             },
             ExpiresIn=expires,
             HttpMethod="GET",
@@ -233,22 +302,40 @@ def file_response(
         response = HttpResponse()
         response["X-Accel-Redirect"] = "/storage-download/"
         response["redirect_uri"] = url
+        # NOTE the `Range` header is passed to the storage only if the `If-Range` condition is satisfied
+        response["redirect_range"] = range_header or ""
 
         return response
     elif settings.DEBUG or settings.IN_TEST_SUITE:
-        return_file = ContentFile(b"")
-        qfieldcloud.core.utils.get_s3_bucket().download_fileobj(
-            key,
-            return_file,
-            extra_params,
-        )
+        if range_header:
+            extra_params["Range"] = range_header
+
+        try:
+            s3_object = s3_client.get_object(
+                Bucket=bucket_name, Key=key, **extra_params
+            )
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "InvalidRange":
+                return HttpResponse(status=416)
+
+            raise err
 
-        return FileResponse(
-            return_file.open(),
+        is_partial = "ContentRange" in s3_object
+        response = FileResponse(
+            s3_object["Body"],
             as_attachment=as_attachment,
             filename=filename,
             content_type="text/html",
+            status=206 if is_partial else 200,
         )
+        response["Content-Length"] = s3_object["ContentLength"]
+        response["ETag"] = s3_object["ETag"]
+        response["Accept-Ranges"] = "bytes"
+
+        if is_partial:
+            response["Content-Range"] = s3_object["ContentRange"]
+
+        return response
 
     raise Exception(
         "Expected to either run behind nginx proxy, debug mode or within a test suite."
@@ -450,6 +537,346 @@ def upload_project_file(
     return key
 
 
+def get_project_file_sha256(project_id: str, filename: str) -> str | None:
+    """Returns the sha256 of the latest version of a project file, as stored in its metadata.
+
+    Returns:
+        str | None: the sha256, `None` if the file does not exist or its sha256 is unknown
+    """
+    client = qfieldcloud.core.utils.get_s3_client()
+
+    try:
+        head = client.head_object(
+            Bucket=settings.STORAGE_BUCKET_NAME,
+            Key=f"projects/{project_id}/files/{filename}",
+        )
+    except ClientError as err:
+        if err.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 404:
+            return None
+
+        raise err
+
+    metadata = head["Metadata"]
+
+    return metadata.get("sha256sum") or metadata.get("Sha256sum")
+
+
+def update_project_after_file_upload(
+    project_id: str,
+    filename: str,
+    file_size_bytes: int,
+    old_object: qfieldcloud.core.utils.S3ObjectWithVersions | None,
+    user: qfieldcloud.core.models.User,  # noqa: F821
+    file_upload_session: qfieldcloud.core.models.FileUploadSession | None = None,  # noqa: F821
+) -> None:
+    """Updates the project after a file has been uploaded to the storage.
+
+    Sets the QGIS project file, triggers the processing of the QGIS project file, updates the storage size,
+    audits the upload and purges the old file versions.
+
+    Args:
+        project_id (str): the project the file has been uploaded to
+        filename (str): the uploaded filename
+        file_size_bytes (int): the size of the uploaded file
+        old_object (S3ObjectWithVersions | None): the file as it was before the upload, None if it is a new file
+        user (User): the user who uploaded the file
+        file_upload_session (FileUploadSession | None): the session the file has been uploaded with, deleted
+            together with the project update so the file is accounted only once
+    """
+    new_object = qfieldcloud.core.utils.get_project_file_with_versions(
+        project_id, filename
+    )
+
+    assert new_object
+
+    is_qgis_project_file = qfieldcloud.core.utils.is_qgis_project_file(filename)
+
+    with transaction.atomic():
+        # we only enter a transaction after the file is uploaded because we do not
+        # want to lock the project row for way too long. If we reselect for update the
+        # project and update it now, it guarantees there will be no other file upload editing
+        # the same project row.
+        project = qfieldcloud.core.models.Project.objects.select_for_update().get(
+            id=project_id
+        )
+        update_fields = ["data_last_updated_at", "file_storage_bytes"]
+
+        if get_attachment_dir_prefix(project, filename) == "" and (
+            is_qgis_project_file or project.project_filename is not None
+        ):
+            if is_qgis_project_file:
+                project.project_filename = filename
+                update_fields.append("project_filename")
+
+            running_jobs = qfieldcloud.core.models.ProcessProjectfileJob.objects.filter(
+                project=project,
+                created_by=user,
+                status__in=[
+                    qfieldcloud.core.models.Job.Status.PENDING,
+                    qfieldcloud.core.models.Job.Status.QUEUED,
+                    qfieldcloud.core.models.Job.Status.STARTED,
+                ],
+            )
+
+            if not running_jobs.exists():
+                qfieldcloud.core.models.ProcessProjectfileJob.objects.create(
+                    project=project, created_by=user
+                )
+
+        project.data_last_updated_at = timezone.now()
+        # NOTE just incrementing the fils_storage_bytes when uploading might make the database out of sync if a files is uploaded/deleted bypassing this function
+        project.file_storage_bytes += file_size_bytes
+        project.save(update_fields=update_fields)
+
+        if file_upload_session:
+            file_upload_session.delete()
+
+    if old_object:
+        audit(
+            project,
+            LogEntry.Action.UPDATE,
+            changes={filename: [old_object.latest.e_tag, new_object.latest.e_tag]},
+        )
+    else:
+        audit(
+            project,
+            LogEntry.Action.CREATE,
+            changes={filename: [None, new_object.latest.e_tag]},
+        )
+
+    # Delete the old file versions
+    purge_old_file_versions(project)
+
+
+# the maximum number of parts of a S3 multipart upload
+MULTIPART_UPLOAD_MAX_PARTS = 10000
+
+
+def create_file_upload_session(
+    project: qfieldcloud.core.models.Project,  # noqa: F821
+    filename: str,
+    size_bytes: int,
+    user: qfieldcloud.core.models.User,  # noqa: F821
+    sha256sum: str,
+) -> qfieldcloud.core.models.FileUploadSession:  # noqa: F821
+    """Starts a resumable upload of a project file, backed by a S3 multipart upload.
+
+    Args:
+        project (Project): the project the file is uploaded to
+        filename (str): the filename within the project
+        size_bytes (int): the total size of the file
+        user (User): the user who uploads the file
+        sha256sum (str): the sha256 of the file, stored as metadata like for the regular uploads and checked when finalized
+
+    Returns:
+        FileUploadSession: the new upload session
+    """
+    chunk_size_bytes = settings.QFIELDCLOUD_FILE_UPLOAD_CHUNK_SIZE
+
+    if size_bytes > chunk_size_bytes * MULTIPART_UPLOAD_MAX_PARTS:
+        raise qfieldcloud.core.exceptions.ValidationError(
+            f"Files bigger than {chunk_size_bytes * MULTIPART_UPLOAD_MAX_PARTS} bytes cannot be uploaded."
+        )
+
+    key = qfieldcloud.core.utils.safe_join(f"projects/{project.id}/files/", filename)
+    sha256sum = sha256sum.lower()
+
+    multipart_upload = qfieldcloud.core.utils.get_s3_client().create_multipart_upload(
+        Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+        Key=key,
+        Metadata={"Sha256sum": sha256sum},
+    )
+
+    return qfieldcloud.core.models.FileUploadSession.objects.create(
+        project=project,
+        filename=filename,
+        key=key,
+        upload_id=multipart_upload["UploadId"],
+        sha256sum=sha256sum,
+        size_bytes=size_bytes,
+        chunk_size_bytes=chunk_size_bytes,
+        created_by=user,
+    )
+
+
+def get_file_upload_session_parts(
+    session: qfieldcloud.core.models.FileUploadSession,  # noqa: F821
+) -> list[PartTypeDef]:
+    """Returns the chunks already uploaded to the storage, ordered by their part number."""
+    if session.completed_at:
+        raise qfieldcloud.core.exceptions.ValidationError(
+            "The upload is already completed, finalize it again to update the project."
+        )
+
+    paginator = qfieldcloud.core.utils.get_s3_client().get_paginator("list_parts")
+    parts = []
+
+    for page in paginator.paginate(
+        Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+        Key=session.key,
+        UploadId=session.upload_id,
+    ):
+        parts += page.get("Parts", [])
+
+    return parts
+
+
+def upload_file_upload_session_chunk(
+    session: qfieldcloud.core.models.FileUploadSession,  # noqa: F821
+    offset: int,
+    content: bytes,
+) -> None:
+    """Uploads the chunk of the file starting at the given offset, overwriting it if already uploaded.
+
+    Args:
+        session (FileUploadSession): the upload session
+        offset (int): the offset of the chunk in the file, must be a multiple of the session's chunk size
+        content (bytes): the contents of the chunk
+    """
+    if session.completed_at:
+        raise qfieldcloud.core.exceptions.ValidationError(
+            "The upload is already completed, finalize it again to update the project."
+        )
+
+    if (
+        offset < 0
+        or offset % session.chunk_size_bytes
+        or offset >= max(session.size_bytes, 1)
+    ):
+        raise qfieldcloud.core.exceptions.ValidationError(
+            f"The offset must be a multiple of {session.chunk_size_bytes} and lower than {session.size_bytes}, got {offset}."
+        )
+
+    expected_size = session.get_chunk_size(offset)
+
+    if len(content) != expected_size:
+        raise qfieldcloud.core.exceptions.ValidationError(
+            f"The chunk at offset {offset} must be {expected_size} bytes, got {len(content)} bytes."
+        )
+
+    qfieldcloud.core.utils.get_s3_client().upload_part(
+        Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+        Key=session.key,
+        UploadId=session.upload_id,
+        PartNumber=offset // session.chunk_size_bytes + 1,
+        Body=content,
+    )
+
+
+def complete_file_upload_session(
+    session: qfieldcloud.core.models.FileUploadSession,  # noqa: F821
+) -> None:
+    """Assembles the uploaded chunks into the project file, then updates the project like any other file upload.
+
+    Finalizing a session again after the project update has failed only updates the project, as the chunks have
+    already been assembled.
+
+    Raises:
+        ValidationError: if some chunks are missing or have an unexpected size, or the assembled file does not match
+            the sha256 of the session, in which case the file and the session are deleted
+    """
+    if not session.completed_at:
+        parts = get_file_upload_session_parts(session)
+        part_numbers = [part["PartNumber"] for part in parts]
+
+        if part_numbers != list(range(1, session.chunks_count + 1)):
+            missing_count = session.chunks_count - len(part_numbers)
+            raise qfieldcloud.core.exceptions.ValidationError(
+                f"Cannot finalize the upload, {missing_count} chunk(s) are missing."
+            )
+
+        for part in parts:
+            offset = (part["PartNumber"] - 1) * session.chunk_size_bytes
+            if part["Size"] != session.get_chunk_size(offset):
+                raise qfieldcloud.core.exceptions.ValidationError(
+                    f"Cannot finalize the upload, the chunk at offset {offset} has unexpected size."
+                )
+
+        qfieldcloud.core.utils.get_s3_client().complete_multipart_upload(
+            Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+            Key=session.key,
+            UploadId=session.upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"ETag": part["ETag"], "PartNumber": part["PartNumber"]}
+                    for part in parts
+                ]
+            },
+        )
+
+        # NOTE the multipart upload no longer exists on the storage, so a retried finalize must skip straight to
+        # the project update
+        session.completed_at = timezone.now()
+        session.save(update_fields=["completed_at"])
+
+    new_object = qfieldcloud.core.utils.get_project_file_with_versions(
+        session.project_id, session.filename
+    )
+
+    assert new_object
+
+    # NOTE the sha256 metadata is used to skip unchanged files and processing, so it must be the one of the contents
+    if get_object_version_sha256(new_object.latest) != session.sha256sum:
+        delete_version_permanently(new_object.latest)
+        session.delete()
+
+        raise qfieldcloud.core.exceptions.ValidationError(
+            "The uploaded file does not match the sha256 of the upload, upload it again."
+        )
+
+    # the file as it was before the upload, as the uploaded version is now the latest one
+    old_versions = [v for v in new_object.versions if not v.is_latest]
+    old_object = None
+    if old_versions:
+        old_object = qfieldcloud.core.utils.S3ObjectWithVersions(
+            old_versions[-1], old_versions
+        )
+
+    update_project_after_file_upload(
+        session.project_id,
+        session.filename,
+        session.size_bytes,
+        old_object,
+        session.created_by,
+        file_upload_session=session,
+    )
+
+
+def get_object_version_sha256(
+    version_obj: qfieldcloud.core.utils.S3ObjectVersion,
+) -> str:
+    """Returns the sha256 of the contents of an object version, streamed from the storage."""
+    response = qfieldcloud.core.utils.get_s3_client().get_object(
+        Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+        Key=version_obj.key,
+        VersionId=version_obj.id,
+    )
+    hasher = hashlib.sha256()
+
+    for chunk in response["Body"].iter_chunks(chunk_size=1024 * 1024):
+        hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+def abort_file_upload_session(
+    session: qfieldcloud.core.models.FileUploadSession,  # noqa: F821
+) -> None:
+    """Aborts the upload and deletes the already uploaded chunks from the storage."""
+    try:
+        qfieldcloud.core.utils.get_s3_client().abort_multipart_upload(
+            Bucket=qfieldcloud.core.utils.get_s3_bucket().name,
+            Key=session.key,
+            UploadId=session.upload_id,
+        )
+    except ClientError as err:
+        # the multipart upload might have already been aborted by the storage lifecycle rules
+        if err.response["Error"]["Code"] != "NoSuchUpload":
+            raise err
+
+    session.delete()
+
+
 def delete_all_project_files_permanently(project_id: str) -> None:
     prefix = f"projects/{project_id}/"
 
@@ -591,6 +1018,250 @@ def delete_project_file_version_permanently(
     return versions_to_delete
 
 
+def get_package_blob_key(project_id: str, sha256sum: str) -> str:
+    """Returns the key of the content-addressed blob of a package file."""
+    return f"projects/{project_id}/package_blobs/{sha256sum}"
+
+
+def register_package_file(
+    project_id: str,
+    package_id: str,
+    filename: str,
+    sha256sum: str,
+    md5sum: str,
+    size_bytes: int,
+) -> bool:
+    """Adds a file to the manifest of a package, once its blob is stored.
+
+    Args:
+        project_id (str): the project id
+        package_id (str): the package id
+        filename (str): the filename within the package
+        sha256sum (str): the sha256 of the file contents
+        md5sum (str): the md5 of the file contents
+        size_bytes (int): the size of the file
+
+    Returns:
+        bool: whether the blob is referenced by other package files too. If not, the blob might be being deleted
+            by `delete_orphaned_package_blobs` and must be uploaded again, unless it was uploaded just before.
+    """
+    with transaction.atomic():
+        # NOTE lock the project, so `delete_orphaned_package_blobs` finds the blob either referenced by this file,
+        # or already unreferenced by any file.
+        qfieldcloud.core.models.Project.objects.select_for_update().only("pk").get(
+            pk=project_id
+        )
+
+        qfieldcloud.core.models.ProjectPackageFile.objects.update_or_create(
+            package_id=package_id,
+            name=filename,
+            defaults={
+                "sha256": sha256sum,
+                "md5sum": md5sum,
+                "size_bytes": size_bytes,
+            },
+        )
+
+        return (
+            qfieldcloud.core.models.ProjectPackageFile.objects.filter(
+                package__project_id=project_id,
+                sha256=sha256sum,
+            )
+            .exclude(
+                package_id=package_id,
+                name=filename,
+            )
+            .exists()
+        )
+
+
+class StoredPackageFile(NamedTuple):
+    name: str
+    key: str
+    last_modified: datetime
+    size: int
+    md5sum: str
+    # None for the packages stored before the manifests, the sha256 is then only in the object metadata
+    sha256sum: str | None
+
+
+def get_stored_package_files(
+    project_id: str, package_id: str
+) -> list[StoredPackageFile]:
+    """Returns the files of a package, either from its manifest or by listing its own copies on the storage."""
+    package_files = qfieldcloud.core.models.ProjectPackageFile.objects.filter(
+        package_id=package_id,
+    ).order_by("name")
+
+    if not package_files:
+        return [
+            StoredPackageFile(
+                name=f.name,
+                key=f.key,
+                last_modified=f.last_modified,
+                size=f.size,
+                md5sum=f.md5sum,
+                sha256sum=None,
+            )
+            for f in qfieldcloud.core.utils.get_project_package_files(
+                project_id, package_id
+            )
+        ]
+
+    return [
+        StoredPackageFile(
+            name=package_file.name,
+            key=get_package_blob_key(project_id, package_file.sha256),
+            last_modified=package_file.created_at,
+            size=package_file.size_bytes,
+            md5sum=package_file.md5sum,
+            sha256sum=package_file.sha256,
+        )
+        for package_file in package_files
+    ]
+
+
+def get_package_file_key(project_id: str, package_id: str, filename: str) -> str:
+    """Returns the key of a package file, the blob if the package has a manifest, its own copy otherwise."""
+    package_file = qfieldcloud.core.models.ProjectPackageFile.objects.filter(
+        package_id=package_id,
+        name=filename,
+    ).first()
+
+    if package_file:
+        return get_package_blob_key(project_id, package_file.sha256)
+
+    return qfieldcloud.core.utils.safe_join(
+        f"projects/{project_id}/packages/{package_id}/", filename
+    )
+
+
+def reuse_package_files(
+    project_id: str,
+    package_id: str,
+    previous_package_id: str,
+    filenames: list[str],
+) -> None:
+    """Adds the files of the previous package to the manifest of a package, without uploading them again.
+
+    Args:
+        project_id (str): the project id
+        package_id (str): the package id
+        previous_package_id (str): the package id the files are reused from
+        filenames (list[str]): the filenames within the previous package
+    """
+    ProjectPackage = qfieldcloud.core.models.ProjectPackage
+    ProjectPackageFile = qfieldcloud.core.models.ProjectPackageFile
+
+    if not filenames:
+        return
+
+    with transaction.atomic():
+        # NOTE lock the project, so the reused blobs cannot be deleted by `delete_orphaned_package_blobs` meanwhile
+        qfieldcloud.core.models.Project.objects.select_for_update().only("pk").get(
+            pk=project_id
+        )
+
+        previous_files = list(
+            ProjectPackageFile.objects.filter(
+                package_id=previous_package_id,
+                name__in=filenames,
+            ).exclude(
+                package__state=ProjectPackage.State.DELETED,
+            )
+        )
+
+        if len(previous_files) != len(set(filenames)):
+            raise RuntimeError(
+                f"Some of the reused files are missing in the previous package {project_id=} {previous_package_id=}"
+            )
+
+        package, _created = ProjectPackage.objects.get_or_create(
+            id=package_id,
+            defaults={
+                "project_id": project_id,
+            },
+        )
+
+        ProjectPackageFile.objects.bulk_create(
+            [
+                ProjectPackageFile(
+                    package_id=package_id,
+                    name=previous_file.name,
+                    sha256=previous_file.sha256,
+                    md5sum=previous_file.md5sum,
+                    size_bytes=previous_file.size_bytes,
+                )
+                for previous_file in previous_files
+            ]
+        )
+
+        ProjectPackage.objects.filter(pk=package.pk).update(
+            size_bytes=F("size_bytes")
+            + sum(previous_file.size_bytes for previous_file in previous_files),
+        )
+
+
+def delete_orphaned_package_blobs(project_id: str) -> int:
+    """Deletes the blobs that are referenced only by deleted packages, together with the manifests of these packages.
+
+    Returns:
+        int: number of deleted blobs
+    """
+    ProjectPackage = qfieldcloud.core.models.ProjectPackage
+    ProjectPackageFile = qfieldcloud.core.models.ProjectPackageFile
+
+    # NOTE the versions are listed before the orphaned blobs are found, and only these versions are deleted. A blob
+    # uploaded again once unreferenced, see `register_package_file`, is a newer version and is kept.
+    versions_by_key: dict[str, list[qfieldcloud.core.utils.S3ObjectVersion]] = {}
+    for version in qfieldcloud.core.utils.list_versions(
+        qfieldcloud.core.utils.get_s3_bucket(),
+        f"projects/{project_id}/package_blobs/",
+    ):
+        versions_by_key.setdefault(version.key, []).append(version)
+
+    with transaction.atomic():
+        # NOTE lock the project only while the manifests are updated, not while the blobs are deleted from the storage
+        qfieldcloud.core.models.Project.objects.select_for_update().only("pk").get(
+            pk=project_id
+        )
+
+        deleted_files_qs = ProjectPackageFile.objects.filter(
+            package__project_id=project_id,
+            package__state=ProjectPackage.State.DELETED,
+        )
+        referenced_sha256s = ProjectPackageFile.objects.filter(
+            package__project_id=project_id,
+        ).exclude(
+            package__state=ProjectPackage.State.DELETED,
+        )
+        orphaned_sha256s = list(
+            deleted_files_qs.exclude(
+                sha256__in=referenced_sha256s.values("sha256"),
+            )
+            .order_by()
+            .values_list("sha256", flat=True)
+            .distinct()
+        )
+
+        deleted_files_qs.delete()
+
+    deleted_count = 0
+    for sha256sum in orphaned_sha256s:
+        if not re.match(r"^[0-9a-f]{64}$", sha256sum):
+            raise RuntimeError(
+                f"Suspicious S3 deletion of package blob {project_id=} {sha256sum=}"
+            )
+
+        key = get_package_blob_key(project_id, sha256sum)
+        for version in versions_by_key.get(key, []):
+            delete_version_permanently(version)
+
+        deleted_count += 1
+
+    return deleted_count
+
+
 def get_stored_package_ids(project_id: str) -> set[str]:
     bucket = qfieldcloud.core.utils.get_s3_bucket()
     prefix = f"projects/{project_id}/packages/"
@@ -620,6 +1291,60 @@ def delete_stored_package(project_id: str, package_id: str) -> None:
     _delete_by_prefix_permanently(prefix)
 
 
+def delete_obsolete_stored_packages(
+    project_id: str | None = None, batch_size: int = 100
+) -> int:
+    """Deletes the obsolete packages from the storage and marks them as deleted, then deletes their orphaned blobs.
+
+    The obsolete packages are found with a single query on the stored packages table, the storage is not listed.
+
+    Args:
+        project_id (str | None, optional): delete the obsolete packages of the given project only. Defaults to None.
+        batch_size (int, optional): number of packages to be deleted before their state is updated. Defaults to 100.
+
+    Returns:
+        int: number of deleted packages
+    """
+    ProjectPackage = qfieldcloud.core.models.ProjectPackage
+
+    packages_qs = ProjectPackage.objects.obsolete()
+
+    if project_id:
+        packages_qs = packages_qs.filter(project_id=project_id)
+
+    deleted_count = 0
+    while True:
+        packages = list(
+            packages_qs.order_by("created_at").values_list("project_id", "id")[
+                :batch_size
+            ]
+        )
+
+        if not packages:
+            break
+
+        deleted_package_ids = []
+        try:
+            for package_project_id, package_id in packages:
+                delete_stored_package(str(package_project_id), str(package_id))
+                deleted_package_ids.append(package_id)
+        finally:
+            # NOTE mark the already deleted packages even if one of the deletions failed, the rest will be retried on the next run
+            ProjectPackage.objects.filter(pk__in=deleted_package_ids).update(
+                state=ProjectPackage.State.DELETED,
+            )
+
+        deleted_count += len(deleted_package_ids)
+
+        # the blobs might still be referenced by other packages of the same project
+        for package_project_id in {
+            package_project_id for package_project_id, _package_id in packages
+        }:
+            delete_orphaned_package_blobs(str(package_project_id))
+
+    return deleted_count
+
+
 def get_project_file_storage_in_bytes(project_id: str) -> int:
     """Calculates the project files storage in bytes, including their versions.
 
@@ -640,3 +1365,156 @@ def get_project_file_storage_in_bytes(project_id: str) -> int:
         total_bytes += version.size or 0
 
     return total_bytes
+
+
+def upload_job_output(job: qfieldcloud.core.models.Job, output: str) -> str:
+    """Uploads the full job output as a gzipped text object.
+
+    NOTE this function does NOT modify the `Job.output_uri` field
+
+    Args:
+        job (Job): the job the output belongs to
+        output (str): the full job output
+
+    Returns:
+        str: the key of the output object
+    """
+    key = f"projects/{job.project_id}/jobs/{job.id}/output.log.gz"
+
+    bucket = qfieldcloud.core.utils.get_s3_bucket()
+    bucket.upload_fileobj(
+        io.BytesIO(gzip.compress(output.encode())),
+        key,
+        {
+            "ContentType": "application/gzip",
+        },
+    )
+
+    return key
+
+
+def iter_job_output(
+    job: qfieldcloud.core.models.Job, chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
+    """Streams the decompressed full job output from the storage.
+
+    Args:
+        job (Job): the job with the output stored on the storage
+        chunk_size (int, optional): size of the yielded chunks in bytes. Defaults to 64KiB.
+
+    Yields:
+        Iterator[bytes]: decompressed chunks of the job output
+    """
+    key = job.output_uri
+
+    if not key or not re.match(
+        # e.g. "projects/878039c4-b945-4356-a44e-a908fd3f2263/jobs/633cd4f7-db14-4e6e-9b2b-c0ce98f9d338/output.log.gz"
+        r"^projects/[\w]{8}(-[\w]{4}){3}-[\w]{12}/jobs/[\w]{8}(-[\w]{4}){3}-[\w]{12}/output\.log\.gz$",
+        key,
+    ):
+        raise RuntimeError(f"Suspicious S3 job output read {key=}")
+
+    client = qfieldcloud.core.utils.get_s3_client()
+    obj = client.get_object(Bucket=settings.STORAGE_BUCKET_NAME, Key=key)
+
+    with gzip.GzipFile(fileobj=obj["Body"], mode="rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def upload_delta_archive(
+    project: qfieldcloud.core.models.Project,
+    archive_name: str,
+    deltas: list[dict],
+) -> str:
+    """Uploads the given serialized deltas as a gzipped JSONL object.
+
+    NOTE this function does NOT create the `DeltaArchive` record
+
+    Args:
+        project (Project): the project the deltas belong to
+        archive_name (str): name of the archive object, without extension
+        deltas (list[dict]): serialized deltas, one per line
+
+    Returns:
+        str: the key of the archive object
+    """
+    key = f"projects/{project.id}/deltas_archive/{archive_name}.jsonl.gz"
+
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as f:
+        for delta in deltas:
+            f.write(json.dumps(delta, cls=DjangoJSONEncoder).encode())
+            f.write(b"\n")
+
+    buffer.seek(0)
+
+    bucket = qfieldcloud.core.utils.get_s3_bucket()
+    bucket.upload_fileobj(
+        buffer,
+        key,
+        {
+            "ContentType": "application/gzip",
+        },
+    )
+
+    logger.info(f"Archived {len(deltas)} deltas as {key=}")
+
+    return key
+
+
+def iter_archived_deltas(
+    archive: qfieldcloud.core.models.DeltaArchive,
+    deltafile_id: str | None = None,
+) -> Iterator[dict]:
+    """Streams the serialized deltas from a delta archive, without reading the whole object in memory.
+
+    Args:
+        archive (DeltaArchive): the delta archive to read
+        deltafile_id (str | None, optional): only return deltas from this deltafile. Defaults to None.
+
+    Yields:
+        dict: serialized delta as stored in the archive
+    """
+    client = qfieldcloud.core.utils.get_s3_client()
+    obj = client.get_object(Bucket=settings.STORAGE_BUCKET_NAME, Key=archive.key)
+
+    with gzip.GzipFile(fileobj=obj["Body"], mode="rb") as f:
+        for line in f:
+            delta = json.loads(line)
+
+            if deltafile_id is not None and delta["deltafile_id"] != deltafile_id:
+                continue
+
+            # NOTE the first archives also stored the client id, which is not part of the serialized delta
+            delta.pop("client_id", None)
+
+            yield delta
+
+
+def get_archived_deltas(
+    project: qfieldcloud.core.models.Project,
+    deltafile_id: str | None = None,
+) -> list[dict]:
+    """Reads the serialized deltas of a deltafile from the project's delta archives, ordered by creation time.
+
+    Only the archives containing the deltafile are read. Use `iter_archived_deltas` to read all archived deltas of a project.
+
+    Args:
+        project (Project): the project the deltas belong to
+        deltafile_id (str | None, optional): only return deltas from this deltafile. Defaults to None.
+
+    Returns:
+        list[dict]: serialized deltas as stored in the archives
+    """
+    archives = project.delta_archives.order_by("first_delta_created_at")
+
+    if deltafile_id is not None:
+        deltafile_id = str(deltafile_id)
+        archives = archives.filter(deltafile_ids__contains=[deltafile_id])
+
+    deltas = []
+    for archive in archives:
+        deltas.extend(iter_archived_deltas(archive, deltafile_id))
+
+    return deltas
@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEEP_ALIVE_INTERVAL_S = 15
+
+# Number of requests of this process currently waiting for new entries, see `reserve_waiter_slot`
+_waiters_count = 0
+_waiters_lock = threading.Lock()
+
+
+class CacheRingBuffer:
+    """Bounded, append-only sequence of entries stored in the Django cache.
+
+    Every appended entry gets an increasing sequence number. Only the last `size` entries are kept,
+    so readers that are too far behind silently skip the overwritten entries.
+    The cache is shared between the app and the worker wrapper, so entries written by one process are visible to the other.
+    """
+
+    def __init__(self, name: str, size: int, timeout: int) -> None:
+        self.name = name
+        self.size = size
+        self.timeout = timeout
+
+    @property
+    def _seq_key(self) -> str:
+        return f"ringbuffer:{self.name}:seq"
+
+    def _entry_key(self, seq: int) -> str:
+        return f"ringbuffer:{self.name}:{seq % self.size}"
+
+    def append(self, entry: Any) -> int:
+        """Appends an entry to the buffer.
+
+        Args:
+            entry (Any): picklable value to be appended
+
+        Returns:
+            int: the sequence number of the appended entry
+        """
+        cache.add(self._seq_key, 0, self.timeout)
+
+        try:
+            seq = cache.incr(self._seq_key)
+        except ValueError:
+            # the sequence key expired between the `add` and the `incr` calls
+            cache.add(self._seq_key, 0, self.timeout)
+            seq = cache.incr(self._seq_key)
+
+        cache.set(self._entry_key(seq), (seq, entry), self.timeout)
+        cache.touch(self._seq_key, self.timeout)
+
+        return seq
+
+    def get_last_seq(self) -> int:
+        return cache.get(self._seq_key) or 0
+
+    def read(self, after: int = 0) -> tuple[int, list[Any]]:
+        """Reads the entries appended after the given sequence number.
+
+        Args:
+            after (int, optional): sequence number of the last entry already read. Defaults to 0.
+
+        Returns:
+            tuple[int, list[Any]]: the sequence number of the last returned entry and the entries themselves
+        """
+        last_seq = self.get_last_seq()
+        first_seq = max(after + 1, last_seq - self.size + 1, 1)
+
+        if first_seq > last_seq:
+            # if the buffer has expired in the meantime, restart from its current sequence number
+            return min(after, last_seq), []
+
+        keys = [self._entry_key(seq) for seq in range(first_seq, last_seq + 1)]
+        values = cache.get_many(keys)
+
+        cursor = first_seq - 1
+        entries = []
+        for seq, key in zip(range(first_seq, last_seq + 1), keys):
+            value = values.get(key)
+
+            # the entry is not written yet or it has already been overwritten
+            if value is None or value[0] != seq:
+                break
+
+            entries.append(value[1])
+            cursor = seq
+
+        return cursor, entries
+
+
+def get_job_logs_buffer(job_id: str) -> CacheRingBuffer:
+    """Returns the buffer with the live log lines and step transitions of a running job."""
+    return CacheRingBuffer(
+        f"job_logs:{job_id}",
+        size=settings.QFIELDCLOUD_JOB_LOGS_BUFFER_SIZE,
+        timeout=settings.QFIELDCLOUD_JOB_LOGS_BUFFER_TIMEOUT,
+    )
+
+
+def get_project_job_events_buffer(project_id: str) -> CacheRingBuffer:
+    """Returns the buffer with the job status transitions of a project."""
+    return CacheRingBuffer(
+        f"project_job_events:{project_id}",
+        size=settings.QFIELDCLOUD_JOB_EVENTS_BUFFER_SIZE,
+        timeout=settings.QFIELDCLOUD_JOB_EVENTS_BUFFER_TIMEOUT,
+    )
+
+
+def publish_job_status(job) -> int:
+    """Publishes the current status of the job to the job events of its project.
+
+    Args:
+        job (Job): the job which status has changed
+
+    Returns:
+        int: the sequence number of the published event
+    """
+    return get_project_job_events_buffer(job.project_id).append(
+        {
+            "type": "job_status",
+            "job_id": str(job.id),
+            "job_type": job.type,
+            "status": job.status,
+        }
+    )
+
+
+@contextmanager
+def reserve_waiter_slot() -> Iterator[bool]:
+    """Reserves a slot for a request waiting for new entries, at most `QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS` per process.
+
+    A waiting request holds a server thread, without the limit a few polling clients would hold all of them.
+
+    Yields:
+        bool: whether a slot was reserved, if not the request should return without waiting
+    """
+    global _waiters_count
+
+    with _waiters_lock:
+        is_reserved = _waiters_count < settings.QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS
+
+        if is_reserved:
+            _waiters_count += 1
+
+    try:
+        yield is_reserved
+    finally:
+        if is_reserved:
+            with _waiters_lock:
+                _waiters_count -= 1
+
+
+def wait_for_entries(
+    buffer: CacheRingBuffer, after: int, timeout: float, interval: float = 1
+) -> tuple[int, list[Any]]:
+    """Long-polls the buffer until there are new entries or the timeout is reached."""
+    deadline = time.monotonic() + timeout
+
+    while True:
+        cursor, entries = buffer.read(after)
+
+        if entries or time.monotonic() >= deadline:
+            return cursor, entries
+
+        time.sleep(interval)
+
+
+def iter_server_sent_events(
+    buffer: CacheRingBuffer,
+    after: int,
+    timeout: float,
+    is_final_entry=lambda entry: False,
+) -> Iterator[str]:
+    """Yields the buffer entries formatted as Server-Sent Events until the final entry or the timeout is reached.
+
+    Clients are expected to reconnect with the `Last-Event-ID` header, which is the sequence number of the last received entry.
+    If there is no free waiter slot, only the available entries are yielded and the client is asked to reconnect later.
+    """
+    with reserve_waiter_slot() as is_reserved:
+        if not is_reserved:
+            cursor, entries = buffer.read(after)
+
+            for idx, entry in enumerate(entries, start=cursor - len(entries) + 1):
+                yield f"id: {idx}\ndata: {json.dumps(entry, default=str)}\n\n"
+
+            # ask the client to reconnect later, instead of holding the server thread
+            yield f"retry: {settings.QFIELDCLOUD_LIVE_STREAM_RETRY_AFTER * 1000}\n\n"
+            return
+
+        deadline = time.monotonic() + timeout
+        cursor = after
+
+        while time.monotonic() < deadline:
+            cursor, entries = wait_for_entries(
+                buffer,
+                cursor,
+                timeout=min(max(deadline - time.monotonic(), 0), KEEP_ALIVE_INTERVAL_S),
+            )
+
+            for idx, entry in enumerate(entries, start=cursor - len(entries) + 1):
+                yield f"id: {idx}\ndata: {json.dumps(entry, default=str)}\n\n"
+
+                if is_final_entry(entry):
+                    return
+
+            # keep the connection alive and let the proxies know we are still there
+            yield ": keep-alive\n\n"
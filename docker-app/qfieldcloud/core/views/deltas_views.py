@@ -1,9 +1,14 @@
 import json
 import logging
 from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterator
 
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext as _
 from drf_spectacular.utils import (
     OpenApiParameter,
@@ -12,9 +17,9 @@ from drf_spectacular.utils import (
     extend_schema_view,
 )
 from qfieldcloud.core import exceptions, pagination, permissions_utils, utils
-from qfieldcloud.core.models import Delta, Project
+from qfieldcloud.core.models import Delta, DeltaArchive, Project
 from qfieldcloud.core.serializers import DeltaSerializer
-from qfieldcloud.core.utils2 import jobs
+from qfieldcloud.core.utils2 import jobs, storage
 from rest_framework import generics, permissions, views
 from rest_framework.response import Response
 
@@ -36,8 +41,88 @@ class DeltaFilePermissions(permissions.BasePermission):
         return False
 
 
+class ArchivedAndLiveDeltas:
+    """The deltas moved to the delta archives followed by the deltas still stored in the database, as a lazy sequence.
+
+    Slicing reads only the archives overlapping with the slice, so the sequence can be paginated.
+    """
+
+    def __init__(
+        self,
+        archives: list[DeltaArchive],
+        queryset: QuerySet,
+        serialize: Callable[[list[Delta]], list[dict]],
+    ) -> None:
+        self.archives = archives
+        self.archived_count = sum(archive.deltas_count for archive in archives)
+        self.queryset = queryset
+        self.serialize = serialize
+
+    def __len__(self) -> int:
+        return self.archived_count + self.queryset.count()
+
+    def __getitem__(self, key: slice) -> list[dict]:
+        start, stop, _step = key.indices(len(self))
+        deltas = []
+
+        archive_start = 0
+        for archive in self.archives:
+            archive_stop = archive_start + archive.deltas_count
+
+            if archive_start < stop and start < archive_stop:
+                deltas.extend(
+                    islice(
+                        storage.iter_archived_deltas(archive),
+                        max(start - archive_start, 0),
+                        min(stop, archive_stop) - archive_start,
+                    )
+                )
+
+            archive_start = archive_stop
+
+        live_start = max(start - self.archived_count, 0)
+        live_stop = stop - self.archived_count
+
+        if live_stop > live_start:
+            deltas.extend(self.serialize(self.queryset[live_start:live_stop]))
+
+        return deltas
+
+    def __iter__(self) -> Iterator[dict]:
+        for archive in self.archives:
+            yield from storage.iter_archived_deltas(archive)
+
+        live_deltas = self.queryset.iterator()
+        while batch := list(islice(live_deltas, 1000)):
+            yield from self.serialize(batch)
+
+
+def stream_json_list(items: Iterator[dict]) -> Iterator[str]:
+    """Streams the items as a JSON list, one item at a time."""
+    yield "["
+
+    for idx, item in enumerate(items):
+        if idx > 0:
+            yield ","
+
+        yield json.dumps(item, cls=DjangoJSONEncoder)
+
+    yield "]"
+
+
 @extend_schema_view(
-    get=extend_schema(description="Get all deltas of the given project."),
+    get=extend_schema(
+        description="Get all deltas of the given project.",
+        parameters=[
+            OpenApiParameter(
+                name="include_archived",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Also list the deltas moved to the delta archives.",
+            ),
+        ],
+    ),
     post=extend_schema(
         description="Add a deltafile to the given project",
         parameters=[
@@ -163,6 +248,31 @@ class ListCreateDeltasView(generics.ListCreateAPIView):
         project_obj = Project.objects.get(id=project_id)
         return Delta.objects.filter(project=project_obj)
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("include_archived", "").lower() not in (
+            "1",
+            "true",
+        ):
+            return super().list(request, *args, **kwargs)
+
+        project_obj = Project.objects.get(id=self.kwargs["projectid"])
+        deltas = ArchivedAndLiveDeltas(
+            list(project_obj.delta_archives.order_by("first_delta_created_at")),
+            self.filter_queryset(self.get_queryset())
+            .select_related("created_by")
+            .order_by("created_at"),
+            lambda queryset: self.get_serializer(queryset, many=True).data,
+        )
+
+        page = self.paginate_queryset(deltas)
+        if page is not None:
+            return self.get_paginated_response(page)
+
+        # without pagination the archives are streamed, so they are never held in memory at once
+        return StreamingHttpResponse(
+            stream_json_list(iter(deltas)), content_type="application/json"
+        )
+
 
 @extend_schema_view(
     get=extend_schema(description="List deltas of the given deltafile.")
@@ -178,6 +288,30 @@ class ListDeltasByDeltafileView(generics.ListAPIView):
         deltafile_id = self.request.parser_context["kwargs"]["deltafileid"]
         return Delta.objects.filter(project=project_obj, deltafile_id=deltafile_id)
 
+    def list(self, request, *args, **kwargs):
+        project_obj = Project.objects.get(id=self.kwargs["projectid"])
+        deltafile_id = str(self.kwargs["deltafileid"])
+
+        # deltafiles are listed by clients to check the status of their deltas,
+        # so the archived ones are always included
+        if not project_obj.delta_archives.filter(
+            deltafile_ids__contains=[deltafile_id]
+        ).exists():
+            return super().list(request, *args, **kwargs)
+
+        # NOTE only the deltas of this deltafile are kept while streaming the archives containing it
+        queryset = self.filter_queryset(self.get_queryset()).order_by("created_at")
+        deltas = [
+            *storage.get_archived_deltas(project_obj, deltafile_id),
+            *self.get_serializer(queryset, many=True).data,
+        ]
+
+        page = self.paginate_queryset(deltas)
+        if page is not None:
+            return self.get_paginated_response(page)
+
+        return Response(deltas)
+
 
 @extend_schema(
     deprecated=True,
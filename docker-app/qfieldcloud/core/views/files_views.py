@@ -7,7 +7,6 @@ from traceback import print_stack
 import qfieldcloud.core.utils2 as utils2
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
-from django.utils import timezone
 from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
@@ -15,14 +14,13 @@ from drf_spectacular.utils import (
     extend_schema_view,
 )
 from qfieldcloud.core import exceptions, permissions_utils, utils
-from qfieldcloud.core.models import Job, ProcessProjectfileJob, Project
-from qfieldcloud.core.serializers import FileSerializer
+from qfieldcloud.core.models import FileUploadSession, Project
+from qfieldcloud.core.serializers import FileSerializer, FileUploadSessionSerializer
 from qfieldcloud.core.utils import S3ObjectVersion, get_project_file_with_versions
-from qfieldcloud.core.utils2.audit import LogEntry, audit
 from qfieldcloud.core.utils2.sentry import report_serialization_diff_to_sentry
 from qfieldcloud.core.utils2.storage import (
     get_attachment_dir_prefix,
-    purge_old_file_versions,
+    update_project_after_file_upload,
 )
 from rest_framework import permissions, serializers, status, views
 from rest_framework.exceptions import NotFound
@@ -158,6 +156,35 @@ class DownloadPushDeleteFileViewPermissions(permissions.BasePermission):
         return False
 
 
+def check_can_upload_project_file(
+    request: Request, project: Project, filename: str, file_size_bytes: int
+) -> None:
+    """Checks whether the file can be uploaded to the project, raises otherwise."""
+    is_qgis_project_file = utils.is_qgis_project_file(filename)
+
+    # check if the project restricts qgs/qgz file modification to admins
+    if is_qgis_project_file and not permissions_utils.can_modify_qgis_projectfile(
+        request.user, project
+    ):
+        raise exceptions.RestrictedProjectModificationError(
+            "The project restricts modification of the QGIS project file to managers and administrators."
+        )
+
+    # check only one qgs/qgz file per project
+    if (
+        is_qgis_project_file
+        and project.project_filename is not None
+        and PurePath(filename) != PurePath(project.project_filename)
+    ):
+        raise exceptions.MultipleProjectsError(
+            "Only one QGIS project per project allowed"
+        )
+
+    permissions_utils.check_can_upload_file(
+        project, request.auth.client_type, file_size_bytes
+    )
+
+
 class QfcMultiPartSerializer(MultiPartParser):
     errors: list[str] = []
 
@@ -220,7 +247,6 @@ class DownloadPushDeleteFileView(views.APIView):
             as_attachment=True,
         )
 
-    # TODO refactor this function by moving the actual upload and Project model updates to library function outside the view
     def post(self, request, projectid, filename, format=None):
         if len(request.FILES.getlist("file")) > 1:
             raise exceptions.MultipleContentsError()
@@ -265,31 +291,10 @@ class DownloadPushDeleteFileView(views.APIView):
             project = request.project
         else:
             project = Project.objects.get(id=projectid)
-        is_qgis_project_file = utils.is_qgis_project_file(filename)
-
-        # check if the project restricts qgs/qgz file modification to admins
-        if is_qgis_project_file and not permissions_utils.can_modify_qgis_projectfile(
-            request.user, project
-        ):
-            raise exceptions.RestrictedProjectModificationError(
-                "The project restricts modification of the QGIS project file to managers and administrators."
-            )
-
-        # check only one qgs/qgz file per project
-        if (
-            is_qgis_project_file
-            and project.project_filename is not None
-            and PurePath(filename) != PurePath(project.project_filename)
-        ):
-            raise exceptions.MultipleProjectsError(
-                "Only one QGIS project per project allowed"
-            )
 
         request_file = request.FILES.get("file")
 
-        permissions_utils.check_can_upload_file(
-            project, request.auth.client_type, request_file.size
-        )
+        check_can_upload_project_file(request, project, filename, request_file.size)
 
         old_object = get_project_file_with_versions(project.id, filename)
         sha256sum = utils.get_sha256(request_file)
@@ -300,60 +305,9 @@ class DownloadPushDeleteFileView(views.APIView):
 
         bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
 
-        new_object = get_project_file_with_versions(project.id, filename)
-
-        assert new_object
-
-        with transaction.atomic():
-            # we only enter a transaction after the file is uploaded above because we do not
-            # want to lock the project row for way too long. If we reselect for update the
-            # project and update it now, it guarantees there will be no other file upload editing
-            # the same project row.
-            project = Project.objects.select_for_update().get(id=projectid)
-            update_fields = ["data_last_updated_at", "file_storage_bytes"]
-
-            if get_attachment_dir_prefix(project, filename) == "" and (
-                is_qgis_project_file or project.project_filename is not None
-            ):
-                if is_qgis_project_file:
-                    project.project_filename = filename
-                    update_fields.append("project_filename")
-
-                running_jobs = ProcessProjectfileJob.objects.filter(
-                    project=project,
-                    created_by=self.request.user,
-                    status__in=[
-                        Job.Status.PENDING,
-                        Job.Status.QUEUED,
-                        Job.Status.STARTED,
-                    ],
-                )
-
-                if not running_jobs.exists():
-                    ProcessProjectfileJob.objects.create(
-                        project=project, created_by=self.request.user
-                    )
-
-            project.data_last_updated_at = timezone.now()
-            # NOTE just incrementing the fils_storage_bytes when uploading might make the database out of sync if a files is uploaded/deleted bypassing this function
-            project.file_storage_bytes += request_file.size
-            project.save(update_fields=update_fields)
-
-        if old_object:
-            audit(
-                project,
-                LogEntry.Action.UPDATE,
-                changes={filename: [old_object.latest.e_tag, new_object.latest.e_tag]},
-            )
-        else:
-            audit(
-                project,
-                LogEntry.Action.CREATE,
-                changes={filename: [None, new_object.latest.e_tag]},
-            )
-
-        # Delete the old file versions
-        purge_old_file_versions(project)
+        update_project_after_file_upload(
+            project.id, filename, request_file.size, old_object, request.user
+        )
 
         return Response(status=status.HTTP_201_CREATED)
 
@@ -416,3 +370,146 @@ class AdminDownloadPushDeleteFileView(DownloadPushDeleteFileView):
 @extend_schema(exclude=True)
 class AdminListFilesViews(ListFilesView):
     """Allowing `ListFilesView` to be excluded from the OpenAPI schema documentation"""
+
+
+class FileUploadSessionViewPermissions(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if "projectid" not in request.parser_context["kwargs"]:
+            return False
+
+        projectid = request.parser_context["kwargs"]["projectid"]
+        project = Project.objects.get(id=projectid)
+
+        return permissions_utils.can_create_files(request.user, project)
+
+
+def get_file_upload_session(request, projectid, session_id) -> FileUploadSession:
+    try:
+        return FileUploadSession.objects.select_related("project").get(
+            id=session_id,
+            project_id=projectid,
+            created_by=request.user,
+        )
+    except FileUploadSession.DoesNotExist:
+        raise NotFound(detail=str(session_id))
+
+
+@extend_schema_view(
+    post=extend_schema(
+        description="Start a resumable upload of a project file. The file is then uploaded in chunks of `chunk_size_bytes` bytes.",
+        request=FileUploadSessionSerializer,
+        responses={201: FileUploadSessionSerializer},
+    ),
+)
+class CreateFileUploadSessionView(views.APIView):
+    permission_classes = [
+        permissions.IsAuthenticated,
+        FileUploadSessionViewPermissions,
+    ]
+
+    def post(self, request, projectid):
+        serializer = FileUploadSessionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        project = Project.objects.get(id=projectid)
+        filename = serializer.validated_data["filename"]
+        size_bytes = serializer.validated_data["size_bytes"]
+
+        # NOTE the quota is checked once for the whole file, before any chunk is uploaded
+        check_can_upload_project_file(request, project, filename, size_bytes)
+
+        session = utils2.storage.create_file_upload_session(
+            project,
+            filename,
+            size_bytes,
+            request.user,
+            serializer.validated_data["sha256"],
+        )
+
+        return Response(
+            FileUploadSessionSerializer(session).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
+@extend_schema_view(
+    get=extend_schema(
+        description="Get the status of a resumable upload, including the offsets of the chunks already uploaded.",
+        responses={200: FileUploadSessionSerializer},
+    ),
+    put=extend_schema(
+        description="Upload the chunk starting at `offset`. The request body is the raw chunk contents. Uploading a chunk again overwrites it.",
+        parameters=[
+            OpenApiParameter(
+                name="offset",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                required=True,
+                description="Offset of the chunk in the file, a multiple of `chunk_size_bytes`.",
+            )
+        ],
+        request=OpenApiTypes.BINARY,
+        responses={204: None},
+    ),
+    delete=extend_schema(
+        description="Abort a resumable upload and delete the chunks already uploaded."
+    ),
+)
+class FileUploadSessionView(views.APIView):
+    permission_classes = [
+        permissions.IsAuthenticated,
+        FileUploadSessionViewPermissions,
+    ]
+
+    def get(self, request, projectid, session_id):
+        session = get_file_upload_session(request, projectid, session_id)
+        parts = utils2.storage.get_file_upload_session_parts(session)
+
+        return Response(
+            FileUploadSessionSerializer(session, context={"parts": parts}).data
+        )
+
+    def put(self, request, projectid, session_id):
+        session = get_file_upload_session(request, projectid, session_id)
+
+        try:
+            offset = int(request.query_params["offset"])
+        except (KeyError, ValueError):
+            raise exceptions.ValidationError(
+                "The `offset` query parameter is required and must be an integer."
+            )
+
+        # NOTE the chunk is read from the request stream, so it does not count towards `DATA_UPLOAD_MAX_MEMORY_SIZE`
+        content = request.stream.read() if request.stream else b""
+
+        utils2.storage.upload_file_upload_session_chunk(session, offset, content)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def delete(self, request, projectid, session_id):
+        session = get_file_upload_session(request, projectid, session_id)
+
+        utils2.storage.abort_file_upload_session(session)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@extend_schema_view(
+    post=extend_schema(
+        description="Finalize a resumable upload once all the chunks are uploaded. The file then replaces the project file like a regular upload.",
+        request=None,
+        responses={201: None},
+    ),
+)
+class FinalizeFileUploadSessionView(views.APIView):
+    permission_classes = [
+        permissions.IsAuthenticated,
+        FileUploadSessionViewPermissions,
+    ]
+
+    def post(self, request, projectid, session_id):
+        session = get_file_upload_session(request, projectid, session_id)
+
+        utils2.storage.complete_file_upload_session(session)
+
+        return Response(status=status.HTTP_201_CREATED)
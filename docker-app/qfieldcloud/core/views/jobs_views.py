@@ -1,13 +1,19 @@
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
     extend_schema,
     extend_schema_view,
 )
-from qfieldcloud.core import pagination, permissions_utils, serializers
+from qfieldcloud.core import exceptions, pagination, permissions_utils, serializers
 from qfieldcloud.core.models import Job, Project
-from rest_framework import generics, permissions, viewsets
+from qfieldcloud.core.renderers import EventStreamRenderer
+from qfieldcloud.core.utils2 import jobs, storage, streams
+from rest_framework import generics, permissions, renderers, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.status import HTTP_201_CREATED
 
@@ -99,12 +105,211 @@ class JobViewSet(viewsets.ReadOnlyModelViewSet):
 
         return Response(serializer.data, status=HTTP_201_CREATED)
 
-    def get_queryset(self):
-        qs = Job.objects.select_subclasses()
+    def retrieve(self, request, *args, **kwargs):
+        # cheap short-circuit for clients polling for the job status
+        etag = jobs.get_job_etag(kwargs[self.lookup_url_kwarg])
+        if etag:
+            not_modified_response = get_conditional_response(request, etag=etag)
+            if not_modified_response is not None:
+                return not_modified_response
+
+        response = super().retrieve(request, *args, **kwargs)
+
+        if etag:
+            response["ETag"] = etag
+
+        return response
 
+    def get_queryset(self):
         if self.action == "list":
             project_id = self.request.data.get("project_id")
             project = generics.get_object_or_404(Project, pk=project_id)
-            qs = qs.filter(project=project)
 
-        return qs
+            # the list serializes neither the large `output` nor `feedback`, see `JobSerializer.get_fields`
+            return Job.objects.defer("output", "feedback").filter(project=project)
+
+        return Job.objects.select_subclasses()
+
+    @extend_schema(
+        description="Stream the full output of the job as plain text.",
+        responses={200: OpenApiTypes.STR},
+    )
+    @action(detail=True, methods=["get"])
+    def output(self, request, job_id=None):
+        job = generics.get_object_or_404(
+            Job.objects.select_related("project").only(
+                "id", "output", "output_uri", "project"
+            ),
+            pk=job_id,
+        )
+
+        if not permissions_utils.can_read_jobs(request.user, job.project):
+            raise exceptions.PermissionDeniedError()
+
+        if job.is_output_truncated:
+            content = storage.iter_job_output(job)
+        else:
+            content = [job.output or ""]
+
+        return StreamingHttpResponse(content, content_type="text/plain")
+
+    @extend_schema(
+        description="Get the live log lines and workflow step transitions of a job while it runs. "
+        "Waits for new entries and returns them as JSON, or streams them as Server-Sent Events when requested with `Accept: text/event-stream`. "
+        "When too many requests are already waiting, returns the available entries at once and asks to retry later, with a `Retry-After` header or the `retry` field of the events.",
+        parameters=[
+            OpenApiParameter(
+                name="after",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                default=0,
+                description="Return only the entries after this cursor. Ignored if the `Last-Event-ID` header is present.",
+            ),
+        ],
+    )
+    @action(
+        detail=True,
+        methods=["get"],
+        renderer_classes=[renderers.JSONRenderer, EventStreamRenderer],
+    )
+    def logs(self, request, job_id=None):
+        job = generics.get_object_or_404(
+            Job.objects.select_related("project").only("id", "status", "project"),
+            pk=job_id,
+        )
+
+        if not permissions_utils.can_read_jobs(request.user, job.project):
+            raise exceptions.PermissionDeniedError()
+
+        try:
+            after = int(
+                request.headers.get("Last-Event-ID")
+                or request.query_params.get("after")
+                or 0
+            )
+        except ValueError:
+            raise exceptions.ValidationError("The `after` cursor must be an integer.")
+
+        buffer = streams.get_job_logs_buffer(job.id)
+
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            response = StreamingHttpResponse(
+                streams.iter_server_sent_events(
+                    buffer,
+                    after,
+                    timeout=settings.QFIELDCLOUD_LIVE_STREAM_TIMEOUT,
+                    is_final_entry=lambda entry: entry["type"] == "end",
+                ),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            # disable the nginx response buffering, otherwise the events are delivered at once
+            response["X-Accel-Buffering"] = "no"
+
+            return response
+
+        # no need to wait for new entries if the job has already ended
+        if job.status in (Job.Status.FINISHED, Job.Status.FAILED, Job.Status.STOPPED):
+            timeout = 0
+        else:
+            timeout = settings.QFIELDCLOUD_LIVE_STREAM_TIMEOUT
+
+        with streams.reserve_waiter_slot() as is_reserved:
+            cursor, entries = streams.wait_for_entries(
+                buffer, after, timeout if is_reserved else 0
+            )
+
+        response = Response(
+            {
+                "cursor": cursor,
+                "status": job.status,
+                "entries": entries,
+            }
+        )
+
+        if not is_reserved and timeout:
+            response["Retry-After"] = settings.QFIELDCLOUD_LIVE_STREAM_RETRY_AFTER
+
+        return response
+
+    @extend_schema(
+        description="Get the job status transitions of a project as they happen. "
+        "Waits for new events and returns them as JSON, or streams them as Server-Sent Events when requested with `Accept: text/event-stream`. "
+        "When too many requests are already waiting, returns the available events at once and asks to retry later, with a `Retry-After` header or the `retry` field of the events.",
+        parameters=[
+            OpenApiParameter(
+                name="project_id",
+                type=OpenApiTypes.UUID,
+                location=OpenApiParameter.QUERY,
+                required=True,
+                description="The project the jobs belong to.",
+            ),
+            OpenApiParameter(
+                name="after",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                default=0,
+                description="Return only the events after this cursor. Ignored if the `Last-Event-ID` header is present.",
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[renderers.JSONRenderer, EventStreamRenderer],
+    )
+    def events(self, request):
+        project = generics.get_object_or_404(
+            Project.objects.only("id", "owner", "is_public"),
+            pk=request.query_params.get("project_id"),
+        )
+
+        if not permissions_utils.can_read_jobs(request.user, project):
+            raise exceptions.PermissionDeniedError()
+
+        try:
+            after = int(
+                request.headers.get("Last-Event-ID")
+                or request.query_params.get("after")
+                or 0
+            )
+        except ValueError:
+            raise exceptions.ValidationError("The `after` cursor must be an integer.")
+
+        buffer = streams.get_project_job_events_buffer(project.id)
+
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            response = StreamingHttpResponse(
+                streams.iter_server_sent_events(
+                    buffer,
+                    after,
+                    timeout=settings.QFIELDCLOUD_LIVE_STREAM_TIMEOUT,
+                ),
+                content_type="text/event-stream",
+            )
+            response["Cache-Control"] = "no-cache"
+            # disable the nginx response buffering, otherwise the events are delivered at once
+            response["X-Accel-Buffering"] = "no"
+
+            return response
+
+        with streams.reserve_waiter_slot() as is_reserved:
+            cursor, entries = streams.wait_for_entries(
+                buffer,
+                after,
+                settings.QFIELDCLOUD_LIVE_STREAM_TIMEOUT if is_reserved else 0,
+            )
+
+        response = Response(
+            {
+                "cursor": cursor,
+                "entries": entries,
+            }
+        )
+
+        if not is_reserved:
+            response["Retry-After"] = settings.QFIELDCLOUD_LIVE_STREAM_RETRY_AFTER
+
+        return response
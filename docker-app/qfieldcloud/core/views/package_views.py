@@ -1,4 +1,7 @@
+from pathlib import PurePath
+
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F
 from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
@@ -9,12 +12,11 @@ from qfieldcloud.authentication.models import AuthToken
 from qfieldcloud.core import exceptions
 from qfieldcloud.core import permissions_utils as perms
 from qfieldcloud.core import utils
-from qfieldcloud.core.models import PackageJob, Project
+from qfieldcloud.core.models import PackageJob, Project, ProjectPackage
 from qfieldcloud.core.serializers import LatestPackageSerializer
 from qfieldcloud.core.utils import (
     check_s3_key,
     get_project_files,
-    get_project_package_files,
 )
 from qfieldcloud.core.utils2 import storage
 from rest_framework import permissions, views
@@ -46,13 +48,11 @@ class PackageUploadViewPermissions(permissions.BasePermission):
 
             # Check if the package job exists and it is already started, but not finished yet.
             # This is extra check that the request is coming from a currently active job.
-            PackageJob.objects.get(
+            return PackageJob.objects.filter(
                 id=job_id,
                 status=PackageJob.Status.STARTED,
                 project=project,
-            )
-
-            return True
+            ).exists()
         except ObjectDoesNotExist:
             return False
 
@@ -87,7 +87,9 @@ class LatestPackageView(views.APIView):
         else:
             skip_metadata = bool(skip_metadata_param)
 
-        for f in get_project_package_files(project_id, project.last_package_job_id):
+        for f in storage.get_stored_package_files(
+            project_id, project.last_package_job_id
+        ):
             file_data = {
                 "name": f.name,
                 "size": f.size,
@@ -97,7 +99,7 @@ class LatestPackageView(views.APIView):
             }
 
             if not skip_metadata:
-                file_data["sha256"] = check_s3_key(f.key)
+                file_data["sha256"] = f.sha256sum or check_s3_key(f.key)
 
             filenames.add(f.name)
             files.append(file_data)
@@ -174,7 +176,9 @@ class LatestPackageDownloadFilesView(views.APIView):
                 "Packaging has never been triggered or successful for this project."
             )
 
-        key = f"projects/{project_id}/packages/{project.last_package_job_id}/{filename}"
+        key = storage.get_package_file_key(
+            project_id, project.last_package_job_id, filename
+        )
 
         # files within attachment dirs that do not exist is the packaged files should be served
         # directly from the original data storage
@@ -184,7 +188,13 @@ class LatestPackageDownloadFilesView(views.APIView):
             key = f"projects/{project_id}/files/{filename}"
 
         # NOTE the `expires` kwarg is sending the `Expires` header to the client, keep it a low value (in seconds).
-        return storage.file_response(request, key, expires=10, as_attachment=True)
+        return storage.file_response(
+            request,
+            key,
+            expires=10,
+            as_attachment=True,
+            filename=PurePath(filename).name,
+        )
 
 
 @extend_schema_view(
@@ -205,16 +215,52 @@ class PackageUploadFilesView(views.APIView):
     permission_classes = [permissions.IsAuthenticated, PackageUploadViewPermissions]
 
     def post(self, request, project_id, job_id, filename):
-        """Upload the package files."""
-        key = utils.safe_join(f"projects/{project_id}/packages/{job_id}/", filename)
+        """Upload the package files.
+
+        The files are stored once by their sha256, if the same contents are already stored they are not uploaded again.
+        """
+        # NOTE raises if the filename escapes the package directory
+        utils.safe_join(f"projects/{project_id}/packages/{job_id}/", filename)
 
         request_file = request.FILES.get("file")
         sha256sum = utils.get_sha256(request_file)
         md5sum = utils.get_md5sum(request_file)
         metadata = {"Sha256sum": sha256sum}
 
+        # register the package before uploading, so even partially uploaded packages are deleted once obsolete
+        ProjectPackage.objects.get_or_create(
+            id=job_id,
+            defaults={
+                "project_id": project_id,
+            },
+        )
+
+        key = storage.get_package_blob_key(project_id, sha256sum)
         bucket = utils.get_s3_bucket()
-        bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
+
+        # NOTE upload the blob before adding the file to the manifest, so the manifest never references a missing blob
+        is_uploaded = False
+        if check_s3_key(key) is None:
+            bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
+            is_uploaded = True
+
+        is_referenced = storage.register_package_file(
+            project_id,
+            job_id,
+            filename,
+            sha256sum,
+            md5sum,
+            request_file.size,
+        )
+
+        if not is_uploaded and not is_referenced:
+            # the stored blob might have been orphaned meanwhile, the newly uploaded version is not deleted
+            request_file.seek(0)
+            bucket.upload_fileobj(request_file, key, ExtraArgs={"Metadata": metadata})
+
+        ProjectPackage.objects.filter(pk=job_id).update(
+            size_bytes=F("size_bytes") + request_file.size,
+        )
 
         return Response(
             {
@@ -1,12 +1,12 @@
-from pathlib import PurePath
-
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
 from django.http.response import HttpResponseRedirect
+from django.utils.cache import get_conditional_response
 from drf_spectacular.utils import extend_schema, extend_schema_view
 from qfieldcloud.core import exceptions, permissions_utils, serializers, utils
 from qfieldcloud.core.models import PackageJob, Project
 from qfieldcloud.core.permissions_utils import check_supported_regarding_owner_account
+from qfieldcloud.core.utils2 import jobs, storage
 from rest_framework import permissions, views
 from rest_framework.response import Response
 
@@ -78,12 +78,29 @@ class PackageView(views.APIView):
     def get(self, request, projectid):
         project_obj = Project.objects.get(id=projectid)
 
-        export_job = (
-            PackageJob.objects.filter(project=project_obj).order_by("updated_at").last()
+        export_job_id = (
+            PackageJob.objects.filter(project=project_obj)
+            .order_by("updated_at")
+            .values_list("id", flat=True)
+            .last()
         )
 
+        # cheap short-circuit for clients polling for the packaging status
+        etag = jobs.get_job_etag(export_job_id) if export_job_id else None
+        if etag:
+            not_modified_response = get_conditional_response(request, etag=etag)
+            if not_modified_response is not None:
+                return not_modified_response
+
+        export_job = PackageJob.objects.filter(pk=export_job_id).first()
+
         serializer = serializers.ExportJobSerializer(export_job)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+
+        if etag:
+            response["ETag"] = etag
+
+        return response
 
 
 @extend_schema(
@@ -110,29 +127,13 @@ class ListFilesView(views.APIView):
         package_job = project_obj.last_package_job
         assert package_job
 
-        # Obtain the bucket object
-        bucket = utils.get_s3_bucket()
-
-        export_prefix = f"projects/{projectid}/packages/{package_job.id}/"
-
         files = []
-        for obj in bucket.objects.filter(Prefix=export_prefix):
-            path = PurePath(obj.key)
-
-            # We cannot be sure of the metadata's first letter case
-            # https://github.com/boto/boto3/issues/1709
-            metadata = obj.Object().metadata
-            if "sha256sum" in metadata:
-                sha256sum = metadata["sha256sum"]
-            else:
-                sha256sum = metadata["Sha256sum"]
-
+        for f in storage.get_stored_package_files(projectid, package_job.id):
             files.append(
                 {
-                    # Get the path of the file relative to the export directory
-                    "name": str(path.relative_to(*path.parts[:4])),
-                    "size": obj.size,
-                    "sha256": sha256sum,
+                    "name": f.name,
+                    "size": f.size,
+                    "sha256": f.sha256sum or utils.check_s3_key(f.key),
                 }
             )
 
@@ -180,9 +181,7 @@ class DownloadFileView(views.APIView):
                 "Project files have not been exported for the provided project id"
             )
 
-        filekey = utils.safe_join(
-            f"projects/{projectid}/packages/{package_job.id}/", filename
-        )
+        filekey = storage.get_package_file_key(projectid, package_job.id, filename)
 
         url = utils.get_s3_client().generate_presigned_url(
             "get_object",
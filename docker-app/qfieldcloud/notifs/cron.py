@@ -1,7 +1,8 @@
 import logging
+from itertools import groupby
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.db.models import Exists
 from django.db.models.expressions import OuterRef
 from django.db.models.functions import Now
@@ -10,69 +11,108 @@ from django_cron import CronJobBase, Schedule
 from notifications.models import Notification
 from qfieldcloud.core.models import User
 
+from . import outbox
+
+
+class ProcessNotificationOutboxJob(CronJobBase):
+    schedule = Schedule(run_every_mins=1)
+    code = "qfieldcloud.process_notification_outbox"
+
+    def do(self):
+        try:
+            outbox.process_events()
+        except Exception as e:
+            logging.exception(e)
+            raise e
+
 
 class SendNotificationsJob(CronJobBase):
     schedule = Schedule(run_every_mins=1)
     code = "qfieldcloud.send_notifications"
 
+    # number of users which notifications are fetched, rendered and sent at once
+    batch_size = 100
+
     # TODO : not sure if/how this is logged somewhere
     def do(self):
         try:
-            users = User.objects.filter(type=User.Type.PERSON).filter(
-                Exists(
-                    Notification.objects.filter(
-                        unread=True,
-                        emailed=False,
-                        timestamp__lte=Now()
-                        - OuterRef("useraccount__notifs_frequency"),
+            user_ids = list(
+                User.objects.filter(type=User.Type.PERSON)
+                .filter(
+                    Exists(
+                        Notification.objects.filter(
+                            recipient=OuterRef("pk"),
+                            unread=True,
+                            emailed=False,
+                            timestamp__lte=Now()
+                            - OuterRef("useraccount__notifs_frequency"),
+                        )
                     )
                 )
+                .order_by("pk")
+                .values_list("pk", flat=True)
             )
-            for user in users:
-                logging.debug(f"Retrieving notifications for {user}")
 
-                notifs = Notification.objects.filter(
-                    recipient=user, unread=True, emailed=False
-                )
-                if not notifs:
-                    logging.debug(f"{user} has no notifications.")
-                    continue
+            if not user_ids:
+                return
 
-                if not user.email:
-                    logging.warning(f"{user} has notifications, but no email set !")
-                    continue
+            # all the emails are sent over a single connection, instead of a new one per email
+            with get_connection() as connection:
+                for idx in range(0, len(user_ids), self.batch_size):
+                    self.send_emails(connection, user_ids[idx : idx + self.batch_size])
 
-                QFIELDCLOUD_HOST = settings.QFIELDCLOUD_HOST
+        except Exception as e:
+            logging.exception(e)
+            raise e
 
-                logging.debug(f"Sending an email to {user} !")
+    def send_emails(self, connection, user_ids: list[int]) -> None:
+        notifs = (
+            Notification.objects.filter(
+                recipient_id__in=user_ids,
+                unread=True,
+                emailed=False,
+            )
+            .select_related("recipient")
+            .prefetch_related("actor", "action_object", "target")
+            .order_by("recipient_id", "-timestamp")
+        )
 
-                context = {
-                    "notifs": notifs,
-                    "username": user.username,
-                    "hostname": QFIELDCLOUD_HOST,
-                }
+        messages = []
+        emailed_notif_ids = []
+        for _user_id, user_notifs_iter in groupby(notifs, lambda n: n.recipient_id):
+            user_notifs = list(user_notifs_iter)
+            user = user_notifs[0].recipient
 
-                subject = render_to_string(
-                    "notifs/notification_email_subject.txt", context
-                )
-                body_html = render_to_string(
-                    "notifs/notification_email_body.html", context
-                )
-                body_plain = render_to_string(
-                    "notifs/notification_email_body.txt", context
-                )
+            if not user.email:
+                logging.warning(f"{user} has notifications, but no email set !")
+                continue
 
-                # TODO : use mass_send_mail
-                send_mail(
-                    subject.strip(),
-                    body_plain,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    html_message=body_html,
-                )
+            logging.debug(f"Sending an email to {user} !")
 
-                notifs.update(emailed=True)
+            context = {
+                "notifs": user_notifs,
+                "username": user.username,
+                "hostname": settings.QFIELDCLOUD_HOST,
+            }
 
-        except Exception as e:
-            logging.exception(e)
-            raise e
+            subject = render_to_string("notifs/notification_email_subject.txt", context)
+            body_html = render_to_string("notifs/notification_email_body.html", context)
+            body_plain = render_to_string("notifs/notification_email_body.txt", context)
+
+            message = EmailMultiAlternatives(
+                subject.strip(),
+                body_plain,
+                settings.DEFAULT_FROM_EMAIL,
+                [user.email],
+            )
+            message.attach_alternative(body_html, "text/html")
+
+            messages.append(message)
+            emailed_notif_ids += [n.pk for n in user_notifs]
+
+        if not messages:
+            return
+
+        connection.send_messages(messages)
+
+        Notification.objects.filter(pk__in=emailed_notif_ids).update(emailed=True)
@@ -0,0 +1,51 @@
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+
+class NotificationOutboxEvent(models.Model):
+    """An activity written within the transaction of the change, to be turned into notifications in the background.
+
+    Resolving the recipients and inserting a notification per recipient might be slow for large organizations and projects,
+    so it is done by the `ProcessNotificationOutboxJob` instead of the request that made the change.
+    """
+
+    class Audience(models.TextChoices):
+        ENTITY = "entity", _("Entity")
+        PROJECT = "project", _("Project")
+
+    actor_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    actor_object_id = models.CharField(max_length=255)
+    actor = GenericForeignKey("actor_content_type", "actor_object_id")
+
+    verb = models.CharField(max_length=255)
+
+    action_object_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+"
+    )
+    action_object_object_id = models.CharField(max_length=255)
+    action_object = GenericForeignKey(
+        "action_object_content_type", "action_object_object_id"
+    )
+
+    target_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, related_name="+", null=True, blank=True
+    )
+    target_object_id = models.CharField(max_length=255, null=True, blank=True)
+    target = GenericForeignKey("target_content_type", "target_object_id")
+
+    # the users concerned by the entity or the project with the given id are notified
+    audience = models.CharField(max_length=32, choices=Audience.choices)
+    audience_object_id = models.CharField(max_length=255)
+
+    # the recipients resolved when the event was created, as the audience is about to be deleted
+    recipient_ids = models.JSONField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.verb} {self.action_object_content_type}:{self.action_object_object_id} ({self.audience}:{self.audience_object_id})"
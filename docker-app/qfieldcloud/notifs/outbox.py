@@ -0,0 +1,235 @@
+import logging
+from datetime import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from notifications.models import Notification
+
+from ..core.models import (
+    OrganizationMember,
+    OrganizationQueryset,
+    Person,
+    Project,
+    ProjectCollaborator,
+    ProjectQueryset,
+    TeamMember,
+    User,
+)
+from .models import NotificationOutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def _concerned_users_in_entity(entity: User):
+    """Returns a list of users (of User.Type.PERSON) concerned by updates to an user (any type)"""
+
+    return Person.objects.for_entity(entity)  # type: ignore
+
+
+def _concerned_users_in_project(project: Project):
+    """Returns a list of users concerned by updates to a project"""
+
+    return Person.objects.for_project(project).exclude(  # type: ignore
+        project_role_origin=ProjectQueryset.RoleOrigins.PUBLIC
+    )
+
+
+def _created_before_q(created_before: datetime) -> Q:
+    return Q(created_at__lte=created_before) | Q(created_at__isnull=True)
+
+
+def _concerned_before_q(audience: User | Project, created_before: datetime) -> Q:
+    """Returns the filter of the concerned users who were already members of the audience at the given time."""
+    if isinstance(audience, Project):
+        collaborators_qs = ProjectCollaborator.objects.filter(
+            project=audience,
+            created_at__lte=created_before,
+        )
+
+        return (
+            Q(
+                project_role_origin__in=(
+                    ProjectQueryset.RoleOrigins.PROJECTOWNER,
+                    ProjectQueryset.RoleOrigins.ORGANIZATIONOWNER,
+                )
+            )
+            | Exists(collaborators_qs.filter(collaborator=OuterRef("pk")))
+            | Exists(
+                OrganizationMember.objects.filter(
+                    _created_before_q(created_before),
+                    organization_id=audience.owner_id,
+                    member=OuterRef("pk"),
+                )
+            )
+            | Exists(
+                TeamMember.objects.filter(
+                    _created_before_q(created_before),
+                    team__in=collaborators_qs.values("collaborator"),
+                    member=OuterRef("pk"),
+                )
+            )
+        )
+
+    if audience.type == User.Type.ORGANIZATION:
+        return Q(
+            organization_role_origin=OrganizationQueryset.RoleOrigins.ORGANIZATIONOWNER
+        ) | Exists(
+            OrganizationMember.objects.filter(
+                _created_before_q(created_before),
+                organization_id=audience.pk,
+                member=OuterRef("pk"),
+            )
+        )
+
+    if audience.type == User.Type.TEAM:
+        return Q(membership_role=TeamMember.Roles.ADMIN) | Exists(
+            TeamMember.objects.filter(
+                _created_before_q(created_before),
+                team_id=audience.pk,
+                member=OuterRef("pk"),
+            )
+        )
+
+    return Q()
+
+
+def _get_concerned_user_ids(
+    audience: User | Project, created_before: datetime | None = None
+) -> list[int]:
+    if isinstance(audience, Project):
+        users_qs = _concerned_users_in_project(audience)
+    else:
+        users_qs = _concerned_users_in_entity(audience)
+
+    if created_before is not None:
+        users_qs = users_qs.filter(_concerned_before_q(audience, created_before))
+
+    return list(users_qs.values_list("pk", flat=True))
+
+
+def enqueue_event(
+    actor: User,
+    verb: str,
+    action_object,
+    audience: User | Project,
+    target=None,
+    resolve_recipients: bool = False,
+) -> NotificationOutboxEvent:
+    """Writes an event to the outbox, which is later turned into notifications to the users concerned by the audience.
+
+    Args:
+        actor (User): the user who made the change
+        verb (str): what happened, e.g. "created"
+        action_object (Model): the object the change is about
+        audience (User | Project): the entity or the project which concerned users are notified
+        target (Model, optional): the object the action object was added to or removed from. Defaults to None.
+        resolve_recipients (bool, optional): resolve the recipients right away, needed when the audience is about to be deleted. Defaults to False.
+
+    Returns:
+        NotificationOutboxEvent: the written event
+    """
+    event = NotificationOutboxEvent(
+        actor_content_type=ContentType.objects.get_for_model(actor),
+        actor_object_id=str(actor.pk),
+        verb=verb,
+        action_object_content_type=ContentType.objects.get_for_model(action_object),
+        action_object_object_id=str(action_object.pk),
+        audience=(
+            NotificationOutboxEvent.Audience.PROJECT
+            if isinstance(audience, Project)
+            else NotificationOutboxEvent.Audience.ENTITY
+        ),
+        audience_object_id=str(audience.pk),
+    )
+
+    if target is not None:
+        event.target_content_type = ContentType.objects.get_for_model(target)
+        event.target_object_id = str(target.pk)
+
+    if resolve_recipients:
+        event.recipient_ids = _get_concerned_user_ids(audience)
+
+    event.save()
+
+    return event
+
+
+def get_recipient_ids(event: NotificationOutboxEvent) -> list[int]:
+    """Returns the deduplicated ids of the users to be notified about the event, without the actor.
+
+    Unless resolved when the event was written, the recipients are the users concerned by the audience,
+    who were already members of it when the event was written.
+    """
+    if event.recipient_ids is not None:
+        recipient_ids = event.recipient_ids
+    else:
+        if event.audience == NotificationOutboxEvent.Audience.PROJECT:
+            audience = Project.objects.filter(pk=event.audience_object_id).first()
+        else:
+            audience = User.objects.filter(pk=event.audience_object_id).first()
+
+        # the audience has been deleted in the meantime
+        if audience is None:
+            return []
+
+        recipient_ids = _get_concerned_user_ids(audience, event.created_at)
+
+    # TODO : marking notifications as read is currently not supported, so we disable
+    # self-notifications for now
+    # see https://github.com/django-notifications/django-notifications/issues/317
+    actor_id = int(event.actor_object_id)
+
+    return [pk for pk in dict.fromkeys(recipient_ids) if pk != actor_id]
+
+
+def process_events(batch_size: int = 100) -> int:
+    """Turns the outbox events into notifications, oldest first.
+
+    The events are locked while processed, so concurrent runs skip them.
+
+    Returns:
+        int: number of processed events
+    """
+    processed_count = 0
+
+    while True:
+        with transaction.atomic():
+            events = list(
+                NotificationOutboxEvent.objects.select_for_update(
+                    skip_locked=True
+                ).order_by("created_at", "pk")[:batch_size]
+            )
+
+            if not events:
+                break
+
+            notifications = []
+            for event in events:
+                for recipient_id in get_recipient_ids(event):
+                    notifications.append(
+                        Notification(
+                            recipient_id=recipient_id,
+                            actor_content_type_id=event.actor_content_type_id,
+                            actor_object_id=event.actor_object_id,
+                            verb=event.verb,
+                            action_object_content_type_id=event.action_object_content_type_id,
+                            action_object_object_id=event.action_object_object_id,
+                            target_content_type_id=event.target_content_type_id,
+                            target_object_id=event.target_object_id,
+                            timestamp=event.created_at,
+                        )
+                    )
+
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+            NotificationOutboxEvent.objects.filter(
+                pk__in=[event.pk for event in events]
+            ).delete()
+
+        logger.debug(
+            f"Created {len(notifications)} notification(s) from {len(events)} outbox event(s)."
+        )
+
+        processed_count += len(events)
+
+    return processed_count
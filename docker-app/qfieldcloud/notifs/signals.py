@@ -1,28 +1,29 @@
 """
 This module logs activity streams using the `django-activity-stream` package.
 """
+
 from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 from django_currentuser.middleware import get_current_authenticated_user
-from notifications.signals import notify
 
 from ..core.models import (
     Organization,
     OrganizationMember,
-    Person,
     Project,
     ProjectCollaborator,
-    ProjectQueryset,
     Team,
     TeamMember,
     User,
 )
+from . import outbox
 
 
-def _send_notif(verb, action_object, recipient, target=None):
+def _send_notif(verb, action_object, audience, target=None, is_deleted=False):
     """
-    Sends a notification through django-notifications, but sets it as already read
-    if the actor is the same as the recipient
+    Writes the notification to the outbox, so the recipients are resolved and notified in the background.
+    If the actor is one of the recipients, they are not notified.
+
+    The recipients of deletions are resolved right away, as the audience or the roles within it are about to change.
     """
     authenticated_user = get_current_authenticated_user()
 
@@ -30,45 +31,13 @@ def _send_notif(verb, action_object, recipient, target=None):
     if authenticated_user is None:
         return
 
-    # deduplicate
-    recipient = list(set(recipient))
-
-    if authenticated_user in recipient:
-        # If the actor is already the recipient, we consider the notification as seen
-
-        # TODO : marking notifications as read is currently not supported, so we disable
-        # self-notifications for now
-        # see https://github.com/django-notifications/django-notifications/issues/317
-        # notify.send(
-        #     authenticated_user,
-        #     verb=verb,
-        #     action_object=action_object,
-        #     target=target,
-        #     recipient=[authenticated_user],
-        #     unread=False, # not supported !
-        # )
-        recipient.remove(authenticated_user)
-
-    notify.send(
-        authenticated_user,
+    outbox.enqueue_event(
+        actor=authenticated_user,
         verb=verb,
         action_object=action_object,
+        audience=audience,
         target=target,
-        recipient=list(recipient),
-    )
-
-
-def _concerned_users_in_entity(entity: User):
-    """Returns a list of users (of User.Type.PERSON) concerned by updates to an user (any type)"""
-
-    return Person.objects.for_entity(entity)  # type: ignore
-
-
-def _concerned_users_in_project(project: Project):
-    """Returns a list of users concerned by updates to a project"""
-
-    return Person.objects.for_project(project).exclude(  # type: ignore
-        project_role_origin=ProjectQueryset.RoleOrigins.PUBLIC
+        resolve_recipients=is_deleted,
     )
 
 
@@ -79,7 +48,7 @@ def user_created(sender, instance, created, **kwargs):
     _send_notif(
         verb="created",
         action_object=user,
-        recipient=_concerned_users_in_entity(user),
+        audience=user,
     )
 
 
@@ -96,7 +65,7 @@ def organization_created(sender, instance, created, **kwargs):
     _send_notif(
         verb="created",
         action_object=organization,
-        recipient=_concerned_users_in_entity(organization),
+        audience=organization,
     )
 
 
@@ -107,7 +76,8 @@ def organization_deleted(sender, instance, **kwargs):
     _send_notif(
         verb="deleted",
         action_object=organization,
-        recipient=_concerned_users_in_entity(organization),
+        audience=organization,
+        is_deleted=True,
     )
 
 
@@ -122,7 +92,7 @@ def organization_membership_created(sender, instance, created, **kwargs):
         verb="added",
         action_object=membership.member,
         target=membership.organization,
-        recipient=_concerned_users_in_entity(membership.organization),
+        audience=membership.organization,
     )
 
 
@@ -133,7 +103,8 @@ def organization_membership_deleted(sender, instance, **kwargs):
         verb="removed",
         action_object=membership.member,
         target=membership.organization,
-        recipient=_concerned_users_in_entity(membership.organization),
+        audience=membership.organization,
+        is_deleted=True,
     )
 
 
@@ -150,7 +121,7 @@ def team_created(sender, instance, created, **kwargs):
     _send_notif(
         verb="created",
         action_object=team,
-        recipient=_concerned_users_in_entity(team),
+        audience=team,
     )
 
 
@@ -160,7 +131,8 @@ def team_deleted(sender, instance, **kwargs):
     _send_notif(
         verb="deleted",
         action_object=team,
-        recipient=_concerned_users_in_entity(team),
+        audience=team,
+        is_deleted=True,
     )
 
 
@@ -175,7 +147,7 @@ def team_membership_created(sender, instance, created, **kwargs):
         verb="added",
         action_object=membership.member,
         target=membership.team,
-        recipient=_concerned_users_in_entity(membership.team),
+        audience=membership.team,
     )
 
 
@@ -186,7 +158,8 @@ def team_membership_deleted(sender, instance, **kwargs):
         verb="removed",
         action_object=membership.member,
         target=membership.team,
-        recipient=_concerned_users_in_entity(membership.team),
+        audience=membership.team,
+        is_deleted=True,
     )
 
 
@@ -203,7 +176,7 @@ def project_created(sender, instance, created, **kwargs):
     _send_notif(
         verb="created",
         action_object=project,
-        recipient=_concerned_users_in_project(project),
+        audience=project,
     )
 
 
@@ -213,7 +186,8 @@ def project_deleted(sender, instance, **kwargs):
     _send_notif(
         verb="deleted",
         action_object=project,
-        recipient=_concerned_users_in_project(project),
+        audience=project,
+        is_deleted=True,
     )
 
 
@@ -229,7 +203,7 @@ def project_membership_created(sender, instance, created, **kwargs):
         verb="added",
         action_object=membership.collaborator,
         target=membership.project,
-        recipient=_concerned_users_in_project(membership.project),
+        audience=membership.project,
     )
 
 
@@ -241,5 +215,6 @@ def project_membership_deleted(sender, instance, **kwargs):
         verb="removed",
         action_object=membership.collaborator,
         target=membership.project,
-        recipient=_concerned_users_in_project(membership.project),
+        audience=membership.project,
+        is_deleted=True,
     )
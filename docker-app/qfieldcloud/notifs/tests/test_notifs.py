@@ -1,5 +1,6 @@
 from datetime import timedelta
 
+from django.core import mail
 from django.core.management import call_command
 from django.db import close_old_connections
 from django.test import TestCase
@@ -17,6 +18,8 @@ from qfieldcloud.core.models import (
     UserAccount,
 )
 from qfieldcloud.core.tests.utils import set_subscription, setup_subscription_plans
+from qfieldcloud.notifs import outbox
+from qfieldcloud.notifs.models import NotificationOutboxEvent
 
 
 class QfcTestCase(TestCase):
@@ -42,6 +45,8 @@ class QfcTestCase(TestCase):
     def assertNotifs(self, expected_count, filter=None):
         if filter is None:
             filter = {}
+        # the notifications are created from the outbox in the background
+        outbox.process_events()
         notifications = Notification.objects.filter(**filter)
         actual_count = notifications.count()
         if actual_count != expected_count:
@@ -175,6 +180,55 @@ class QfcTestCase(TestCase):
         self.assertNotifs(3, {"recipient": self.user2})
         self.assertNotifs(2, {"recipient": self.user3})
 
+    def test_outbox(self):
+        _set_current_user(self.otheruser)
+
+        org1 = Organization.objects.create(
+            username="org1", organization_owner=self.user1
+        )
+
+        # Notifications are not created within the transaction of the change
+        self.assertEqual(NotificationOutboxEvent.objects.count(), 1)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        self.assertEqual(outbox.process_events(), 1)
+        self.assertEqual(NotificationOutboxEvent.objects.count(), 0)
+        self.assertNotifs(1, {"recipient": self.user1})
+
+        # Recipients of deletions are resolved before the organization is gone
+        org1.delete()
+        self.assertEqual(NotificationOutboxEvent.objects.count(), 1)
+        self.assertNotifs(2, {"recipient": self.user1})
+
+    def test_outbox_skips_later_members(self):
+        _set_current_user(self.otheruser)
+
+        org1 = Organization.objects.create(
+            username="org1", organization_owner=self.user1
+        )
+        set_subscription(org1, "default_org")
+        p1 = Project.objects.create(name="p1", owner=org1)
+
+        # The recipients are resolved in the background, not within the transaction of the change
+        self.assertFalse(
+            NotificationOutboxEvent.objects.filter(recipient_ids__isnull=False).exists()
+        )
+
+        OrganizationMember.objects.create(
+            organization=org1,
+            member=self.user2,
+            role=OrganizationMember.Roles.ADMIN,
+        )
+        org1.members.create(member=self.user3)
+        p1.collaborators.create(collaborator=self.user3)
+
+        # user2 and user3 joined after org1 and p1 were created, so they are not notified about it,
+        # even if the outbox is processed only now
+        self.assertNotifs(0, {"recipient": self.user2, "verb": "created"})
+        self.assertNotifs(3, {"recipient": self.user2, "verb": "added"})
+        self.assertNotifs(0, {"recipient": self.user3, "verb": "created"})
+        self.assertNotifs(2, {"recipient": self.user3, "verb": "added"})
+
     def test_cron(self):
         # Ensuring cron works
 
@@ -226,3 +280,9 @@ class QfcTestCase(TestCase):
         call_command("runcrons", "--force")
         self.assertNotifs(0, {"emailed": False})
         self.assertNotifs(2, {"emailed": True})
+
+        # both notifications are sent within a single email
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
+        self.assertIn("tests_old", mail.outbox[0].body)
+        self.assertIn("tests_now", mail.outbox[0].body)
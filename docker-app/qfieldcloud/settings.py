@@ -134,11 +134,13 @@ MIDDLEWARE = [
 ]
 
 CRON_CLASSES = [
+    "qfieldcloud.notifs.cron.ProcessNotificationOutboxJob",
     "qfieldcloud.notifs.cron.SendNotificationsJob",
     # "qfieldcloud.core.cron.DeleteExpiredInvitationsJob",
     "qfieldcloud.core.cron.ResendFailedInvitationsJob",
     "qfieldcloud.core.cron.SetTerminatedWorkersToFinalStatusJob",
     "qfieldcloud.core.cron.DeleteObsoleteProjectPackagesJob",
+    "qfieldcloud.core.cron.AbortExpiredFileUploadSessionsJob",
 ]
 
 ROOT_URLCONF = "qfieldcloud.urls"
@@ -456,6 +458,51 @@ QFIELDCLOUD_TEST_SKIP_SORT_ADMIN_URLS = ("/admin/django_cron/cronjoblog/?o=4",)
 
 APPLY_DELTAS_LIMIT = 1000
 
+# Number of characters from the beginning and the end of the job output kept in `Job.output`.
+# Longer outputs are stored in full as gzipped objects on the storage.
+QFIELDCLOUD_JOB_OUTPUT_HEAD_CHARS = 10000
+QFIELDCLOUD_JOB_OUTPUT_TAIL_CHARS = 40000
+
+# Number of entries (batches of log lines or step transitions) kept in the cache while a job is running
+QFIELDCLOUD_JOB_LOGS_BUFFER_SIZE = 500
+# Seconds the live job logs are kept in the cache after the last write
+QFIELDCLOUD_JOB_LOGS_BUFFER_TIMEOUT = 60 * 60
+# Number of job status events kept in the cache per project
+QFIELDCLOUD_JOB_EVENTS_BUFFER_SIZE = 100
+# Seconds the job status events of a project are kept in the cache after the last write
+QFIELDCLOUD_JOB_EVENTS_BUFFER_TIMEOUT = 60 * 60 * 24
+# Seconds a long-poll or Server-Sent Events request waits for new entries before returning
+QFIELDCLOUD_LIVE_STREAM_TIMEOUT = 25
+# Maximum number of long-poll or Server-Sent Events requests waiting at the same time in each app process.
+# A waiting request holds a server thread, so keep it below `GUNICORN_THREADS` to leave threads for the other requests.
+# Further requests return the available entries at once and ask the client to retry later.
+QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS = int(
+    os.environ.get("QFIELDCLOUD_LIVE_STREAM_MAX_WAITERS") or 1
+)
+# Seconds a client is asked to wait before retrying when there is no free slot to wait for new entries
+QFIELDCLOUD_LIVE_STREAM_RETRY_AFTER = 5
+
+# Seconds the storage and subscription summary of an account is cached.
+# It is invalidated on changes anyway, but the current subscription also depends on the time.
+QFIELDCLOUD_ACCOUNT_SUMMARY_CACHE_TIMEOUT = 60
+
+# Write the audit log entries of a committed transaction in a background thread, instead of before the response is sent.
+# Faster, but the entries are lost if the process dies before they are written.
+QFIELDCLOUD_AUDIT_ASYNC = (
+    os.environ.get("QFIELDCLOUD_AUDIT_ASYNC", "").lower() == "true"
+)
+
+# Size of the chunks of the resumable file uploads. The storage requires at least 5 MiB, except for the last chunk.
+QFIELDCLOUD_FILE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Days after which unfinished resumable file uploads are aborted and their chunks deleted from the storage
+QFIELDCLOUD_FILE_UPLOAD_SESSION_EXPIRATION_DAYS = 7
+
+# Seconds a project is not repackaged after the package job found its PostGIS layers unchanged, see `Project.is_online_data_unchanged`
+QFIELDCLOUD_ONLINE_DATA_PROBE_TIMEOUT = 60
+
+# Maximum number of pending apply jobs of a project that are merged into the run of the oldest one
+QFIELDCLOUD_APPLY_JOBS_MERGE_LIMIT = 10
+
 # the value of the "source" key in each logger entry
 LOGGER_SOURCE = os.environ.get("LOGGER_SOURCE", None)
 
@@ -485,6 +532,10 @@ CONSTANCE_CONFIG = {
         512,
         "Share of CPUs for each QGIS worker container. By default all containers have value 1024 set by docker.",
     ),
+    "WORKER_APPLY_DELTAS_WITHOUT_QGIS": (
+        True,
+        "Apply the deltas on GeoPackage layers directly, without a QGIS worker container, when all of them are supported.",
+    ),
     "TRIAL_PERIOD_DAYS": (28, "Days in which the trial period expires."),
 }
 CONSTANCE_ADDITIONAL_FIELDS = {
@@ -500,6 +551,7 @@ CONSTANCE_CONFIG_FIELDSETS = {
         "WORKER_TIMEOUT_S",
         "WORKER_QGIS_MEMORY_LIMIT",
         "WORKER_QGIS_CPU_SHARES",
+        "WORKER_APPLY_DELTAS_WITHOUT_QGIS",
     ),
     "Debug": ("SENTRY_REQUEST_MAX_SIZE_TO_SEND",),
     "Subscription": ("TRIAL_PERIOD_DAYS",),
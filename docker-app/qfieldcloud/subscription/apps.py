@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "qfieldcloud.subscription"
+
+    def ready(self):
+        from qfieldcloud.subscription import signals  # noqa
@@ -58,7 +58,19 @@ class SubscriptionStatus(models.TextChoices):
     INACTIVE_CANCELLED = "inactive_cancelled", _("Inactive Cancelled")
 
 
+class PlanQuerySet(models.QuerySet):
+    def update(self, **kwargs) -> int:
+        rows = super().update(**kwargs)
+
+        # `QuerySet.update()` sends no signals, but the account summaries contain plan values
+        UserAccount.invalidate_all_summaries()
+
+        return rows
+
+
 class Plan(models.Model):
+    objects = PlanQuerySet.as_manager()
+
     @classmethod
     def get_or_create_default(cls) -> "Plan":
         """Returns the default plan, creating one if none exists.
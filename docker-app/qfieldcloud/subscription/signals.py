@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from qfieldcloud.core.models import UserAccount
+
+from .models import Package, Plan, get_subscription_model
+
+Subscription = get_subscription_model()
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription_account_summary(sender, instance, **kwargs):
+    UserAccount.invalidate_summaries([instance.account_id])
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def invalidate_package_account_summary(sender, instance, **kwargs):
+    account_ids = Subscription.objects.filter(pk=instance.subscription_id).values_list(
+        "account_id", flat=True
+    )
+    UserAccount.invalidate_summaries(list(account_ids))
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def invalidate_plan_account_summaries(sender, instance, **kwargs):
+    # NOTE plans are rarely changed, but they might have a lot of subscriptions
+    UserAccount.invalidate_all_summaries()
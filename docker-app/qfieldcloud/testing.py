@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.cache import cache
 from django.test.runner import DiscoverRunner
 
 
@@ -6,3 +7,9 @@ class QfcTestSuiteRunner(DiscoverRunner):
     def __init__(self, *args, **kwargs):
         settings.IN_TEST_SUITE = True
         super().__init__(*args, **kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+
+        # the test database ids are reused between test runs, so are the cache keys based on them
+        cache.clear()
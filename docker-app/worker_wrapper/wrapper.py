@@ -1,8 +1,11 @@
 import json
 import logging
+import re
 import shutil
 import sys
 import tempfile
+import threading
+import time
 import traceback
 import uuid
 from datetime import timedelta
@@ -17,6 +20,7 @@ from django.conf import settings
 from django.db import transaction
 from django.forms.models import model_to_dict
 from django.utils import timezone
+from django.utils.crypto import salted_hmac
 from docker.client import DockerClient
 from docker.errors import APIError
 from docker.models.containers import Container
@@ -28,10 +32,13 @@ from qfieldcloud.core.models import (
     Job,
     PackageJob,
     ProcessProjectfileJob,
+    Project,
+    ProjectPackage,
+    ProjectPackageFile,
     Secret,
 )
 from qfieldcloud.core.utils import get_qgis_project_file
-from qfieldcloud.core.utils2 import storage
+from qfieldcloud.core.utils2 import gpkg_deltas, pg_change_tokens, storage, streams
 from tenacity import (
     retry,
     retry_if_exception_type,
@@ -45,6 +52,11 @@ RETRY_COUNT = 5
 TIMEOUT_ERROR_EXIT_CODE = -1
 DOCKER_SIGKILL_EXIT_CODE = 137
 TMP_FILE = Path("/tmp")
+# the markers printed by `qfc_worker.utils.logger_context` when a workflow step starts and ends
+STEP_START_RE = re.compile(r"^::<<<::(?P<log_uuid>\S+) (?P<name>.*)$")
+STEP_END_RE = re.compile(r"^::>>>::(?P<log_uuid>\S+) (?P<stage>\d+)$")
+LIVE_LOGS_FLUSH_INTERVAL_S = 1
+LIVE_LOGS_FLUSH_LINES = 50
 
 
 class QgisException(Exception):
@@ -96,6 +108,14 @@ class JobRun:
     def before_docker_run(self) -> None:
         pass
 
+    def get_cached_feedback(self) -> dict[str, Any] | None:
+        """Returns the feedback of a previous job with the very same inputs, so the docker run can be skipped."""
+        return None
+
+    def run_without_docker(self) -> dict[str, Any] | None:
+        """Runs the job without docker if possible, then `after_docker_run` is called with the returned feedback."""
+        return None
+
     def after_docker_run(self) -> None:
         pass
 
@@ -140,6 +160,40 @@ class JobRun:
 
             self.before_docker_run()
 
+            cached_feedback = self.get_cached_feedback()
+
+            if cached_feedback is not None:
+                logger.info(f"Skipping the docker run of {self.job}, nothing changed.")
+
+                self.job.feedback = cached_feedback
+                self.job.finished_at = timezone.now()
+                self.job.status = Job.Status.FINISHED
+                self.job.save(update_fields=["feedback", "status", "finished_at"])
+
+                shutil.rmtree(str(self.shared_tempdir), ignore_errors=True)
+
+                return
+
+            feedback_without_docker = self.run_without_docker()
+
+            if feedback_without_docker is not None:
+                logger.info(f"Skipping the docker run of {self.job}, already done.")
+
+                self.job.feedback = feedback_without_docker
+                self.job.save(update_fields=["feedback"])
+
+                self.job.project.refresh_from_db()
+
+                self.after_docker_run()
+
+                shutil.rmtree(str(self.shared_tempdir), ignore_errors=True)
+
+                self.job.finished_at = timezone.now()
+                self.job.status = Job.Status.FINISHED
+                self.job.save(update_fields=["status", "finished_at"])
+
+                return
+
             command = self.get_command()
             volumes = []
             volumes.append(f"{str(self.shared_tempdir)}:/io/:rw")
@@ -189,9 +243,9 @@ class JobRun:
 
             feedback["container_exit_code"] = exit_code
 
-            self.job.output = output.decode("utf-8")
+            self.job.set_output(output.decode("utf-8"))
             self.job.feedback = feedback
-            self.job.save(update_fields=["output", "feedback"])
+            self.job.save(update_fields=["output", "output_uri", "feedback"])
 
             if exit_code != 0 or feedback.get("error") is not None:
                 self.job.status = Job.Status.FAILED
@@ -266,6 +320,7 @@ class JobRun:
 
         extra_envvars = {}
         pgservice_file_contents = ""
+        secrets_sha256 = get_secrets_sha256(self.job.project)
         for secret in self.job.project.secrets.all():
             if secret.type == Secret.Type.ENVVAR:
                 extra_envvars[secret.name] = secret.value
@@ -300,6 +355,7 @@ class JobRun:
             command,
             environment={
                 "PGSERVICE_FILE_CONTENTS": pgservice_file_contents,
+                "SECRETS_SHA256": secrets_sha256,
                 "QFIELDCLOUD_TOKEN": token.key,
                 "QFIELDCLOUD_URL": settings.QFIELDCLOUD_WORKER_QFIELDCLOUD_URL,
                 "JOB_ID": self.job_id,
@@ -307,7 +363,6 @@ class JobRun:
                 "QT_QPA_PLATFORM": "offscreen",
             },
             volumes=volumes,
-            # TODO stream the logs to something like redis, so they can be streamed back in project jobs page to the user live
             # auto_remove=True,
             network=settings.QFIELDCLOUD_DEFAULT_NETWORK,
             detach=True,
@@ -325,6 +380,14 @@ class JobRun:
         self.job.save(update_fields=["docker_started_at", "container_id"])
         logger.info(f"Starting worker {container.id} ...")
 
+        live_logs_buffer = streams.get_job_logs_buffer(self.job_id)
+        live_logs_thread = threading.Thread(
+            target=self._follow_container_logs,
+            args=(container, live_logs_buffer),
+            daemon=True,
+        )
+        live_logs_thread.start()
+
         response = {"StatusCode": TIMEOUT_ERROR_EXIT_CODE}
 
         try:
@@ -349,6 +412,15 @@ class JobRun:
         self.job.docker_finished_at = timezone.now()
         self.job.save(update_fields=["docker_finished_at"])
 
+        # the log stream ends when the container stops, give it a moment to flush the last lines
+        live_logs_thread.join(timeout=10)
+        live_logs_buffer.append(
+            {
+                "type": "end",
+                "exit_code": response["StatusCode"],
+            }
+        )
+
         logs = b""
         # Retry reading the logs, as it may fail
         # NOTE when reading the logs of a finished container, it might timeout with an ``.
@@ -381,6 +453,63 @@ class JobRun:
 
         return response["StatusCode"], logs
 
+    def _follow_container_logs(
+        self, container: Container, buffer: streams.CacheRingBuffer
+    ) -> None:
+        """Copies the container log lines and the workflow step transitions to the live logs buffer.
+
+        Runs in a separate thread while the container is running, failures are logged and ignored.
+        """
+        try:
+            step_names = {}
+            lines = []
+            last_flush_at = time.monotonic()
+            incomplete_line = ""
+
+            for chunk in container.logs(stream=True, follow=True):
+                text = incomplete_line + chunk.decode("utf-8", errors="replace")
+                *complete_lines, incomplete_line = text.split("\n")
+
+                for line in complete_lines:
+                    if m := STEP_START_RE.match(line):
+                        _flush_live_logs(buffer, lines)
+                        step_names[m["log_uuid"]] = m["name"]
+                        buffer.append(
+                            {
+                                "type": "step",
+                                "name": m["name"],
+                                "status": "started",
+                            }
+                        )
+                    elif m := STEP_END_RE.match(line):
+                        _flush_live_logs(buffer, lines)
+                        buffer.append(
+                            {
+                                "type": "step",
+                                "name": step_names.get(m["log_uuid"]),
+                                # see `qfc_worker.utils.logger_context`, stage 2 means the step has finished successfully
+                                "status": "finished" if m["stage"] == "2" else "failed",
+                            }
+                        )
+                    else:
+                        lines.append(line)
+
+                if (
+                    len(lines) >= LIVE_LOGS_FLUSH_LINES
+                    or time.monotonic() - last_flush_at >= LIVE_LOGS_FLUSH_INTERVAL_S
+                ):
+                    _flush_live_logs(buffer, lines)
+                    last_flush_at = time.monotonic()
+
+            if incomplete_line:
+                lines.append(incomplete_line)
+
+            _flush_live_logs(buffer, lines)
+        except Exception as err:
+            logger.warning(
+                f"Failed to follow the logs of container {container.id}.", exc_info=err
+            )
+
 
 class PackageJobRun(JobRun):
     job_class = PackageJob
@@ -391,12 +520,153 @@ class PackageJobRun(JobRun):
         "%(project__packaging_offliner)s",
     ]
     data_last_packaged_at = None
+    previous_package_id = None
+
+    def _get_previous_package(self) -> dict[str, Any] | None:
+        """Returns the previous package of the project, which files can be reused by the new package."""
+        previous_job = self.job.project.last_package_job
+
+        if not previous_job:
+            return None
+
+        # NOTE packages stored before the package manifests cannot be reused
+        files = dict(
+            ProjectPackageFile.objects.filter(
+                package_id=previous_job.pk,
+                package__state=ProjectPackage.State.STORED,
+            ).values_list("name", "sha256")
+        )
+
+        if not files:
+            return None
+
+        outputs = (previous_job.feedback or {}).get("outputs", {})
+
+        return {
+            "package_id": str(previous_job.pk),
+            "files": files,
+            "fingerprints": outputs.get("package_fingerprints", {}).get("fingerprints"),
+            "layers_by_id": outputs.get("qfield_layer_data", {}).get("layers_by_id"),
+        }
 
     def before_docker_run(self) -> None:
         # at the start of docker we assume we make the snapshot of the data
         self.data_last_packaged_at = timezone.now()
 
+        previous_package = self._get_previous_package()
+
+        if previous_package:
+            self.previous_package_id = previous_package["package_id"]
+
+            with open(self.shared_tempdir.joinpath("previous_package.json"), "w") as f:
+                json.dump(previous_package, f)
+
+    def run_without_docker(self) -> dict[str, Any] | None:
+        """Reuses the previous package as is if its PostGIS layers did not change, without starting QGIS.
+
+        Only the change tokens of the PostGIS layers are queried, the same the QGIS worker recorded in the
+        package fingerprints. The file based layers are tracked by `Project.data_last_updated_at`.
+        """
+        project = self.job.project
+        previous_job = project.last_package_job
+
+        if (
+            not project.has_online_vector_data
+            or not self.previous_package_id
+            or not project.data_last_packaged_at
+            or not project.data_last_updated_at
+            or project.data_last_packaged_at < project.data_last_updated_at
+        ):
+            return None
+
+        outputs = (previous_job.feedback or {}).get("outputs", {})
+        fingerprints = outputs.get("package_fingerprints", {}).get("fingerprints")
+        layers_by_id = outputs.get("qgis_layers_data", {}).get("layers_by_id")
+
+        if not fingerprints or not layers_by_id or not outputs.get("qfield_layer_data"):
+            return None
+
+        # NOTE the packaging code fingerprints are known to the QGIS worker only, the ones known here must match
+        if (
+            fingerprints["secrets_sha256"] != get_secrets_sha256(project)
+            or fingerprints["offliner_type"] != project.packaging_offliner
+        ):
+            return None
+
+        datasource_by_layer_id = {}
+        for layer_id, layer_data in layers_by_id.items():
+            # NOTE same as `Project.has_online_vector_data`
+            if layer_data.get("type_name") not in (
+                "VectorLayer",
+                "Vector",
+            ) or layer_data.get("filename"):
+                continue
+
+            token = fingerprints["layers"].get(layer_id)
+
+            # the online layers which changes cannot be detected, e.g. WFS layers or PostGIS views
+            if not token or not token.startswith("xmin:"):
+                return None
+
+            datasource_by_layer_id[layer_id] = layer_data.get("datasource") or ""
+
+        pgservice_file_contents = "\n".join(
+            project.secrets.filter(type=Secret.Type.PGSERVICE).values_list(
+                "value", flat=True
+            )
+        )
+        current_tokens = pg_change_tokens.get_layers_change_tokens(
+            datasource_by_layer_id, pgservice_file_contents
+        )
+
+        for layer_id in datasource_by_layer_id:
+            if current_tokens[layer_id] != fingerprints["layers"][layer_id]:
+                return None
+
+        logger.info(
+            f'The online layers did not change since package "{self.previous_package_id}", reusing it!'
+        )
+
+        project.online_data_unchanged_at = timezone.now()
+        project.save(update_fields=["online_data_unchanged_at"])
+
+        reused_filenames = list(
+            ProjectPackageFile.objects.filter(
+                package_id=self.previous_package_id
+            ).values_list("name", flat=True)
+        )
+
+        # NOTE the same structure as the feedback of the "package_project" workflow of the QGIS worker
+        return {
+            "feedback_version": "2.0",
+            "workflow_id": "package_project_without_qgis",
+            "workflow_name": "Package Project Without QGIS",
+            "outputs": {
+                "qgis_layers_data": outputs["qgis_layers_data"],
+                "package_fingerprints": outputs["package_fingerprints"],
+                "package_project": {
+                    "is_previous_package_reused": True,
+                },
+                "qfield_layer_data": outputs["qfield_layer_data"],
+                "upload_packaged_project": {
+                    "reused_filenames": reused_filenames,
+                },
+            },
+        }
+
     def after_docker_run(self) -> None:
+        reused_filenames = self.job.feedback["outputs"]["upload_packaged_project"][
+            "reused_filenames"
+        ]
+
+        if reused_filenames:
+            storage.reuse_package_files(
+                str(self.job.project.id),
+                str(self.job.pk),
+                self.previous_package_id,
+                reused_filenames,
+            )
+
         # only successfully finished packaging jobs should update the Project.data_last_packaged_at
         self.job.project.data_last_packaged_at = self.data_last_packaged_at
         self.job.project.last_package_job = self.job
@@ -407,31 +677,12 @@ class PackageJobRun(JobRun):
             )
         )
 
-        try:
-            project_id = str(self.job.project.id)
-            package_ids = storage.get_stored_package_ids(project_id)
-            job_ids = [
-                str(job["id"])
-                for job in Job.objects.filter(
-                    type=Job.Type.PACKAGE,
-                )
-                .exclude(id=self.job.id)
-                .exclude(
-                    status__in=(Job.Status.FAILED, Job.Status.FINISHED),
-                )
-                .values("id")
-            ]
-
-            for package_id in package_ids:
-                # keep the last package
-                if package_id == str(self.job.project.last_package_job_id):
-                    continue
-
-                # the job is still active, so it might be one of the new packages
-                if package_id in job_ids:
-                    continue
+        ProjectPackage.objects.filter(pk=self.job.pk).update(
+            state=ProjectPackage.State.STORED,
+        )
 
-                storage.delete_stored_package(project_id, package_id)
+        try:
+            storage.delete_obsolete_stored_packages(str(self.job.project.id))
         except Exception as err:
             logger.error(
                 "Failed to delete dangling packages, will be deleted via CRON later.",
@@ -443,9 +694,15 @@ class DeltaApplyJobRun(JobRun):
     job_class = ApplyJob
     command = ["delta_apply", "%(project__id)s", "%(project__project_filename)s"]
 
-    def __init__(self, job_id: str) -> None:
+    def __init__(self, job_id: str, merged_job_ids: Iterable[str] = ()) -> None:
         super().__init__(job_id)
 
+        # the pending apply jobs of the same project applied in the same run, see `jobs.get_mergeable_apply_jobs`
+        self.merged_job_ids = list(merged_job_ids)
+        self.merged_jobs: list[ApplyJob] = []
+        # the jobs each delta is applied for, by delta id. NOTE the same delta might be in several of the merged jobs
+        self.jobs_by_delta_id: dict[str, list[ApplyJob]] = {}
+
         if self.job.overwrite_conflicts:
             self.command = [*self.command, "--overwrite-conflicts"]
 
@@ -483,21 +740,72 @@ class DeltaApplyJobRun(JobRun):
 
     @transaction.atomic()
     def before_docker_run(self) -> None:
-        deltas = self.job.deltas_to_apply.all()
-        deltafile_contents = self._prepare_deltas(deltas)
+        # NOTE the merged jobs are still pending, they are dequeued on their own if this job fails before starting them
+        self.merged_jobs = list(
+            ApplyJob.objects.select_for_update()
+            .filter(id__in=self.merged_job_ids, status=Job.Status.PENDING)
+            .order_by("created_at")
+        )
+
+        for job in self.merged_jobs:
+            job.status = Job.Status.STARTED
+            job.started_at = self.job.started_at
+            job.save(update_fields=["status", "started_at"])
+
+        # each delta is applied only once, in the order of the first job it is in
+        deltas_by_id: dict[str, Delta] = {}
+
+        for job in [self.job, *self.merged_jobs]:
+            for delta in job.deltas_to_apply.all():
+                deltas_by_id.setdefault(str(delta.id), delta)
+                self.jobs_by_delta_id.setdefault(str(delta.id), []).append(job)
+
+        deltafile_contents = self._prepare_deltas(deltas_by_id.values())
 
-        self.delta_ids = [d.id for d in deltas]
+        self.delta_ids = [d.id for d in deltas_by_id.values()]
 
         ApplyJobDelta.objects.filter(
-            apply_job_id=self.job_id,
+            apply_job_id__in=[self.job_id, *[job.id for job in self.merged_jobs]],
             delta_id__in=self.delta_ids,
         ).update(status=Delta.Status.STARTED)
 
-        self.job.deltas_to_apply.update(last_status=Delta.Status.STARTED)
+        Delta.objects.filter(id__in=self.delta_ids).update(
+            last_status=Delta.Status.STARTED
+        )
 
         with open(self.shared_tempdir.joinpath("deltafile.json"), "w") as f:
             json.dump(deltafile_contents, f)
 
+    def run_without_docker(self) -> dict[str, Any] | None:
+        if not config.WORKER_APPLY_DELTAS_WITHOUT_QGIS:
+            return None
+
+        with open(self.shared_tempdir.joinpath("deltafile.json")) as f:
+            deltafile_contents = json.load(f)
+
+        delta_feedback = gpkg_deltas.apply_deltas(
+            self.job.project,
+            self.job.created_by,
+            deltafile_contents,
+            self.job.overwrite_conflicts,
+            self.shared_tempdir,
+        )
+
+        if delta_feedback is None:
+            return None
+
+        # NOTE the same structure as the feedback of the "apply_changes" workflow of the QGIS worker
+        return {
+            "feedback_version": "2.0",
+            "workflow_id": "apply_changes_without_qgis",
+            "workflow_name": "Apply Changes Without QGIS",
+            "outputs": {
+                "apply_deltas": {
+                    "delta_feedback": delta_feedback,
+                },
+            },
+        }
+
     def after_docker_run(self) -> None:
         delta_feedback = self.job.feedback["outputs"]["apply_deltas"]["delta_feedback"]
         is_data_modified = False
@@ -506,6 +814,7 @@ class DeltaApplyJobRun(JobRun):
             delta_id = feedback["delta_id"]
             status = feedback["status"]
             modified_pk = feedback["modified_pk"]
+            jobs = self.jobs_by_delta_id.get(str(delta_id), [self.job])
 
             if status == "status_applied":
                 status = Delta.Status.APPLIED
@@ -523,12 +832,12 @@ class DeltaApplyJobRun(JobRun):
                 last_status=status,
                 last_feedback=feedback,
                 last_modified_pk=modified_pk,
-                last_apply_attempt_at=self.job.started_at,
-                last_apply_attempt_by=self.job.created_by,
+                last_apply_attempt_at=jobs[0].started_at,
+                last_apply_attempt_by=jobs[0].created_by,
             )
 
             ApplyJobDelta.objects.filter(
-                apply_job_id=self.job_id,
+                apply_job_id__in=[job.id for job in jobs],
                 delta_id=delta_id,
             ).update(
                 status=status,
@@ -540,6 +849,58 @@ class DeltaApplyJobRun(JobRun):
             self.job.project.data_last_updated_at = timezone.now()
             self.job.project.save(update_fields=("data_last_updated_at",))
 
+        if self.merged_jobs:
+            self._finish_merged_jobs(Job.Status.FINISHED)
+
+            self.job.feedback = self._get_job_feedback(self.job)
+            self.job.feedback["merged_job_ids"] = [
+                str(job.id) for job in self.merged_jobs
+            ]
+            self.job.save(update_fields=["feedback"])
+
+    def _get_job_feedback(self, job: ApplyJob) -> dict[str, Any]:
+        """Returns the feedback of the run, with the delta feedback of the deltas of the given job only."""
+        feedback = self.job.feedback or {}
+        delta_feedback = (
+            feedback.get("outputs", {}).get("apply_deltas", {}).get("delta_feedback")
+        )
+
+        if delta_feedback is None:
+            return {**feedback}
+
+        return {
+            **feedback,
+            "outputs": {
+                **feedback["outputs"],
+                "apply_deltas": {
+                    **feedback["outputs"]["apply_deltas"],
+                    "delta_feedback": [
+                        entry
+                        for entry in delta_feedback
+                        if job
+                        in self.jobs_by_delta_id.get(str(entry["delta_id"]), [self.job])
+                    ],
+                },
+            },
+        }
+
+    def _finish_merged_jobs(self, status: Job.Status) -> None:
+        for job in self.merged_jobs:
+            job.feedback = self._get_job_feedback(job)
+            job.feedback["merged_into_job_id"] = str(self.job_id)
+            job.set_output(f"Applied in the same run as job {self.job_id}.")
+            job.status = status
+            job.finished_at = timezone.now()
+            job.save(
+                update_fields=[
+                    "feedback",
+                    "output",
+                    "output_uri",
+                    "status",
+                    "finished_at",
+                ]
+            )
+
     def after_docker_exception(self) -> None:
         Delta.objects.filter(
             id__in=self.delta_ids,
@@ -552,7 +913,7 @@ class DeltaApplyJobRun(JobRun):
         )
 
         ApplyJobDelta.objects.filter(
-            apply_job_id=self.job_id,
+            apply_job_id__in=[self.job_id, *[job.id for job in self.merged_jobs]],
             delta_id__in=self.delta_ids,
         ).update(
             status=Delta.Status.ERROR,
@@ -560,6 +921,8 @@ class DeltaApplyJobRun(JobRun):
             modified_pk=None,
         )
 
+        self._finish_merged_jobs(Job.Status.FAILED)
+
 
 class ProcessProjectfileJobRun(JobRun):
     job_class = ProcessProjectfileJob
@@ -579,11 +942,59 @@ class ProcessProjectfileJobRun(JobRun):
 
         return context
 
+    secrets_sha256 = None
+
+    def before_docker_run(self) -> None:
+        # NOTE the secrets change how the layers are loaded, e.g. the PostgreSQL services, so they are part of the cache key
+        self.secrets_sha256 = get_secrets_sha256(self.job.project)
+
+    def get_cached_feedback(self) -> dict[str, Any] | None:
+        project = self.job.project
+        project_details = project.project_details or {}
+        # the project file and the files referenced by its layers, with their sha256 as processed last time, `None` if missing
+        referenced_files = project_details.get("referenced_files")
+
+        if (
+            not project.project_filename
+            or not referenced_files
+            or project.project_filename not in referenced_files
+        ):
+            return None
+
+        for filename, sha256sum in referenced_files.items():
+            if storage.get_project_file_sha256(str(project.id), filename) != sha256sum:
+                return None
+
+        last_job = (
+            ProcessProjectfileJob.objects.filter(
+                project=project,
+                status=Job.Status.FINISHED,
+            )
+            .exclude(pk=self.job.pk)
+            .order_by("-finished_at")
+            .first()
+        )
+
+        if (
+            not last_job
+            or not last_job.feedback
+            or last_job.feedback.get("secrets_sha256") != self.secrets_sha256
+        ):
+            return None
+
+        return {
+            **last_job.feedback,
+            "cached_from_job_id": str(last_job.pk),
+        }
+
     def after_docker_run(self) -> None:
+        self.job.feedback["secrets_sha256"] = self.secrets_sha256
+        self.job.save(update_fields=["feedback"])
+
         project = self.job.project
-        project.project_details = self.job.feedback["outputs"]["project_details"][
-            "project_details"
-        ]
+        project.set_project_details(
+            self.job.feedback["outputs"]["project_details"]["project_details"]
+        )
 
         thumbnail_filename = self.shared_tempdir.joinpath("thumbnail.png")
         with open(thumbnail_filename, "rb") as f:
@@ -594,6 +1005,9 @@ class ProcessProjectfileJobRun(JobRun):
         project.save(
             update_fields=(
                 "project_details",
+                "has_online_vector_data",
+                "configured_attachment_dirs",
+                "layers_with_error_count",
                 "thumbnail_uri",
             )
         )
@@ -601,9 +1015,44 @@ class ProcessProjectfileJobRun(JobRun):
     def after_docker_exception(self) -> None:
         project = self.job.project
 
-        if project.project_details is not None:
-            project.project_details = None
-            project.save(update_fields=("project_details",))
+        if project.layers_with_error_count is not None:
+            project.set_project_details(None)
+            project.save(
+                update_fields=(
+                    "project_details",
+                    "has_online_vector_data",
+                    "configured_attachment_dirs",
+                    "layers_with_error_count",
+                )
+            )
+
+
+def get_secrets_sha256(project: Project) -> str:
+    """Returns the sha256 of the project secrets, so the results of a job are not reused once they changed.
+
+    NOTE the hash is keyed with the `SECRET_KEY`, as it is stored in the job feedback next to the results.
+    """
+    secrets = [
+        [secret.type, secret.name, secret.value]
+        for secret in project.secrets.order_by("name")
+    ]
+
+    return salted_hmac(
+        "worker_wrapper.secrets", json.dumps(secrets), algorithm="sha256"
+    ).hexdigest()
+
+
+def _flush_live_logs(buffer: streams.CacheRingBuffer, lines: list[str]) -> None:
+    if not lines:
+        return
+
+    buffer.append(
+        {
+            "type": "lines",
+            "lines": [*lines],
+        }
+    )
+    lines.clear()
 
 
 def cancel_orphaned_workers() -> None:
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
 import logging
 import os
 from pathlib import Path
-from typing import Union
+from typing import Any, Optional
 
+import libqfieldsync
 import qfc_worker.apply_deltas
 import qfc_worker.process_projectfile
 from libqfieldsync.offline_converter import ExportType, OfflineConverter
@@ -18,25 +20,30 @@ from qfc_worker.utils import (
     WorkDirPath,
     WorkDirPathAsStr,
     Workflow,
+    get_files_fingerprints,
     get_layers_data,
+    get_layers_fingerprints,
+    get_python_sources_sha256,
     layers_data_to_string,
     open_qgis_project,
 )
-from qgis.core import QgsCoordinateTransform, QgsProject, QgsRectangle
+from qgis.core import Qgis, QgsCoordinateTransform, QgsProject, QgsRectangle
 
 PGSERVICE_FILE_CONTENTS = os.environ.get("PGSERVICE_FILE_CONTENTS")
+SECRETS_SHA256 = os.environ.get("SECRETS_SHA256")
 
 logger = logging.getLogger("ENTRYPNT")
 logger.setLevel(logging.INFO)
 
 
 def _call_libqfieldsync_packager(
-    project_filename: Path, package_dir: Path, offliner_type: OfflinerType
+    project: QgsProject, package_dir: Path, offliner_type: OfflinerType
 ) -> str:
-    """Call `libqfieldsync` to package a project for QField"""
-    logger.info("Preparing QGIS project for packaging…")
+    """Call `libqfieldsync` to package a project for QField.
 
-    project = open_qgis_project(str(project_filename))
+    NOTE the project is converted in place, afterwards it is the packaged project.
+    """
+    logger.info("Preparing QGIS project for packaging…")
 
     layers = project.mapLayers()
     project_config = ProjectConfiguration(project)
@@ -131,10 +138,102 @@ def _call_libqfieldsync_packager(
     return packaged_project_filename
 
 
-def _extract_layer_data(project_filename: Union[str, Path]) -> dict:
+def _load_previous_package(previous_package_filename: Path) -> Optional[dict[str, Any]]:
+    """Loads the previous package of the project, as prepared by the worker wrapper."""
+    if not previous_package_filename.exists():
+        logger.info("No previous package to reuse.")
+        return None
+
+    with open(previous_package_filename) as f:
+        previous_package = json.load(f)
+
+    logger.info(f'Found previous package "{previous_package["package_id"]}".')
+
+    return previous_package
+
+
+def _get_package_fingerprints(
+    project_dir: Path, project: QgsProject, offliner_type: OfflinerType
+) -> dict[str, Any]:
+    """Fingerprints everything the package is made of, so an unchanged package can be reused."""
+    logger.info("Fingerprinting project files and layers…")
+
+    return {
+        "qgis_version": Qgis.version(),
+        # the packaging code, either changed by a new worker image or mounted for local development
+        "worker_sha256": get_python_sources_sha256(Path(__file__).parent),
+        "libqfieldsync_sha256": get_python_sources_sha256(
+            Path(libqfieldsync.__file__).parent
+        ),
+        "secrets_sha256": SECRETS_SHA256,
+        "offliner_type": offliner_type,
+        "files": get_files_fingerprints(project_dir),
+        "layers": get_layers_fingerprints(project),
+    }
+
+
+def _is_previous_package_reusable(
+    fingerprints: dict[str, Any], previous_package: Optional[dict[str, Any]]
+) -> bool:
+    if (
+        not previous_package
+        or not previous_package.get("fingerprints")
+        or not previous_package.get("layers_by_id")
+    ):
+        return False
+
+    # the layers which changes cannot be detected are always repackaged
+    if None in fingerprints["layers"].values():
+        return False
+
+    return previous_package["fingerprints"] == fingerprints
+
+
+def _package_project(
+    project: QgsProject,
+    package_dir: Path,
+    offliner_type: OfflinerType,
+    fingerprints: dict[str, Any],
+    previous_package: Optional[dict[str, Any]],
+) -> tuple[Optional[QgsProject], bool]:
+    """Packages the project, unless nothing changed since the previous package, which is then reused as is.
+
+    NOTE `OfflineConverter` writes all the offline editable layers into a single GeoPackage, so a partial
+    repackaging would still need to convert all of them. Instead, the unchanged files of a new package are reused
+    from the previous one when uploading.
+
+    Returns:
+        tuple[QgsProject | None, bool]: the packaged project, `None` if reused, and whether the previous package is reused
+    """
+    if _is_previous_package_reusable(fingerprints, previous_package):
+        logger.info(
+            f'Nothing changed since package "{previous_package["package_id"]}", reusing it!'  # type: ignore
+        )
+        return None, True
+
+    packaged_project_filename = _call_libqfieldsync_packager(
+        project, package_dir, offliner_type
+    )
+
+    # NOTE the converted project is already the packaged one, then the packaged project file is not loaded again
+    qfield_project = open_qgis_project(packaged_project_filename)
+
+    return qfield_project, False
+
+
+def _extract_packaged_layer_data(
+    project: Optional[QgsProject], previous_package: Optional[dict[str, Any]]
+) -> dict:
+    if project is None and previous_package:
+        logger.info("Reusing the packaged layer data of the previous package.")
+        return previous_package["layers_by_id"]
+
+    return _extract_layer_data(project)  # type: ignore
+
+
+def _extract_layer_data(project: QgsProject) -> dict:
     logger.info("Extracting QGIS project layer data…")
 
-    project = open_qgis_project(str(project_filename))
     layers_by_id: dict = get_layers_data(project)
 
     logger.info(
@@ -144,6 +243,11 @@ def _extract_layer_data(project_filename: Union[str, Path]) -> dict:
     return layers_by_id
 
 
+def _open_project(project_filename: str) -> QgsProject:
+    """Opens the project once, the loaded project is then passed to the next steps."""
+    return open_qgis_project(project_filename)
+
+
 def _open_read_only_project(project_filename: str) -> QgsProject:
     flags = (
         # TODO we use `QgsProject` read flags, as the ones in `Qgis.ProjectReadFlags` do not work in QGIS 3.34.2
@@ -184,36 +288,72 @@ def cmd_package_project(args: argparse.Namespace):
                 method=qfc_worker.utils.download_project,
                 return_names=["tmp_project_dir"],
             ),
+            Step(
+                id="open_project",
+                name="Open Project",
+                arguments={
+                    "project_filename": WorkDirPathAsStr("files", args.project_file),
+                },
+                method=_open_project,
+                return_names=["project"],
+            ),
             Step(
                 id="qgis_layers_data",
                 name="QGIS Layers Data",
                 arguments={
-                    "project_filename": WorkDirPath("files", args.project_file),
+                    "project": StepOutput("open_project", "project"),
                 },
                 method=_extract_layer_data,
                 return_names=["layers_by_id"],
                 outputs=["layers_by_id"],
             ),
+            Step(
+                id="previous_package",
+                name="Previous Package",
+                arguments={
+                    "previous_package_filename": Path("/io/previous_package.json"),
+                },
+                method=_load_previous_package,
+                return_names=["previous_package"],
+            ),
+            Step(
+                id="package_fingerprints",
+                name="Package Fingerprints",
+                arguments={
+                    "project_dir": WorkDirPath("files"),
+                    "project": StepOutput("open_project", "project"),
+                    "offliner_type": args.offliner_type,
+                },
+                method=_get_package_fingerprints,
+                return_names=["fingerprints"],
+                outputs=["fingerprints"],
+            ),
             Step(
                 id="package_project",
                 name="Package Project",
                 arguments={
-                    "project_filename": WorkDirPath("files", args.project_file),
+                    "project": StepOutput("open_project", "project"),
                     "package_dir": WorkDirPath("export", mkdir=True),
                     "offliner_type": args.offliner_type,
+                    "fingerprints": StepOutput("package_fingerprints", "fingerprints"),
+                    "previous_package": StepOutput(
+                        "previous_package", "previous_package"
+                    ),
                 },
-                method=_call_libqfieldsync_packager,
-                return_names=["qfield_project_filename"],
+                method=_package_project,
+                return_names=["qfield_project", "is_previous_package_reused"],
+                outputs=["is_previous_package_reused"],
             ),
             Step(
                 id="qfield_layer_data",
                 name="Packaged Layers Data",
                 arguments={
-                    "project_filename": StepOutput(
-                        "package_project", "qfield_project_filename"
+                    "project": StepOutput("package_project", "qfield_project"),
+                    "previous_package": StepOutput(
+                        "previous_package", "previous_package"
                     ),
                 },
-                method=_extract_layer_data,
+                method=_extract_packaged_layer_data,
                 return_names=["layers_by_id"],
                 outputs=["layers_by_id"],
             ),
@@ -228,8 +368,16 @@ def cmd_package_project(args: argparse.Namespace):
                 arguments={
                     "project_id": args.projectid,
                     "package_dir": WorkDirPath("export", mkdir=True),
+                    "previous_package": StepOutput(
+                        "previous_package", "previous_package"
+                    ),
+                    "is_previous_package_reused": StepOutput(
+                        "package_project", "is_previous_package_reused"
+                    ),
                 },
                 method=qfc_worker.utils.upload_package,
+                return_names=["reused_filenames"],
+                outputs=["reused_filenames"],
             ),
         ],
     )
@@ -328,6 +476,15 @@ def cmd_process_projectfile(args: argparse.Namespace):
                 },
                 method=qfc_worker.process_projectfile.check_valid_project_file,
             ),
+            Step(
+                id="project_file_checksum",
+                name="Project File Checksum",
+                arguments={
+                    "filename": WorkDirPathAsStr("files", args.project_file),
+                },
+                method=qfc_worker.utils.get_file_sha256,
+                return_names=["project_file_sha256"],
+            ),
             Step(
                 id="opening_check",
                 name="Opening Check",
@@ -342,6 +499,9 @@ def cmd_process_projectfile(args: argparse.Namespace):
                 name="Project Details",
                 arguments={
                     "project": StepOutput("opening_check", "project"),
+                    "project_file_sha256": StepOutput(
+                        "project_file_checksum", "project_file_sha256"
+                    ),
                 },
                 method=qfc_worker.process_projectfile.extract_project_details,
                 return_names=["project_details"],
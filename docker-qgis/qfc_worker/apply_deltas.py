@@ -23,6 +23,7 @@ import jsonschema
 
 # pylint: disable=no-name-in-module
 from qgis.core import (
+    QgsDataProvider,
     QgsExpression,
     QgsFeature,
     QgsGeometry,
@@ -255,16 +256,17 @@ def delta_apply(
 ):
     del delta_log[:]
 
-    project = QgsProject.instance()
-    logging.info(f'Loading project file "{project_filename}"...')
-    project.read(str(project_filename))
-
     logging.info(f'Loading delta file "{delta_filename}"...')
     delta_file = delta_file_file_loader({"delta_file": delta_filename})  # type: ignore
 
     if not delta_file:
         raise Exception("Missing delta file")
 
+    layer_ids = {delta["sourceLayerId"] for delta in delta_file.deltas}
+
+    logging.info(f'Loading project file "{project_filename}"...')
+    project = open_project_with_layers(project_filename, layer_ids)
+
     all_applied = apply_deltas_without_transaction(
         project, delta_file, inverse, overwrite_conflicts
     )
@@ -280,6 +282,43 @@ def delta_apply(
     return delta_log_copy
 
 
+def open_project_with_layers(project_filename: Path, layer_ids: Set[str]) -> QgsProject:
+    """Opens the project with only the given layers resolved, the rest are left without data provider.
+
+    Layouts, 3D views and project styles are not loaded either, so the time to open the project
+    does not depend on the number of layers it has, but only on the layers the deltas are applied on.
+    """
+    project = QgsProject.instance()
+    flags = (
+        QgsProject.ReadFlags()
+        | QgsProject.FlagDontResolveLayers
+        | QgsProject.FlagDontLoadLayouts
+        | QgsProject.FlagDontLoad3DViews
+        | QgsProject.DontLoadProjectStyles
+    )
+
+    # NOTE if the project fails to load, the deltas fail one by one as their layers are missing
+    if not project.read(str(project_filename), flags):
+        logging.error(f'Failed to load QGIS project "{project_filename}"!')
+
+    for layer_id in layer_ids:
+        layer = project.mapLayer(layer_id)
+
+        # NOTE missing layers are reported when the deltas are applied
+        if not layer:
+            continue
+
+        options = QgsDataProvider.ProviderOptions()
+        options.transformContext = project.transformContext()
+        layer.setDataSource(layer.source(), layer.name(), layer.providerType(), options)
+
+        logging.info(
+            f'Resolved layer "{layer.name()}" ({layer_id}), valid: {layer.isValid()}'
+        )
+
+    return project
+
+
 @project_decorator
 def cmd_delta_apply(project: QgsProject, opts: DeltaOptions) -> bool:
     accepted_state = None
@@ -319,15 +358,18 @@ def cmd_delta_apply(project: QgsProject, opts: DeltaOptions) -> bool:
             f"Some of the {deltas_count} deltas have not been applied. "
             "Check the delta log if they have been processed and what is their status"
         )
-    print("Delta log file contents:")
-    print("========================")
-    print(json.dumps(delta_log, indent=2, sort_keys=True, default=str))
-    print("========================")
-
     if opts.get("delta_log"):
+        # the delta log might be huge, do not bloat the job output with it when it is stored in a file
         with open(str(opts["delta_log"]), "w") as f:
             json.dump(delta_log, f, indent=2, sort_keys=True, default=str)
 
+        logger.info(f'Delta log written to "{opts["delta_log"]}"')
+    else:
+        print("Delta log file contents:")
+        print("========================")
+        print(json.dumps(delta_log, indent=2, sort_keys=True, default=str))
+        print("========================")
+
     return has_uncaught_errors
 
 
@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Optional
 from xml.etree import ElementTree
 
 from qgis.core import (
@@ -18,6 +18,7 @@ from .utils import (
     InvalidFileExtensionException,
     InvalidXmlFileException,
     ProjectFileNotFoundException,
+    get_file_sha256,
     get_layers_data,
     get_qgis_xml_error_context,
     layers_data_to_string,
@@ -51,7 +52,55 @@ def check_valid_project_file(project_filename: Path) -> None:
     logger.info("QGIS project file is valid!")
 
 
-def extract_project_details(project: QgsProject) -> dict[str, str]:
+def get_referenced_files(
+    project: QgsProject, layers_by_id: dict[str, dict], project_file_sha256: str
+) -> dict[str, Optional[str]]:
+    """Returns the project file and the local files referenced by its layers, with their sha256.
+
+    The server compares them with the uploaded files, to skip processing the same project again.
+    The missing files are recorded too, so the project is processed again once they are uploaded.
+
+    Args:
+        project (QgsProject): the project
+        layers_by_id (dict[str, dict]): the layers data, see `get_layers_data`
+        project_file_sha256 (str): the sha256 of the project file, before it was opened and modified by QGIS
+
+    Returns:
+        dict[str, str | None]: the sha256 of each file, by its filename relative to the project directory.
+            `None` if the file is missing.
+    """
+    project_filename = Path(project.fileName()).resolve()
+    project_dir = project_filename.parent
+    referenced_files: dict[str, Optional[str]] = {
+        project_filename.relative_to(project_dir).as_posix(): project_file_sha256,
+    }
+
+    for layer_data in layers_by_id.values():
+        filename = layer_data.get("filename")
+
+        if not filename:
+            continue
+
+        try:
+            name = Path(filename).resolve().relative_to(project_dir).as_posix()
+        except ValueError:
+            # not within the project directory, so it cannot be an uploaded file
+            continue
+
+        if name in referenced_files:
+            continue
+
+        if Path(filename).is_file():
+            referenced_files[name] = get_file_sha256(filename)
+        else:
+            referenced_files[name] = None
+
+    return referenced_files
+
+
+def extract_project_details(
+    project: QgsProject, project_file_sha256: str
+) -> dict[str, str]:
     """Extract project details"""
     logger.info("Extract project details…")
 
@@ -114,6 +163,9 @@ def extract_project_details(project: QgsProject) -> dict[str, str]:
 
     details["layers_by_id"] = get_layers_data(project)
     details["ordered_layer_ids"] = list(details["layers_by_id"].keys())
+    details["referenced_files"] = get_referenced_files(
+        project, details["layers_by_id"], project_file_sha256
+    )
     details["attachment_dirs"], _ = project.readListEntry(
         "QFieldSync", "attachmentDirs", ["DCIM"]
     )
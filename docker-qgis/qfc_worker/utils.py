@@ -7,17 +7,20 @@ import json
 import logging
 import os
 import re
+import shutil
 import socket
 import subprocess
 import sys
 import tempfile
 import traceback
 import uuid
-import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import IO, Any, Callable, NamedTuple, Optional
+from typing import IO, Any, Callable, Iterable, NamedTuple, Optional
+from xml.parsers import expat
 
 from libqfieldsync.layer import LayerSource
 from libqfieldsync.utils.bad_layer_handler import (
@@ -28,12 +31,11 @@ from qfieldcloud_sdk import sdk
 from qgis.core import (
     Qgis,
     QgsApplication,
+    QgsDataSourceUri,
     QgsMapLayer,
     QgsMapSettings,
     QgsProject,
-    QgsProjectArchive,
     QgsProviderRegistry,
-    QgsZipUtils,
 )
 from qgis.PyQt import QtCore, QtGui
 from tabulate import tabulate
@@ -41,6 +43,12 @@ from tabulate import tabulate
 # Get environment variables
 JOB_ID = os.environ.get("JOB_ID")
 
+# Seconds to wait for a host to respond, when diagnosing why a layer is invalid
+HOST_REACHABILITY_TIMEOUT = 2
+
+# Maximum number of hosts that are checked at the same time
+HOST_REACHABILITY_MAX_WORKERS = 16
+
 qgs_stderr_logger = logging.getLogger("QGSSTDERR")
 qgs_stderr_logger.setLevel(logging.DEBUG)
 qgs_msglog_logger = logging.getLogger("QGSMSGLOG")
@@ -255,60 +263,146 @@ def open_qgis_project(
     return project
 
 
+def _find_feature_count_tags(xml_file: IO[bytes]) -> list[tuple[int, bytes]]:
+    """Scans the project XML for the start tags that enable the feature count, without building the whole tree.
+
+    Returns:
+        list[tuple[int, bytes]]: the byte offset of each such start tag and the name of the attribute to patch
+    """
+    patches = []
+    # names of the open elements, `Option` elements of `Map` type marked as such
+    stack = []
+    parser = expat.ParserCreate()
+
+    def on_start_element(name: str, attrs: dict[str, str]) -> None:
+        if name == "legendlayer" and attrs.get("showFeatureCount", "0") != "0":
+            patches.append((parser.CurrentByteIndex, b"showFeatureCount"))
+        elif (
+            name == "Option"
+            and attrs.get("name") == "showFeatureCount"
+            and attrs.get("value", "0") != "0"
+            and stack[-3:] == ["layer-tree-layer", "customproperties", "Option[Map]"]
+        ):
+            patches.append((parser.CurrentByteIndex, b"value"))
+
+        if name == "Option" and attrs.get("type") == "Map":
+            name = "Option[Map]"
+
+        stack.append(name)
+
+    def on_end_element(name: str) -> None:
+        stack.pop()
+
+    parser.StartElementHandler = on_start_element
+    parser.EndElementHandler = on_end_element
+    parser.ParseFile(xml_file)
+
+    return patches
+
+
+def _read_start_tag(xml_file: IO[bytes]) -> bytes:
+    """Reads a start tag up to the closing `>`, which might also be within a quoted attribute value."""
+    tag = b""
+    quote = None
+
+    while True:
+        char = xml_file.read(1)
+
+        if not char:
+            raise Exception("Unexpected end of the project file!")
+
+        tag += char
+
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in (b'"', b"'"):
+            quote = char
+        elif char == b">":
+            return tag
+
+
+def _copy_with_feature_count_disabled(
+    src: IO[bytes], dst: IO[bytes], patches: list[tuple[int, bytes]]
+) -> None:
+    """Copies the project XML, setting the attributes of the start tags found by `_find_feature_count_tags` to "0"."""
+    BLOCKSIZE = 65536
+    position = 0
+
+    for offset, attr_name in patches:
+        remaining = offset - position
+        while remaining > 0:
+            chunk = src.read(min(BLOCKSIZE, remaining))
+            dst.write(chunk)
+            remaining -= len(chunk)
+
+        tag = _read_start_tag(src)
+        tag = re.sub(
+            rb"(\s" + attr_name + rb"\s*=\s*)([\"'])[^\"']*\2",
+            rb"\g<1>\g<2>0\g<2>",
+            tag,
+            count=1,
+        )
+        dst.write(tag)
+
+        position = offset + len(tag)
+
+    shutil.copyfileobj(src, dst, BLOCKSIZE)
+
+
 def strip_feature_count_from_project_xml(project_filename: str) -> None:
     """Rewrites project XML file with feature count disabled.
 
+    The XML is streamed twice, once to find the attributes enabling the feature count and once to patch them,
+    the rest of the file is copied as is. If the feature count is not enabled, the file is not rewritten at all.
+
     Args:
         project_filename (str): filename of the QGIS project file (.qgs or .qgz)
     """
-    archive = None
-    xml_file = project_filename
-    if QgsZipUtils.isZipFile(project_filename):
-        logging.info("The project file is zipped as .qgz, unzipping…")
-
-        archive = QgsProjectArchive()
-
-        if archive.unzip(project_filename):
-            logging.info("The project file is unzipped successfully!")
-            xml_file = archive.projectFile()
-        else:
-            logging.error("The project file is unzipping failed!")
+    project_path = Path(project_filename)
+    tmp_filename = project_path.with_name(f".{project_path.name}.tmp")
 
-            raise Exception(f"Failed to unzip {project_filename} file!")
+    if zipfile.is_zipfile(project_path):
+        logging.info("The project file is zipped as .qgz, scanning the archive…")
 
-    logging.info("Parsing QGIS project file XML…")
+        with zipfile.ZipFile(project_path) as zin:
+            xml_names = [name for name in zin.namelist() if name.endswith(".qgs")]
 
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
+            if not xml_names:
+                raise Exception(f"Failed to find the .qgs file in {project_filename}!")
 
-    logging.info("QGIS project parsed!")
+            with zin.open(xml_names[0]) as f:
+                patches = _find_feature_count_tags(f)
 
-    for node in root.findall(".//legendlayer"):
-        node.set("showFeatureCount", "0")
+            if not patches:
+                logging.info("The feature count is not enabled, nothing to rewrite!")
+                return
 
-    for node in root.findall(
-        './/layer-tree-layer/customproperties/Option[@type="Map"]/Option[@name="showFeatureCount"]'
-    ):
-        node.set("value", "0")
+            logging.info(f"Disabling the feature count of {len(patches)} layer(s)…")
 
-    logging.info("Writing the QGIS project XML into a file…")
+            with zipfile.ZipFile(tmp_filename, "w") as zout:
+                for info in zin.infolist():
+                    with zin.open(info) as src, zout.open(info, "w") as dst:
+                        if info.filename == xml_names[0]:
+                            _copy_with_feature_count_disabled(src, dst, patches)
+                        else:
+                            shutil.copyfileobj(src, dst)
+    else:
+        logging.info("Scanning QGIS project file XML…")
 
-    if archive:
-        tmp_filename = tempfile.NamedTemporaryFile().name
-        tree.write(tmp_filename, short_empty_elements=False)
+        with open(project_path, "rb") as f:
+            patches = _find_feature_count_tags(f)
 
-        if not archive.clearProjectFile():
-            raise Exception("Failed to clear project path from the archive!")
+        if not patches:
+            logging.info("The feature count is not enabled, nothing to rewrite!")
+            return
 
-        if not Path(tmp_filename).rename(xml_file):
-            raise Exception("Failed to move the temp xml file into archive dir!")
+        logging.info(f"Disabling the feature count of {len(patches)} layer(s)…")
 
-        archive.addFile(xml_file)
+        with open(project_path, "rb") as src, open(tmp_filename, "wb") as dst:
+            _copy_with_feature_count_disabled(src, dst, patches)
 
-        if not archive.zip(project_filename):
-            raise Exception(f"Failed to zip {project_filename} file!")
-    else:
-        tree.write(xml_file, short_empty_elements=False)
+    os.replace(tmp_filename, project_path)
 
     logging.info("QGIS project file re-written!")
 
@@ -353,23 +447,61 @@ def download_project(
     return destination
 
 
-def upload_package(project_id: str, package_dir: Path) -> None:
+def upload_package(
+    project_id: str,
+    package_dir: Path,
+    previous_package: Optional[dict[str, Any]],
+    is_previous_package_reused: bool,
+) -> list[str]:
+    """Upload the packaged project files.
+
+    The files with the same contents as in the previous package are not uploaded, the server reuses them instead.
+
+    Args:
+        project_id (str): the project id
+        package_dir (Path): the directory with the packaged project
+        previous_package (dict | None): the previous package, as prepared by the worker wrapper
+        is_previous_package_reused (bool): whether the previous package is reused as is, so nothing is uploaded
+
+    Returns:
+        list[str]: the names of the files reused from the previous package
+    """
     client = sdk.Client()
     list_local_files(project_id, package_dir)
 
+    if previous_package and is_previous_package_reused:
+        logging.info("The previous package is reused, nothing to upload!")
+        return sorted(previous_package["files"].keys())
+
+    previous_files = previous_package["files"] if previous_package else {}
+    reused_filenames = []
+
     logging.info("Uploading packaged project files…")
 
-    client.upload_files(
-        project_id,
-        sdk.FileTransferType.PACKAGE,
-        str(package_dir),
-        filter_glob="*",
-        throw_on_error=True,
-        show_progress=False,
-        job_id=JOB_ID,
+    for filename in sorted(package_dir.rglob("*")):
+        if not filename.is_file():
+            continue
+
+        remote_filename = filename.relative_to(package_dir).as_posix()
+
+        if previous_files.get(remote_filename) == get_file_sha256(str(filename)):
+            reused_filenames.append(remote_filename)
+            continue
+
+        client.upload_file(
+            project_id,
+            sdk.FileTransferType.PACKAGE,
+            filename,
+            remote_filename,
+            show_progress=False,
+            job_id=JOB_ID,
+        )
+
+    logging.info(
+        f"Uploading packaged project files finished, {len(reused_filenames)} file(s) reused from the previous package!"
     )
 
-    logging.info("Uploading packaged project files finished!")
+    return reused_filenames
 
 
 def upload_project(project_id: str, project_dir: Path) -> None:
@@ -559,9 +691,9 @@ def is_localhost(hostname: str, port: int = None) -> bool:
         return False
 
 
-def has_ping(hostname: str) -> bool:
+def has_ping(hostname: str, timeout: int = 5) -> bool:
     ping = subprocess.Popen(
-        ["ping", "-c", "1", "-w", "5", hostname],
+        ["ping", "-c", "1", "-w", str(timeout), hostname],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
     )
@@ -571,6 +703,46 @@ def has_ping(hostname: str) -> bool:
     return not bool(error) and "100% packet loss" not in out.decode("utf8")
 
 
+# the reachability of each host and port, shared by all `get_layers_data` calls within the same job
+_reachability_by_host: dict[tuple[str, Optional[int]], bool] = {}
+
+
+def _is_host_reachable(host_port: tuple[str, Optional[int]]) -> bool:
+    host, port = host_port
+
+    return is_localhost(host, port) or has_ping(host, HOST_REACHABILITY_TIMEOUT)
+
+
+def get_hosts_reachability(
+    hosts: Iterable[tuple[str, Optional[int]]],
+) -> dict[tuple[str, Optional[int]], bool]:
+    """Checks whether the hosts are reachable.
+
+    The hosts are checked concurrently and each distinct host and port only once per job.
+
+    Args:
+        hosts (Iterable[tuple[str, Optional[int]]]): the host and port pairs to check
+
+    Returns:
+        dict[tuple[str, Optional[int]], bool]: whether each host and port pair is reachable
+    """
+    hosts = set(hosts)
+    pending_hosts = [
+        host_port for host_port in hosts if host_port not in _reachability_by_host
+    ]
+
+    if pending_hosts:
+        with ThreadPoolExecutor(
+            max_workers=min(len(pending_hosts), HOST_REACHABILITY_MAX_WORKERS)
+        ) as executor:
+            for host_port, is_reachable in zip(
+                pending_hosts, executor.map(_is_host_reachable, pending_hosts)
+            ):
+                _reachability_by_host[host_port] = is_reachable
+
+    return {host_port: _reachability_by_host[host_port] for host_port in hosts}
+
+
 def get_layer_filename(layer: QgsMapLayer) -> Optional[str]:
     metadata = QgsProviderRegistry.instance().providerMetadata(
         layer.dataProvider().name()
@@ -747,6 +919,8 @@ def run_workflow(
 
 def get_layers_data(project: QgsProject) -> dict[str, dict]:
     layers_by_id = {}
+    # the invalid layers to check for connectivity to their data provider host
+    layer_ids_by_host: dict[tuple[str, Optional[int]], list[str]] = {}
 
     for layer in project.mapLayers().values():
         error = layer.error()
@@ -777,6 +951,9 @@ def get_layers_data(project: QgsProject) -> dict[str, dict]:
             "is_valid": layer.isValid(),
             "is_localized": layer_source.is_localized_path,
             "datasource": datasource,
+            "provider_type": layer.providerType(),
+            "datasource_layer_name": layer_source.metadata.get("layerName"),
+            "datasource_subset": layer_source.metadata.get("subset"),
             "type": layer.type(),
             "type_name": layer.type().name,
             "error_code": "no_error",
@@ -829,10 +1006,8 @@ def get_layers_data(project: QgsProject) -> dict[str, dict]:
                     if data_provider.uri().port()
                     else None
                 )
-                if host and (is_localhost(host, port) or has_ping(host)):
-                    layers_by_id[layer_id][
-                        "provider_error_summary"
-                    ] = f'Unable to connect to host "{host}".'
+                if host:
+                    layer_ids_by_host.setdefault((host, port), []).append(layer_id)
 
                 path = layer_source.metadata.get("path")
                 if path and not os.path.exists(path):
@@ -844,6 +1019,15 @@ def get_layers_data(project: QgsProject) -> dict[str, dict]:
                 "provider_error_summary"
             ] = "No data provider available"
 
+    for host_port, is_reachable in get_hosts_reachability(layer_ids_by_host).items():
+        if not is_reachable:
+            continue
+
+        for layer_id in layer_ids_by_host[host_port]:
+            layers_by_id[layer_id][
+                "provider_error_summary"
+            ] = f'Unable to connect to host "{host_port[0]}".'
+
     return layers_by_id
 
 
@@ -864,6 +1048,128 @@ def get_file_md5sum(filename: str) -> str:
     return hasher.hexdigest()
 
 
+def get_file_sha256(filename: str) -> str:
+    BLOCKSIZE = 65536
+    hasher = hashlib.sha256()
+
+    with open(filename, "rb") as f:
+        chunk = f.read(BLOCKSIZE)
+        while chunk:
+            hasher.update(chunk)
+            chunk = f.read(BLOCKSIZE)
+
+    return hasher.hexdigest()
+
+
+def get_python_sources_sha256(dirname: Path) -> str:
+    """Returns the sha256 of all the python source files in the directory, together with their relative names."""
+    hasher = hashlib.sha256()
+
+    for filename in sorted(dirname.rglob("*.py")):
+        hasher.update(filename.relative_to(dirname).as_posix().encode())
+        hasher.update(filename.read_bytes())
+
+    return hasher.hexdigest()
+
+
+def get_files_fingerprints(project_dir: Path) -> dict[str, str]:
+    """Returns the sha256 of each file in the project directory, by their relative name."""
+    return {
+        filename.relative_to(project_dir).as_posix(): get_file_sha256(str(filename))
+        for filename in sorted(project_dir.rglob("*"))
+        if filename.is_file()
+    }
+
+
+def get_postgres_change_token(layer: QgsMapLayer) -> Optional[str]:
+    """Returns a token that changes whenever the data of the PostgreSQL table of the layer changes.
+
+    The token is made of the number of rows and the sum and max of their `xmin`, the id of the transaction that
+    wrote each row. Inserted and updated rows get the id of a new transaction, deleted rows change the count.
+    Unlike the table statistics, they are transactional and cannot be reset.
+
+    NOTE the same token is probed by the worker wrapper in `qfieldcloud.core.utils2.pg_change_tokens`, keep them in sync.
+
+    Returns:
+        str | None: the token, `None` if the layer is not a table, e.g. a view or a query
+    """
+    uri = QgsDataSourceUri(layer.source())
+    quoted_table_name = uri.quotedTablename()
+
+    if not quoted_table_name or quoted_table_name.startswith('"('):
+        return None
+
+    metadata = QgsProviderRegistry.instance().providerMetadata("postgres")
+    quoted_table_name = quoted_table_name.replace("'", "''")
+
+    try:
+        connection = metadata.createConnection(layer.source(), {})
+        # NOTE the table name is quoted by PostgreSQL itself, only (partitioned) tables have `xmin`
+        rows = connection.executeSql(
+            f"""
+                SELECT oid::regclass::text
+                FROM pg_class
+                WHERE oid = to_regclass('{quoted_table_name}')
+                    AND relkind IN ('r', 'p')
+            """
+        )
+
+        if len(rows) != 1:
+            return None
+
+        rows = connection.executeSql(
+            f"""
+                SELECT
+                    count(*)::text,
+                    coalesce(sum(xmin::text::bigint), 0)::text,
+                    coalesce(max(xmin::text::bigint), 0)::text
+                FROM {rows[0][0]}
+            """
+        )
+    except Exception as err:
+        logging.warning(
+            f'Failed to get the change token of layer "{layer.name()}": {err}'
+        )
+        return None
+
+    count, xmin_sum, xmin_max = rows[0]
+
+    return f"xmin:{count}:{xmin_sum}:{xmin_max}"
+
+
+def get_layers_fingerprints(project: QgsProject) -> dict[str, Optional[str]]:
+    """Returns a fingerprint of the data of each layer, that changes whenever the data changes.
+
+    File layers are fingerprinted by the sha256 of their file, PostgreSQL layers by their change token.
+    Layers which data changes cannot be detected get `None`, they are always considered changed.
+    """
+    fingerprints: dict[str, Optional[str]] = {}
+    # NOTE multiple layers are often stored in the same file, e.g. GeoPackage
+    sha256_by_filename: dict[str, str] = {}
+
+    for layer_id, layer in project.mapLayers().items():
+        fingerprints[layer_id] = None
+
+        if not layer.dataProvider():
+            continue
+
+        if layer.dataProvider().name() == "postgres":
+            fingerprints[layer_id] = get_postgres_change_token(layer)
+            continue
+
+        filename = get_layer_filename(layer)
+
+        if not filename or not os.path.isfile(filename):
+            continue
+
+        if filename not in sha256_by_filename:
+            sha256_by_filename[filename] = get_file_sha256(filename)
+
+        fingerprints[layer_id] = f"sha256:{sha256_by_filename[filename]}"
+
+    return fingerprints
+
+
 def files_list_to_string(files: list[dict[str, Any]]) -> str:
     table = [
         [